@@ -1,7 +1,9 @@
 
 from django.contrib import admin
-from .models import Doctor, Appointment, SymptomSpecialtyMap
+from .models import Doctor, Appointment, SymptomSpecialtyMap, DoctorSchedule, ScheduleException
 
 admin.site.register(Doctor)
 admin.site.register(Appointment)
 admin.site.register(SymptomSpecialtyMap)
+admin.site.register(DoctorSchedule)
+admin.site.register(ScheduleException)
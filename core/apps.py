@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from . import instrumentation, signals, tasks  # noqa: F401
+        # Before any thread opens a connection: install() only hooks the
+        # calling thread's existing ones, plus every one created later.
+        if instrumentation.enabled():
+            instrumentation.install()
@@ -0,0 +1,134 @@
+import datetime
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404
+from django.utils import timezone
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from .models import (
+    ARCHIVABLE_APPOINTMENT_STATUSES, Appointment, ArchivedAppointment, ArchivedPayment, Payment,
+)
+from .pagination import sort_rows
+from .querysets import ScopedQuerysetMixin, eager_load, scope_queryset
+
+ARCHIVE_PARAM = 'include_archived'
+
+APPOINTMENT_COLUMNS = [field.attname for field in Appointment._meta.concrete_fields]
+PAYMENT_COLUMNS = [field.attname for field in Payment._meta.concrete_fields]
+
+
+# ---- MOVING ----
+_moving = ContextVar('archive_moving', default=False)
+
+
+def is_archiving():
+    """
+    True while archive_appointments deletes the rows it just copied. Delete
+    signal handlers check it: moving a row isn't deleting it, so no sync
+    tombstones, real-time events or stats rollup refreshes.
+    """
+    return _moving.get()
+
+
+@contextmanager
+def _archiving():
+    token = _moving.set(True)
+    try:
+        yield
+    finally:
+        _moving.reset(token)
+
+
+def archivable_appointments(before=None):
+    """Finished appointments dated before ``before`` (default: ARCHIVE_AFTER_DAYS ago)."""
+    if before is None:
+        before = timezone.localdate() - datetime.timedelta(days=getattr(settings, 'ARCHIVE_AFTER_DAYS', 365))
+    return Appointment.objects.filter(date__lt=before, status__in=ARCHIVABLE_APPOINTMENT_STATUSES)
+
+
+def archive_appointments(before=None, batch_size=500):
+    """
+    Moves archivable appointments and their payments into the archive
+    tables, ``batch_size`` appointments per transaction, so locks stay short
+    and an interrupted run leaves every row in exactly one place. Returns
+    (appointments, payments) moved.
+    """
+    due = archivable_appointments(before).order_by('date', 'id')
+    appointments = payments = 0
+    while True:
+        with transaction.atomic():
+            rows = list(due.select_for_update(skip_locked=True).values(*APPOINTMENT_COLUMNS)[:batch_size])
+            if not rows:
+                return appointments, payments
+            ids = [row['id'] for row in rows]
+            live_payments = Payment.objects.filter(appointment_id__in=ids)
+            payment_rows = list(live_payments.values(*PAYMENT_COLUMNS))
+
+            ArchivedAppointment.objects.bulk_create([ArchivedAppointment(**row) for row in rows])
+            ArchivedPayment.objects.bulk_create([ArchivedPayment(**row) for row in payment_rows])
+            with _archiving():
+                live_payments.delete()
+                Appointment.objects.filter(id__in=ids).delete()
+        appointments += len(rows)
+        payments += len(payment_rows)
+
+
+# ---- READING ----
+def wants_archive(request):
+    return request.query_params.get(ARCHIVE_PARAM, '').lower() in ('1', 'true', 'yes')
+
+
+class ArchiveReadMixin:
+    """
+    ``?include_archived=true`` makes list and detail requests read the
+    archive (``archive_serializer_class``'s model) too, as if its rows had
+    never moved: the same scoping, representation and ordering, and keyset
+    pages that run across both tables.
+    """
+    archive_serializer_class = None
+
+    def get_archive_serializer(self, *args, **kwargs):
+        kwargs.setdefault('context', self.get_serializer_context())
+        return self.archive_serializer_class(*args, **kwargs)
+
+    def get_archive_queryset(self):
+        queryset = self.archive_serializer_class.Meta.model.objects.all()
+        if isinstance(self, ScopedQuerysetMixin):
+            queryset = scope_queryset(queryset, self.request, self.scopes)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if not wants_archive(request):
+            return super().list(request, *args, **kwargs)
+
+        serializer, archive_serializer = self.get_serializer(), self.get_archive_serializer()
+        live = self.filter_queryset(self.get_queryset())
+        archived = eager_load(self.get_archive_queryset(), archive_serializer)
+        serializers = {live.model: serializer, archived.model: archive_serializer}
+
+        def represent(rows):
+            return [serializers[row._meta.model].to_representation(row) for row in rows]
+
+        if self.paginator is not None:
+            page = self.paginator.paginate_querysets([live, archived], request, view=self)
+            return self.get_paginated_response(represent(page))
+        ordering = live.query.order_by
+        return Response(represent(sort_rows([*live, *archived.order_by(*ordering)], ordering)))
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            if not wants_archive(request):
+                raise
+        archive_serializer = self.get_archive_serializer()
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        instance = get_object_or_404(
+            eager_load(self.get_archive_queryset(), archive_serializer),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+        )
+        return Response(self.get_archive_serializer(instance).data)
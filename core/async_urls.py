@@ -0,0 +1,14 @@
+from django.urls import path
+
+from . import async_views
+
+# Mounted at /api/async/; only useful when served by the ASGI application.
+urlpatterns = [
+    path('doctors/', async_views.doctor_list, name='async_doctor_list'),
+    path('doctors/<int:pk>/', async_views.doctor_detail, name='async_doctor_detail'),
+    path('specialists/', async_views.specialist_list, name='async_specialist_list'),
+    path('specialists/<int:pk>/', async_views.specialist_detail, name='async_specialist_detail'),
+    path('symptom-match/', async_views.symptom_match, name='async_symptom_match'),
+    path('appointments/my/', async_views.my_appointments, name='async_my_appointments'),
+    path('events/', async_views.event_stream, name='async_event_stream'),
+]
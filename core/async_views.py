@@ -0,0 +1,206 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import APIException, NotAuthenticated, ValidationError
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import availability
+from .authentication import ClaimsJWTAuthentication, ClaimsUser, has_profile_claims
+from .events import OVERFLOW, doctor_topic, format_sse, get_broker, patient_topic, slots_topic
+from .filters import DoctorFilterBackend
+from .matching import get_matcher
+from .models import Doctor, Patient, Appointment, Specialist
+from .querysets import eager_load
+from .serializers import DoctorSerializer, SpecialistSerializer, AppointmentSerializer
+from .views import SymptomMatchView, get_date_range, format_slots
+
+# Async-native read endpoints for ASGI deployments, mirroring the DRF views
+# of the same name. Queries go through the async ORM; responses that need
+# several independent loads run them concurrently via fan_out().
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+
+def async_api_view(view):
+    """Wraps the Django request in a DRF Request and turns APIExceptions into JSON errors."""
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(Request(request), *args, **kwargs)
+        except APIException as exc:
+            detail = exc.detail if isinstance(exc.detail, (dict, list)) else {'detail': exc.detail}
+            return json_response(detail, status=exc.status_code)
+    return wrapper
+
+
+async def authenticate(request):
+    """Claims-only tokens are resolved without leaving the event loop."""
+    auth = ClaimsJWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header is not None else None
+    if raw_token is None:
+        raise NotAuthenticated()
+    token = auth.get_validated_token(raw_token)
+    if has_profile_claims(token):
+        return ClaimsUser(token)
+    return await sync_to_async(auth.get_user)(token)
+
+
+def _isolated(load):
+    def run():
+        try:
+            return load()
+        finally:
+            # Each worker thread has its own connection; don't leave it open.
+            connection.close()
+    return run
+
+
+async def fan_out(*loads):
+    """Runs independent blocking loads concurrently, each on its own thread and connection."""
+    return await asyncio.gather(*(sync_to_async(_isolated(load), thread_sensitive=False)() for load in loads))
+
+
+async def serialize_list(queryset, serializer_class):
+    serializer = serializer_class()
+    rows = [obj async for obj in eager_load(queryset, serializer)]
+    return serializer_class(rows, many=True).data
+
+
+def serialize_first(queryset, serializer_class):
+    obj = eager_load(queryset, serializer_class()).first()
+    return serializer_class(obj).data if obj is not None else None
+
+
+def serialize_all(queryset, serializer_class):
+    return serializer_class(list(eager_load(queryset, serializer_class())), many=True).data
+
+
+#  Doctors
+@async_api_view
+async def doctor_list(request):
+    queryset = DoctorFilterBackend().filter_queryset(request, Doctor.objects.all(), None)
+    return json_response(await serialize_list(queryset, DoctorSerializer))
+
+
+@async_api_view
+async def doctor_detail(request, pk):
+    start, end = get_date_range(request)
+    doctor, slots = await fan_out(
+        lambda: serialize_first(Doctor.objects.filter(pk=pk), DoctorSerializer),
+        lambda: availability.free_slots([pk], start, end),
+    )
+    if doctor is None:
+        return json_response({'detail': 'Not found.'}, status=404)
+    return json_response({**doctor, 'slots': format_slots(slots)[str(pk)]})
+
+
+#  Specialist Catalog
+@async_api_view
+async def specialist_list(request):
+    return json_response(await serialize_list(Specialist.objects.order_by('id'), SpecialistSerializer))
+
+
+@async_api_view
+async def specialist_detail(request, pk):
+    start, end = get_date_range(request)
+    specialist, doctors, slots = await fan_out(
+        lambda: serialize_first(Specialist.objects.filter(pk=pk), SpecialistSerializer),
+        lambda: serialize_all(Doctor.objects.filter(specialty_id=pk, is_available=True).order_by('id'), DoctorSerializer),
+        lambda: availability.specialty_free_slots(pk, start, end),
+    )
+    if specialist is None:
+        return json_response({'detail': 'Not found.'}, status=404)
+    return json_response({**specialist, 'doctors': doctors, 'slots': format_slots(slots)})
+
+
+#  Symptom Match
+@async_api_view
+async def symptom_match(request):
+    symptoms = SymptomMatchView().get_symptoms(request)
+    # The matcher only queries when its index needs rebuilding.
+    matcher = await sync_to_async(get_matcher)()
+    results = matcher.match(symptoms) if symptoms else []
+    if not results:
+        return json_response({"message": "No specialists found for the given symptom."}, status=404)
+    return json_response(results)
+
+
+async def profile_ids(user):
+    """(doctor_id, patient_id) of an authenticated user; from the token claims when it has them."""
+    if isinstance(user, ClaimsUser):
+        return user.doctor_id, user.patient_id
+    doctor_id = await Doctor.objects.filter(user_id=user.pk).values_list('id', flat=True).afirst()
+    patient_id = await Patient.objects.filter(user_id=user.pk).values_list('id', flat=True).afirst()
+    return doctor_id, patient_id
+
+
+#  My Appointments
+@async_api_view
+async def my_appointments(request):
+    user = await authenticate(request)
+    if isinstance(user, ClaimsUser):
+        patient_id = user.patient_id
+    else:
+        patient_id = await Patient.objects.filter(user_id=user.pk).values_list('id', flat=True).afirst()
+    if patient_id is None:
+        return json_response([])
+    queryset = Appointment.objects.filter(patient_id=patient_id).order_by('-date')
+    return json_response(await serialize_list(queryset, AppointmentSerializer))
+
+
+#  Event Stream (Server-Sent Events; see core.events)
+def event_topics(doctor_id, patient_id, slots):
+    topics = []
+    if doctor_id is not None:
+        topics.append(doctor_topic(doctor_id))
+    if patient_id is not None:
+        topics.append(patient_topic(patient_id))
+    try:
+        doctor_ids = {int(value) for value in slots.split(',') if value.strip()} if slots else set()
+    except ValueError:
+        raise ValidationError({'slots': 'Must be comma-separated doctor ids.'})
+    if len(doctor_ids) > getattr(settings, 'EVENTS_MAX_SLOT_TOPICS', 50):
+        raise ValidationError({'slots': 'Too many doctors.'})
+    return topics + [slots_topic(pk) for pk in sorted(doctor_ids)]
+
+
+async def stream_events(topics):
+    broker = get_broker()
+    subscription = broker.subscribe(topics, getattr(settings, 'EVENTS_QUEUE_SIZE', 100))
+    heartbeat = getattr(settings, 'EVENTS_HEARTBEAT_SECONDS', 15)
+    try:
+        yield f"retry: {getattr(settings, 'EVENTS_RETRY_MS', 3000)}\n: connected\n\n".encode()
+        while True:
+            event = await subscription.get(heartbeat)
+            if event is None:
+                # Keeps proxies from timing the connection out.
+                yield b': keep-alive\n\n'
+                continue
+            yield format_sse(event)
+            if event is OVERFLOW:
+                return
+    finally:
+        # Also on client disconnect, which cancels the stream.
+        broker.unsubscribe(subscription)
+
+
+@async_api_view
+async def event_stream(request):
+    """
+    The requester's own appointment and payment events, plus slot events
+    for the doctors in ``?slots=1,2``, as they happen.
+    """
+    user = await authenticate(request)
+    topics = event_topics(*await profile_ids(user), request.query_params.get('slots'))
+    if not topics:
+        raise ValidationError({'slots': 'Nothing to subscribe to.'})
+    return StreamingHttpResponse(
+        stream_events(topics), content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -0,0 +1,87 @@
+from functools import cached_property
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+
+from .models import Doctor, Patient
+
+# Claims written into every token at login; tokens issued before they
+# existed lack 'role' and are resolved against the database instead.
+PROFILE_CLAIMS = ('role', 'doctor_id', 'patient_id', 'is_staff', 'username')
+
+
+def has_profile_claims(token):
+    return all(claim in token for claim in PROFILE_CLAIMS)
+
+
+def user_role(user):
+    return 'admin' if user.is_staff else user.role
+
+
+def user_claims(user):
+    """Role and profile ids for ``user``: at most one query, run once at login."""
+    claims = {
+        'role': user_role(user),
+        'doctor_id': None,
+        'patient_id': None,
+        'is_staff': user.is_staff,
+        'is_superuser': user.is_superuser,
+        'username': user.get_username(),
+    }
+    if user.role == 'doctor':
+        claims['doctor_id'] = Doctor.objects.filter(user_id=user.pk).values_list('id', flat=True).first()
+    elif user.role == 'patient':
+        claims['patient_id'] = Patient.objects.filter(user_id=user.pk).values_list('id', flat=True).first()
+    return claims
+
+
+# ---- STATELESS USER ----
+class ClaimsUser(TokenUser):
+    """Request user built from token claims; reading it never touches the database."""
+
+    @cached_property
+    def role(self):
+        return self.token.get('role', 'patient')
+
+    @cached_property
+    def doctor_id(self):
+        return self.token.get('doctor_id')
+
+    @cached_property
+    def patient_id(self):
+        return self.token.get('patient_id')
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    Default API authentication: trusts the signed claims instead of loading
+    the user row on every request. Deactivation, role or staff changes take
+    effect when the access token expires (refreshes re-read the claims); views that can't wait for that use
+    plain JWTAuthentication, which loads the user and rejects inactive ones.
+    """
+
+    def get_user(self, validated_token):
+        if has_profile_claims(validated_token):
+            return ClaimsUser(validated_token)
+        return super().get_user(validated_token)
+
+
+# ---- PROFILE LOOKUPS ----
+def _profile_id(request, claim, model):
+    user = request.user
+    if isinstance(user, ClaimsUser):
+        return getattr(user, claim)
+    if not user.is_authenticated:
+        return None
+    cache_attr = f'_{claim}'
+    if not hasattr(request, cache_attr):
+        setattr(request, cache_attr, model.objects.filter(user_id=user.pk).values_list('id', flat=True).first())
+    return getattr(request, cache_attr)
+
+
+def request_patient_id(request):
+    return _profile_id(request, 'patient_id', Patient)
+
+
+def request_doctor_id(request):
+    return _profile_id(request, 'doctor_id', Doctor)
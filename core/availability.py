@@ -0,0 +1,140 @@
+import datetime
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .models import Doctor, DoctorSchedule, ScheduleException, Appointment
+
+MAX_RANGE_DAYS = 62
+
+
+def _slot_times(start, end, minutes):
+    """Start times of ``minutes``-long slots that fit inside [start, end)."""
+    day = datetime.date.min
+    cursor = datetime.datetime.combine(day, start)
+    stop = datetime.datetime.combine(day, end)
+    step = datetime.timedelta(minutes=minutes)
+    times = []
+    while cursor + step <= stop:
+        times.append(cursor.time())
+        cursor += step
+    return times
+
+
+def _in_range(value, start, end):
+    return (start is None or value >= start) and (end is None or value < end)
+
+
+# ---- SLOT GENERATION ----
+def free_slots(doctor_ids, start_date, end_date, now=None, exclude_appointment=None):
+    """
+    Free slots per doctor over [start_date, end_date] as
+    {doctor_id: {date: [time, ...]}}.
+
+    Weekly templates are expanded to slot lists once per (doctor, weekday);
+    each day is then that list minus its exceptions and the booked set, which
+    comes from a single appointments query for the whole range. Slots that
+    already started are dropped. ``exclude_appointment`` (an id) doesn't
+    count as booked, for moving it.
+    """
+    doctor_ids = list(doctor_ids)
+    if not doctor_ids or end_date < start_date:
+        return {}
+    now = timezone.localtime(now or timezone.now())
+
+    templates = defaultdict(lambda: defaultdict(set))
+    for doctor_id, weekday, start, end, minutes in DoctorSchedule.objects.filter(
+        doctor_id__in=doctor_ids
+    ).values_list('doctor_id', 'weekday', 'start_time', 'end_time', 'slot_minutes'):
+        templates[doctor_id][weekday].update(_slot_times(start, end, minutes))
+
+    exceptions = defaultdict(list)
+    for exception in ScheduleException.objects.filter(
+        doctor_id__in=doctor_ids, date__range=(start_date, end_date)
+    ).values('doctor_id', 'date', 'start_time', 'end_time', 'is_available', 'slot_minutes'):
+        exceptions[(exception['doctor_id'], exception['date'])].append(exception)
+
+    appointments = Appointment.objects.filter(
+        doctor_id__in=doctor_ids, date__range=(start_date, end_date)
+    ).exclude(status__in=Appointment.INACTIVE_STATUSES)
+    if exclude_appointment is not None:
+        appointments = appointments.exclude(pk=exclude_appointment)
+    booked = defaultdict(set)
+    for doctor_id, date, time in appointments.values_list('doctor_id', 'date', 'time'):
+        booked[(doctor_id, date)].add(time)
+
+    days = [start_date + datetime.timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+    result = {}
+    for doctor_id in doctor_ids:
+        weekly = templates.get(doctor_id, {})
+        per_day = {}
+        for day in days:
+            slots = set(weekly.get(day.weekday(), ()))
+            for exception in exceptions.get((doctor_id, day), ()):
+                if exception['is_available']:
+                    if exception['start_time'] and exception['end_time']:
+                        slots.update(_slot_times(exception['start_time'], exception['end_time'], exception['slot_minutes']))
+                else:
+                    slots = {t for t in slots if not _in_range(t, exception['start_time'], exception['end_time'])}
+            slots -= booked.get((doctor_id, day), set())
+            if day == now.date():
+                slots = {t for t in slots if t > now.time().replace(tzinfo=None)}
+            elif day < now.date():
+                slots = set()
+            if slots:
+                per_day[day] = sorted(slots)
+        result[doctor_id] = per_day
+    return result
+
+
+def free_slots_on(doctor_ids, dates, now=None):
+    """
+    free_slots() for scattered ``dates``: one call per MAX_RANGE_DAYS window
+    that holds any of them, so far-apart dates never expand the days between.
+    """
+    doctor_ids = list(doctor_ids)
+    result = defaultdict(dict)
+    dates = sorted(set(dates))
+    while dates:
+        last = dates[0] + datetime.timedelta(days=MAX_RANGE_DAYS - 1)
+        window = [day for day in dates if day <= last]
+        dates = dates[len(window):]
+        for doctor_id, per_day in free_slots(doctor_ids, window[0], window[-1], now=now).items():
+            result[doctor_id].update(per_day)
+    return result
+
+
+def specialty_free_slots(specialty_id, start_date, end_date, now=None):
+    doctor_ids = Doctor.objects.filter(
+        specialty_id=specialty_id, is_available=True
+    ).order_by('id').values_list('id', flat=True)
+    return free_slots(doctor_ids, start_date, end_date, now=now)
+
+
+def scheduled_doctor_ids(doctor_ids):
+    """The subset of ``doctor_ids`` that have set up a structured schedule."""
+    doctor_ids = list(doctor_ids)
+    weekly = DoctorSchedule.objects.filter(doctor_id__in=doctor_ids).values_list('doctor_id', flat=True)
+    extra = ScheduleException.objects.filter(doctor_id__in=doctor_ids, is_available=True).values_list('doctor_id', flat=True)
+    return set(weekly.union(extra))
+
+
+def has_schedule(doctor_id):
+    return bool(scheduled_doctor_ids([doctor_id]))
+
+
+def is_bookable(doctor_id, date, time, now=None, exclude_appointment=None):
+    """
+    Whether ``time`` on ``date`` is a free slot. Doctors who haven't set up a
+    structured schedule yet accept any time that isn't already taken.
+    ``exclude_appointment`` is ignored when checking, for rescheduling it.
+    """
+    if has_schedule(doctor_id):
+        slots = free_slots([doctor_id], date, date, now=now, exclude_appointment=exclude_appointment)
+        return time in slots.get(doctor_id, {}).get(date, ())
+    taken = Appointment.objects.filter(
+        doctor_id=doctor_id, date=date, time=time
+    ).exclude(status__in=Appointment.INACTIVE_STATUSES)
+    if exclude_appointment is not None:
+        taken = taken.exclude(pk=exclude_appointment)
+    return not taken.exists()
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.test import AsyncClient, Client, override_settings
+
+from .http import unique_url
+from .stats import summarize
+
+# (sync DRF path, async path) pairs serving the same data.
+ENDPOINTS = [
+    ('/api/doctors/', '/api/async/doctors/'),
+    ('/api/specialists/', '/api/async/specialists/'),
+    ('/api/symptom-match/?symptoms=fever,headache', '/api/async/symptom-match/?symptoms=fever,headache'),
+]
+
+
+def run_wsgi(path, requests, concurrency):
+    """Sync views through the WSGI handler, one thread (and DB connection) per worker."""
+    local = threading.local()
+
+    def hit(i):
+        client = getattr(local, 'client', None) or Client()
+        local.client = client
+        start = time.perf_counter()
+        response = client.get(unique_url(path, i))
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, response.status_code
+        return elapsed
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(hit, range(requests)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_asgi(path, requests, concurrency):
+    """Any view through the ASGI handler with ``concurrency`` requests in flight."""
+    async def main():
+        client = AsyncClient()
+        gate = asyncio.Semaphore(concurrency)
+
+        async def hit(i):
+            async with gate:
+                start = time.perf_counter()
+                response = await client.get(unique_url(path, i))
+                elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.status_code
+            return elapsed
+
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(hit(i) for i in range(requests)))
+        return summarize(latencies, time.perf_counter() - start)
+
+    return asyncio.run(main())
+
+
+def compare_servers(requests=500, concurrency=50, endpoints=ENDPOINTS):
+    """
+    In-process comparison per endpoint of: sync views under WSGI threads,
+    the same sync views under ASGI (they share one thread there), and the
+    async views under ASGI. Reads whatever data is committed in the database.
+    """
+    results = {}
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for sync_path, async_path in endpoints:
+            results[async_path] = {
+                'wsgi sync': run_wsgi(sync_path, requests, concurrency),
+                'asgi sync': run_asgi(sync_path, requests, concurrency),
+                'asgi async': run_asgi(async_path, requests, concurrency),
+            }
+    return results
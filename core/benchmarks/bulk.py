@@ -0,0 +1,86 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from core.bulk import SpecialistImporter, SymptomMappingImporter, DoctorImporter
+from core.models import CustomUser, Doctor, Specialist
+from core.serializers import SpecialistSerializer, SymptomSpecialtyMapSerializer
+
+
+def _rate(rows, seconds):
+    return round(rows / seconds, 1) if seconds else None
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def _per_row_specialists(rows):
+    for row in rows:
+        with transaction.atomic():
+            serializer = SpecialistSerializer(data=row)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+
+def _per_row_mappings(rows):
+    for row in rows:
+        with transaction.atomic():
+            serializer = SymptomSpecialtyMapSerializer(data=row)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+
+
+def _per_row_doctors(rows):
+    for row in rows:
+        with transaction.atomic():
+            specialty = Specialist.objects.get(pk=row['specialty'])
+            user = CustomUser.objects.create(
+                username=row['username'], password=make_password(None), role='doctor',
+            )
+            Doctor.objects.create(user=user, specialty=specialty, bio=row['bio'])
+
+
+def compare_import_throughput(rows=2000, chunk_size=500):
+    """
+    Rows/sec for one-object-at-a-time creation (what per-object POSTs do)
+    against the bulk importers. Runs inside a transaction that is rolled back,
+    so each per-row "transaction" is a savepoint here.
+    """
+    results = {}
+    with transaction.atomic():
+        specialist_rows = [{'name': f'Bench specialty {i}', 'description': 'x'} for i in range(rows)]
+        results['specialists'] = {
+            'per_row': _rate(rows, _timed(lambda: _per_row_specialists(specialist_rows))),
+            'bulk': _rate(rows, _timed(lambda: SpecialistImporter(
+                [{**row, 'name': row['name'] + ' b'} for row in specialist_rows], chunk_size=chunk_size
+            ).run())),
+        }
+
+        specialty_ids = list(Specialist.objects.values_list('id', flat=True)[:50])
+        mapping_rows = [
+            {'symptom': f'symptom {i}', 'specialty': str(specialty_ids[i % len(specialty_ids)])}
+            for i in range(rows)
+        ]
+        results['symptom-mappings'] = {
+            'per_row': _rate(rows, _timed(lambda: _per_row_mappings(mapping_rows))),
+            'bulk': _rate(rows, _timed(lambda: SymptomMappingImporter(
+                [{**row, 'symptom': row['symptom'] + ' b'} for row in mapping_rows], chunk_size=chunk_size
+            ).run())),
+        }
+
+        doctor_rows = [
+            {'username': f'bench_doctor_{i}', 'specialty': str(specialty_ids[i % len(specialty_ids)]), 'bio': 'x'}
+            for i in range(rows)
+        ]
+        results['doctors'] = {
+            'per_row': _rate(rows, _timed(lambda: _per_row_doctors(doctor_rows))),
+            'bulk': _rate(rows, _timed(lambda: DoctorImporter(
+                [{**row, 'username': row['username'] + '_b'} for row in doctor_rows], chunk_size=chunk_size
+            ).run())),
+        }
+        transaction.set_rollback(True)
+    return results
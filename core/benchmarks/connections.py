@@ -0,0 +1,91 @@
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.test import Client, override_settings
+
+from core.models import CustomUser
+
+from .http import bearer, unique_url
+from .stats import summarize
+
+# Cheap endpoints, where connection setup is most of the work.
+ENDPOINTS = [
+    ('user_role', '/api/auth/role/'),
+    ('specialist_list', '/api/specialists/'),
+]
+
+MODES = {
+    'per_request': {'CONN_MAX_AGE': 0},
+    'persistent': {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True},
+    'pool': {'CONN_MAX_AGE': 0, 'pool': {'min_size': 2, 'max_size': 4, 'timeout': 10}},
+}
+
+
+def available_modes():
+    """Pooling needs PostgreSQL with psycopg[pool]; the other modes run anywhere."""
+    modes = ['per_request', 'persistent']
+    if connection.vendor == 'postgresql':
+        try:
+            import psycopg_pool  # noqa: F401
+        except ImportError:
+            pass
+        else:
+            modes.append('pool')
+    return modes
+
+
+@contextmanager
+def connection_mode(mode):
+    """Reconfigures the default connection for ``mode``, restoring it afterwards."""
+    settings_dict = connection.settings_dict
+    saved = dict(settings_dict, OPTIONS=dict(settings_dict['OPTIONS']))
+    config = dict(MODES[mode])
+    pool = config.pop('pool', None)
+    connection.close()
+    settings_dict.update(config)
+    if pool is not None:
+        settings_dict['OPTIONS']['pool'] = pool
+    try:
+        yield
+    finally:
+        connection.close()
+        if pool is not None:
+            connection.close_pool()
+        settings_dict.clear()
+        settings_dict.update(saved)
+
+
+def measure(path, headers, requests, warmup=5):
+    """
+    Latencies for ``requests`` sequential GETs of ``path``. The test client
+    skips the end-of-request connection cleanup a real server does, so it is
+    run (and timed) after each request here.
+    """
+    client = Client()
+    latencies = []
+    for i in range(warmup + requests):
+        start = time.perf_counter()
+        response = client.get(unique_url(path, i), **headers)
+        close_old_connections()
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, (path, response.status_code)
+        if i >= warmup:
+            latencies.append(elapsed)
+    return summarize(latencies, sum(latencies))
+
+
+def compare_connection_modes(requests=200, modes=None, endpoints=ENDPOINTS):
+    """{endpoint: {mode: latency summary}} for each connection mode."""
+    user, _ = CustomUser.objects.get_or_create(
+        username='bench_admin', defaults={'is_staff': True, 'role': 'admin', 'password': '!'},
+    )
+    headers = {'HTTP_AUTHORIZATION': bearer(user)}
+    results = {}
+    with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+        for mode in modes or available_modes():
+            with connection_mode(mode):
+                for name, path in endpoints:
+                    results.setdefault(name, {})[mode] = measure(path, headers, requests)
+    return results
@@ -0,0 +1,119 @@
+import datetime
+import random
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from core.models import (
+    CustomUser, Specialist, Doctor, Patient, Appointment, Payment, SymptomSpecialtyMap, DoctorSchedule,
+)
+
+SPECIALTY_NAMES = [
+    'Cardiology', 'Dermatology', 'Neurology', 'Pediatrics', 'Orthopedics',
+    'Gynecology', 'Psychiatry', 'Ophthalmology', 'ENT', 'General Practice',
+]
+SYMPTOMS = [
+    'headache', 'chest pain', 'skin rash', 'fever', 'back pain', 'blurred vision',
+    'ear pain', 'anxiety', 'joint pain', 'cough', 'dizziness', 'palpitations',
+    'sore throat', 'abdominal pain', 'insomnia', 'itching', 'numbness', 'fatigue',
+]
+STATUSES = ['pending', 'confirmed', 'completed', 'cancelled']
+
+
+# ---- DETERMINISTIC DATA GENERATOR ----
+@transaction.atomic
+def generate(specialists=10, doctors=100, patients=500, appointments=5000,
+             mappings=200, payment_ratio=0.5, seed=42, start_date=None, batch_size=1000, schedules=True):
+    """
+    Bulk-inserts a reproducible dataset: the same arguments always produce the
+    same rows, so benchmark runs can be compared. Users get unusable passwords
+    so no time is spent hashing. With ``schedules`` every doctor works
+    Monday to Friday, 09:00-17:00 in 30 minute slots.
+    """
+    rng = random.Random(seed)
+    start_date = start_date or datetime.date(2024, 1, 1)
+    prefix = f"bench{seed}"
+
+    specialist_objs = Specialist.objects.bulk_create([
+        Specialist(name=f"{SPECIALTY_NAMES[i % len(SPECIALTY_NAMES)]} {i // len(SPECIALTY_NAMES) or ''}".strip(),
+                   description=f"Specialty #{i}")
+        for i in range(specialists)
+    ], batch_size=batch_size)
+
+    doctor_users = CustomUser.objects.bulk_create([
+        CustomUser(username=f"{prefix}_doc{i}", first_name='Doctor', last_name=f"D{i}",
+                   email=f"{prefix}_doc{i}@example.com", password='!', role='doctor')
+        for i in range(doctors)
+    ], batch_size=batch_size)
+    doctor_objs = Doctor.objects.bulk_create([
+        Doctor(user=user, specialty=rng.choice(specialist_objs) if specialist_objs else None,
+               bio=f"Experienced in {rng.choice(SYMPTOMS)} and {rng.choice(SYMPTOMS)}",
+               is_available=rng.random() < 0.9)
+        for user in doctor_users
+    ], batch_size=batch_size)
+
+    if schedules:
+        DoctorSchedule.objects.bulk_create([
+            DoctorSchedule(doctor=doctor, weekday=weekday, start_time=datetime.time(9), end_time=datetime.time(17))
+            for doctor in doctor_objs for weekday in range(5)
+        ], batch_size=batch_size)
+
+    patient_users = CustomUser.objects.bulk_create([
+        CustomUser(username=f"{prefix}_pat{i}", first_name='Patient', last_name=f"P{i}",
+                   email=f"{prefix}_pat{i}@example.com", password='!', role='patient')
+        for i in range(patients)
+    ], batch_size=batch_size)
+    patient_objs = Patient.objects.bulk_create([
+        Patient(user=user, age=rng.randint(1, 90), gender=rng.choice(['M', 'F']),
+                phone=f"07{rng.randint(0, 99999999):08d}", address='Nairobi')
+        for user in patient_users
+    ], batch_size=batch_size)
+
+    SymptomSpecialtyMap.objects.bulk_create([
+        SymptomSpecialtyMap(
+            symptom=SYMPTOMS[i % len(SYMPTOMS)] + ('' if i < len(SYMPTOMS) else f" {i}"),
+            specialty=rng.choice(specialist_objs),
+        )
+        for i in range(mappings)
+    ] if specialist_objs else [], batch_size=batch_size)
+
+    # One appointment per (doctor, date, hour) so the slot constraint holds.
+    appointment_objs, taken = [], set()
+    while len(appointment_objs) < appointments and doctor_objs:
+        doctor = rng.choice(doctor_objs)
+        slot = (doctor.pk, rng.randint(0, 729), rng.randint(8, 17))
+        if slot in taken:
+            continue
+        taken.add(slot)
+        appointment_objs.append(Appointment(
+            doctor=doctor,
+            patient=rng.choice(patient_objs) if patient_objs else None,
+            date=start_date + datetime.timedelta(days=slot[1]),
+            time=datetime.time(slot[2], 0),
+            status=rng.choice(STATUSES),
+        ))
+    appointment_objs = Appointment.objects.bulk_create(appointment_objs, batch_size=batch_size)
+
+    now = timezone.now()
+    payment_objs = [
+        Payment(appointment=appointment, amount=Decimal(rng.randint(5, 50) * 100),
+                method=rng.choice(['mpesa', 'stripe']), transaction_id=f"{prefix}_tx{appointment.pk}",
+                status=rng.choice(['pending', 'paid', 'failed']))
+        for appointment in appointment_objs if rng.random() < payment_ratio
+    ]
+    payment_objs = Payment.objects.bulk_create(payment_objs, batch_size=batch_size)
+    # auto_now_add ignores explicit values, so spread created_at afterwards.
+    for payment in payment_objs:
+        payment.created_at = now - datetime.timedelta(minutes=rng.randint(0, 525600))
+    Payment.objects.bulk_update(payment_objs, ['created_at'], batch_size=batch_size)
+
+    return {
+        'specialists': len(specialist_objs),
+        'doctors': len(doctor_objs),
+        'patients': len(patient_objs),
+        'appointments': len(appointment_objs),
+        'payments': len(payment_objs),
+        'mappings': mappings if specialist_objs else 0,
+        'schedules': len(doctor_objs) * 5 if schedules else 0,
+    }
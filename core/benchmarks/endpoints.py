@@ -0,0 +1,97 @@
+import datetime
+import statistics
+import time
+import tracemalloc
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Doctor, Patient, Specialist, CustomUser
+
+from .http import bearer, unique_url
+from .stats import summarize
+
+
+def default_endpoints():
+    """
+    (name, path, auth) for the endpoints worth tracking, built from the
+    generated data. ``auth`` is 'patient', 'admin' or None.
+    """
+    doctor = Doctor.objects.order_by('id').first()
+    specialist = Specialist.objects.order_by('id').first()
+    start = datetime.date.today() + datetime.timedelta(days=30)
+    return [
+        ('doctor_list', '/api/doctors/', None),
+        ('doctors_by_specialty', f'/api/doctors/by-specialty/?specialty={specialist.name}', None),
+        ('doctor_search', '/api/doctors/by-specialty/?search=fever&available=true', None),
+        ('doctor_slots', f'/api/doctors/{doctor.id}/slots/?start={start}', None),
+        ('specialist_list', '/api/specialists/', None),
+        ('symptom_match', '/api/symptom-match/?symptoms=fever,headache', None),
+        ('appointment_list', '/api/appointments/', 'admin'),
+        ('my_appointments', '/api/appointments/my/', 'patient'),
+        ('payment_list', '/api/payments/', 'admin'),
+    ]
+
+
+def auth_headers():
+    patient = Patient.objects.select_related('user').order_by('id').first()
+    admin, _ = CustomUser.objects.get_or_create(
+        username='bench_admin', defaults={'is_staff': True, 'role': 'admin', 'password': '!'},
+    )
+    return {
+        'patient': {'HTTP_AUTHORIZATION': bearer(patient.user)},
+        'admin': {'HTTP_AUTHORIZATION': bearer(admin)},
+        None: {},
+    }
+
+
+def measure_endpoint(client, path, headers, iterations=50, warmup=5, alloc_iterations=5):
+    """
+    Latency percentiles and query counts over ``iterations`` uncached
+    requests, then peak traced allocation per request over a few more
+    (tracemalloc slows everything down, so it isn't on while timing).
+    """
+    for i in range(warmup):
+        client.get(unique_url(path, i), **headers)
+
+    latencies, queries = [], []
+    start = time.perf_counter()
+    for i in range(iterations):
+        with CaptureQueriesContext(connection) as ctx:
+            began = time.perf_counter()
+            response = client.get(unique_url(path, i), **headers)
+            latencies.append(time.perf_counter() - began)
+        assert response.status_code == 200, (path, response.status_code)
+        queries.append(len(ctx.captured_queries))
+    result = summarize(latencies, time.perf_counter() - start)
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(alloc_iterations):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            client.get(unique_url(path, i), **headers)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    result.update({
+        'queries_min': min(queries),
+        'queries_max': max(queries),
+        'response_bytes': len(response.content),
+        'peak_alloc_kib': round(statistics.median(peaks) / 1024, 1) if peaks else None,
+    })
+    return result
+
+
+def run_endpoint_benchmarks(iterations=50, warmup=5, only=None):
+    client = Client()
+    headers = auth_headers()
+    results = {}
+    for name, path, auth in default_endpoints():
+        if only and name not in only:
+            continue
+        results[name] = {'path': path, **measure_endpoint(client, path, headers[auth], iterations, warmup)}
+    return results
@@ -0,0 +1,13 @@
+import time
+
+
+def unique_url(path, i):
+    """A distinct query string per request keeps the response cache out of a measurement."""
+    return f"{path}{'&' if '?' in path else '?'}_bench={time.monotonic_ns()}-{i}"
+
+
+def bearer(user):
+    """Authorization header value for ``user`` with the same claims a login issues."""
+    from core.views import CustomTokenObtainPairSerializer
+
+    return f'Bearer {CustomTokenObtainPairSerializer.get_token(user).access_token}'
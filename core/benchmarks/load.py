@@ -0,0 +1,78 @@
+import datetime
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.test import Client
+
+from core.models import Doctor, Patient
+
+from .http import bearer
+from .stats import summarize
+
+
+def run_booking_load(workers=16, bookings=400, doctors=5, days=5, seed=42):
+    """
+    Drives the booking flow from ``workers`` threads: fetch a doctor's free
+    slots, pick one, POST the appointment. Few doctors and days keep
+    contention high, so 409 conflicts are expected; anything else is an error.
+    Expects the generated dataset's weekday schedules.
+    """
+    doctor_ids = list(Doctor.objects.filter(is_available=True).order_by('id').values_list('id', flat=True)[:doctors])
+    patients = list(Patient.objects.select_related('user').order_by('id')[:workers])
+    tokens = [bearer(patient.user) for patient in patients]
+
+    start_date = datetime.date.today() + datetime.timedelta(days=30)
+    end_date = start_date + datetime.timedelta(days=days - 1)
+    local = threading.local()
+    rng_lock = threading.Lock()
+    rng = random.Random(seed)
+
+    def book(i):
+        # Server errors become 'error_500' outcomes instead of aborting the run.
+        client = getattr(local, 'client', None) or Client(raise_request_exception=False)
+        local.client = client
+        headers = {'HTTP_AUTHORIZATION': tokens[i % len(tokens)]}
+        with rng_lock:
+            doctor_id = rng.choice(doctor_ids)
+            pick = rng.random()
+
+        began = time.perf_counter()
+        response = client.get(f'/api/doctors/{doctor_id}/slots/?start={start_date}&end={end_date}&_bench={i}', **headers)
+        if response.status_code != 200:
+            return f'error_{response.status_code}', time.perf_counter() - began
+        slots = response.json()
+        free = [(day, t) for day, times in slots.items() for t in times]
+        if not free:
+            return 'sold_out', time.perf_counter() - began
+        day, slot = free[int(pick * len(free))]
+        response = client.post(
+            '/api/appointments/', {'doctor': doctor_id, 'date': day, 'time': slot},
+            content_type='application/json', **headers,
+        )
+        outcome = {201: 'booked', 409: 'conflict'}.get(response.status_code, f'error_{response.status_code}')
+        return outcome, time.perf_counter() - began
+
+    barrier = threading.Barrier(workers)
+
+    def close_connections(_):
+        # One call per worker thread: each closes the connection it opened.
+        barrier.wait()
+        connections.close_all()
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(book, range(bookings)))
+        seconds = time.perf_counter() - began
+        list(pool.map(close_connections, range(workers)))
+
+    outcomes = Counter(outcome for outcome, _ in results)
+    return {
+        'workers': workers,
+        'doctors': len(doctor_ids),
+        'outcomes': dict(sorted(outcomes.items())),
+        'flow': summarize([latency for _, latency in results], seconds),
+    }
@@ -0,0 +1,104 @@
+import random
+import time
+
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Appointment, Payment
+from core.payments import ingest_events
+
+from .data import generate
+
+
+# ---- STAND-IN PROVIDER ----
+def provider_events(appointment_ids, seed=42, replay_ratio=0.2, failure_ratio=0.1, prefix='prov'):
+    """
+    Callbacks as a provider would deliver them for ``appointment_ids``: a
+    'pending' then a 'paid' (or 'failed') event per transaction, with a
+    share replayed and the whole stream shuffled so some arrive out of order.
+    """
+    rng = random.Random(seed)
+    events = []
+    for appointment_id in appointment_ids:
+        base = {
+            'transaction_id': f'{prefix}_{appointment_id}', 'appointment': appointment_id,
+            'amount': f'{rng.randint(5, 50) * 100}.00', 'method': rng.choice(['mpesa', 'stripe']),
+        }
+        final = 'failed' if rng.random() < failure_ratio else 'paid'
+        events += [{**base, 'status': 'pending'}, {**base, 'status': final}]
+    events += [dict(event) for event in events if rng.random() < replay_ratio]
+    rng.shuffle(events)
+    return events
+
+
+def settlement_rows(events, seed=42, drift=0):
+    """
+    The provider's settlement file for ``events``: the final state of every
+    transaction, with ``drift`` rows altered (amount off, unknown transaction)
+    so reconciliation has something to find.
+    """
+    rng = random.Random(seed)
+    final = {}
+    for event in events:
+        current = final.get(event['transaction_id'])
+        if current is None or event['status'] in ('paid', 'failed'):
+            final[event['transaction_id']] = event
+    rows = [
+        {'transaction_id': tid, 'amount': event['amount'], 'status': event['status']}
+        for tid, event in sorted(final.items())
+    ]
+    for row in rng.sample(rows, min(drift, len(rows))):
+        if rng.random() < 0.5:
+            row['amount'] = f"{float(row['amount']) + 1:.2f}"
+        else:
+            row['transaction_id'] += '_unknown'
+    return rows
+
+
+# ---- THROUGHPUT ----
+def ingest_throughput(appointments=2000, batch_size=200, seed=42):
+    """
+    Events/sec and queries per event for batched ingestion against saving
+    each event through the ORM one at a time. Everything is rolled back.
+    """
+    results = {}
+    with transaction.atomic():
+        generate(specialists=3, doctors=20, patients=50, appointments=appointments, mappings=0,
+                 payment_ratio=0, seed=seed + 1000, schedules=False)
+        ids = list(Appointment.objects.order_by('-id').values_list('id', flat=True)[:appointments])
+        half = len(ids) // 2
+
+        events = provider_events(ids[:half], seed=seed, prefix='batch')
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            for i in range(0, len(events), batch_size):
+                ingest_events(events[i:i + batch_size])
+            seconds = time.perf_counter() - start
+        results['batched'] = _rate(len(events), seconds, len(ctx.captured_queries))
+
+        events = provider_events(ids[half:], seed=seed, prefix='single')
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            for event in events:
+                _save_one(event)
+            seconds = time.perf_counter() - start
+        results['one by one'] = _rate(len(events), seconds, len(ctx.captured_queries))
+        transaction.set_rollback(True)
+    return results
+
+
+def _save_one(event):
+    # What a per-callback view would do: look up, then create or update.
+    payment = Payment.objects.filter(transaction_id=event['transaction_id']).first()
+    if payment is None:
+        payment = Payment(transaction_id=event['transaction_id'], appointment_id=event['appointment'])
+    payment.amount, payment.method, payment.status = event['amount'], event['method'], event['status']
+    payment.save()
+
+
+def _rate(events, seconds, queries):
+    return {
+        'events': events,
+        'events_per_sec': round(events / seconds, 1) if seconds else None,
+        'queries_per_event': round(queries / events, 2) if events else None,
+    }
@@ -0,0 +1,59 @@
+from django.db import connection
+
+from core.models import Appointment, Payment, SymptomSpecialtyMap
+
+from .data import generate
+from .suite import scratch_database
+
+# Indexes added by 0002_hot_lookup_indexes; dropped temporarily to show the
+# "before" plan.
+HOT_INDEXES = {
+    'postgresql': ['appt_patient_date_idx', 'appt_doctor_slot_idx', 'payment_status_created_idx', 'symptom_trgm_idx'],
+    'sqlite': ['appt_patient_date_idx', 'appt_doctor_slot_idx', 'payment_status_created_idx', 'symptom_nocase_idx'],
+}
+
+
+def hot_queries():
+    queries = {
+        'payments_by_status': Payment.objects.filter(status='paid').order_by('-created_at')[:50],
+        'symptom_substring': SymptomSpecialtyMap.objects.filter(symptom__icontains='pain'),
+        'symptom_prefix': SymptomSpecialtyMap.objects.filter(symptom__istartswith='head'),
+    }
+    # The appointment lookups need a row to take their parameters from.
+    appointment = Appointment.objects.order_by('pk').first()
+    if appointment is not None:
+        queries['my_appointments'] = Appointment.objects.filter(patient_id=appointment.patient_id).order_by('-date')
+        queries['doctor_schedule'] = Appointment.objects.filter(
+            doctor_id=appointment.doctor_id, date=appointment.date, status='pending',
+        ).order_by('time')
+    return queries
+
+
+def explain(queryset, label):
+    # The label makes the SQL text unique per pass; SQLite's statement cache
+    # would otherwise hand back the plan prepared before the indexes changed.
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql} /* {label} */', params)
+        return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+
+def explain_all(label):
+    return {name: explain(queryset, label) for name, queryset in hot_queries().items()}
+
+
+def compare_plans(**scale):
+    """
+    Seeds a scratch database, captures query plans with and without the hot
+    lookup indexes, then destroys it. Dropping indexes locks their tables,
+    so this never touches the configured database itself.
+    """
+    with scratch_database():
+        counts = generate(**scale)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            after = explain_all('after')
+            for name in HOT_INDEXES.get(connection.vendor, []):
+                cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(name)}')
+            before = explain_all('before')
+    return {'dataset': counts, 'before': before, 'after': after}
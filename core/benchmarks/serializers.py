@@ -0,0 +1,66 @@
+import time
+
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from core.flat import get_flat_plan
+from core.models import Appointment, Doctor, Payment
+from core.querysets import eager_load
+from core.renderers import FastJSONRenderer
+from core.serializers import AppointmentSerializer, DoctorSerializer, PaymentSerializer
+
+from .data import generate
+
+TARGETS = (
+    ('appointments', Appointment, AppointmentSerializer),
+    ('payments', Payment, PaymentSerializer),
+    ('doctors', Doctor, DoctorSerializer),
+)
+
+
+def _nested(queryset, serializer_class):
+    serializer = serializer_class()
+    rows = serializer_class(eager_load(queryset, serializer), many=True).data
+    return JSONRenderer().render(rows)
+
+
+def _flat(queryset, serializer_class):
+    plan = get_flat_plan(serializer_class())
+    return FastJSONRenderer().render(plan.represent(plan.apply(queryset)))
+
+
+def _rate(fn, queryset, serializer_class, repeat):
+    best, body = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(queryset, serializer_class)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, body
+
+
+def compare_serializers(rows=5000, repeat=3, seed=14):
+    """
+    Rows/sec (query + serialize + render, best of ``repeat``) for the nested
+    serializers against their flat plans over generated data, checking the
+    two produce the same bytes. Everything is rolled back.
+    """
+    results = {}
+    with transaction.atomic():
+        generate(doctors=max(rows // 50, 10), patients=max(rows // 10, 10), appointments=rows,
+                 payment_ratio=0.5, seed=seed, schedules=False)
+        for name, model, serializer_class in TARGETS:
+            queryset = model.objects.order_by('id')
+            count = queryset.count()
+            nested, nested_body = _rate(_nested, queryset, serializer_class, repeat)
+            flat, flat_body = _rate(_flat, queryset, serializer_class, repeat)
+            if nested_body != flat_body:
+                raise AssertionError(f'{serializer_class.__name__}: flat output differs from the serializer')
+            results[name] = {
+                'rows': count,
+                'nested_rows_per_sec': round(count / nested, 1),
+                'flat_rows_per_sec': round(count / flat, 1),
+                'speedup': round(nested / flat, 2),
+            }
+        transaction.set_rollback(True)
+    return results
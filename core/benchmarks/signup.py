@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from core.models import CustomUser, Patient
+from core.registration import register_user
+
+MD5_HASHER = 'django.contrib.auth.hashers.MD5PasswordHasher'
+
+
+def _legacy_signup(i, prefix):
+    # What RegisterSerializer.create + RegisterView.perform_create used to do.
+    user = CustomUser.objects.create_user(username=f'{prefix}{i}', password='S3cure-pass!')
+    user.save()
+    Patient.objects.create(user=user, age=30, gender='F', phone='0700000000', address='Nairobi')
+    Patient.objects.get_or_create(user=user)
+
+
+def _service_signup(i, prefix, hasher):
+    register_user(
+        role='patient', username=f'{prefix}{i}', password='S3cure-pass!', hasher=hasher,
+        age=30, gender='F', phone='0700000000', address='Nairobi',
+    )
+
+
+def _measure(fn, count):
+    with CaptureQueriesContext(connection) as ctx:
+        start = time.perf_counter()
+        for i in range(count):
+            fn(i)
+        seconds = time.perf_counter() - start
+    return {
+        'signups_per_sec': round(count / seconds, 1) if seconds else None,
+        'queries_per_signup': round(len(ctx.captured_queries) / count, 2),
+    }
+
+
+def signup_throughput(count=200, hashers=('default', 'md5')):
+    """
+    Signups/sec and queries per signup for the old registration path and for
+    register_user with each hasher. Everything is rolled back.
+    """
+    hasher_paths = list(settings.PASSWORD_HASHERS)
+    if 'md5' in hashers and MD5_HASHER not in hasher_paths:
+        hasher_paths.append(MD5_HASHER)
+
+    results = {}
+    with override_settings(PASSWORD_HASHERS=hasher_paths), transaction.atomic():
+        results['legacy (default)'] = _measure(lambda i: _legacy_signup(i, 'bench_legacy_'), count)
+        for hasher in hashers:
+            name = get_hasher(hasher).algorithm
+            results[f'service ({name})'] = _measure(
+                lambda i: _service_signup(i, f'bench_{name}_', hasher), count
+            )
+        transaction.set_rollback(True)
+    return results
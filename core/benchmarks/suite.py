@@ -0,0 +1,118 @@
+import datetime
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+
+from core import matching
+
+from .data import generate
+from .endpoints import run_endpoint_benchmarks
+from .load import run_booking_load
+
+SCALES = {
+    'small': dict(specialists=10, doctors=50, patients=200, appointments=2000, mappings=100),
+    'medium': dict(specialists=20, doctors=200, patients=1000, appointments=20000, mappings=300),
+    'large': dict(specialists=40, doctors=1000, patients=10000, appointments=200000, mappings=1000),
+}
+COMPARED_METRICS = ('rps', 'p50_ms', 'p99_ms', 'queries_max', 'peak_alloc_kib')
+
+
+@contextmanager
+def scratch_database():
+    """
+    A throwaway test database, created and destroyed the way the test runner
+    does it. SQLite gets a WAL-mode file instead of the shared in-memory
+    database, whose table locks fail concurrent readers outright, and
+    BEGIN IMMEDIATE so concurrent writers queue instead of failing to upgrade
+    their read locks.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    options = connection.settings_dict.setdefault('OPTIONS', {})
+    old_options = dict(options)
+    scratch_dir = None
+    if connection.vendor == 'sqlite':
+        options.setdefault('transaction_mode', 'IMMEDIATE')
+        if not old_test_name:
+            scratch_dir = tempfile.TemporaryDirectory(prefix='tibanow-bench-')
+            test_settings['NAME'] = os.path.join(scratch_dir.name, 'bench.sqlite3')
+
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        test_settings['NAME'] = old_test_name
+        options.clear()
+        options.update(old_options)
+        if scratch_dir is not None:
+            scratch_dir.cleanup()
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(scale='small', seed=42, iterations=50, warmup=5, endpoints=None,
+              load=True, load_workers=16, load_bookings=400):
+    """
+    Seeds a scratch database with the deterministic dataset, then runs the
+    endpoint micro-benchmarks and (optionally) the concurrent booking load.
+    Returns a JSON-serialisable dict; same arguments, same data.
+    """
+    report = {
+        'meta': {
+            'started_at': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'scale': scale,
+            'seed': seed,
+            'iterations': iterations,
+        },
+    }
+    with override_settings(DEBUG=False, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']), scratch_database():
+        started = time.perf_counter()
+        report['data'] = generate(seed=seed, **SCALES[scale])
+        report['meta']['seed_seconds'] = round(time.perf_counter() - started, 2)
+        matching.invalidate()
+
+        report['endpoints'] = run_endpoint_benchmarks(iterations=iterations, warmup=warmup, only=endpoints)
+        if load:
+            report['load'] = run_booking_load(workers=load_workers, bookings=load_bookings, seed=seed)
+    return report
+
+
+def compare(baseline, current):
+    """Per endpoint and metric: (baseline, current, % change) for metrics both runs have."""
+    changes = {}
+    for name, result in current.get('endpoints', {}).items():
+        before = baseline.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        changes[name] = {}
+        for metric in COMPARED_METRICS:
+            old, new = before.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            pct = round((new - old) / old * 100, 1) if old else None
+            changes[name][metric] = (old, new, pct)
+    return changes
@@ -0,0 +1,100 @@
+import random
+import time as _time
+
+from django.db import IntegrityError, OperationalError, connection, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import availability
+from .models import Doctor, Appointment
+
+
+class SlotUnavailable(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This time slot is no longer available.'
+    default_code = 'slot_unavailable'
+
+
+LOCK_RETRIES = 5
+
+
+# ---- BOOKING ----
+def book_appointment(*, doctor, date, time, patient=None, **fields):
+    """
+    Books ``doctor`` at ``date``/``time`` or raises SlotUnavailable, retrying
+    a few times when the database reports a lock conflict or deadlock (SQLite
+    "database is locked", PostgreSQL deadlock detection). Retries only happen
+    when we own the transaction; inside an outer atomic block the error is
+    re-raised for the caller to handle.
+    """
+    for attempt in range(LOCK_RETRIES):
+        try:
+            return _book(doctor=doctor, date=date, time=time, patient=patient, **fields)
+        except OperationalError:
+            if connection.in_atomic_block or attempt == LOCK_RETRIES - 1:
+                raise
+            _time.sleep(0.01 * 2 ** attempt * (1 + random.random()))
+
+
+def _lock_slot(doctor_id, date, time, exclude_appointment=None):
+    """
+    Locks the doctor row with SELECT ... FOR UPDATE, so concurrent bookings
+    for one doctor queue up behind each other (SQLite serializes writers
+    instead), then checks the doctor takes appointments and the slot is
+    free. Must run inside a transaction.
+    """
+    locked = Doctor.objects.select_for_update().filter(pk=doctor_id).values_list('is_available', flat=True)
+    is_available = next(iter(locked), None)
+    if is_available is None:
+        raise SlotUnavailable('Doctor not found.')
+    if not is_available:
+        raise SlotUnavailable('This doctor is not accepting appointments.')
+    if not availability.is_bookable(doctor_id, date, time, exclude_appointment=exclude_appointment):
+        raise SlotUnavailable()
+
+
+def _book(*, doctor, date, time, patient=None, **fields):
+    """
+    Books under the doctor row lock (see _lock_slot). The partial unique
+    constraint on (doctor, date, time) catches anything that still slips
+    through.
+    """
+    doctor_id = doctor.pk if isinstance(doctor, Doctor) else doctor
+    with transaction.atomic():
+        _lock_slot(doctor_id, date, time)
+        try:
+            with transaction.atomic():
+                return Appointment.objects.create(
+                    doctor_id=doctor_id, patient=patient, date=date, time=time, **fields
+                )
+        except IntegrityError:
+            raise SlotUnavailable()
+
+
+def reschedule_appointment(appointment, **changes):
+    """
+    Saves changes to an existing appointment. Moving it to another doctor,
+    date or time, or reactivating a cancelled one, goes through the same
+    locked checks as booking; slot collisions are 409s.
+    """
+    doctor = changes.get('doctor', appointment.doctor_id)
+    doctor_id = doctor.pk if isinstance(doctor, Doctor) else doctor
+    date, time = changes.get('date', appointment.date), changes.get('time', appointment.time)
+    status = changes.get('status', appointment.status)
+    moved = (date, time) != (appointment.date, appointment.time)
+    takes_slot = status not in Appointment.INACTIVE_STATUSES and (
+        moved or doctor_id != appointment.doctor_id or appointment.status in Appointment.INACTIVE_STATUSES
+    )
+    try:
+        with transaction.atomic():
+            if takes_slot:
+                _lock_slot(doctor_id, date, time, exclude_appointment=appointment.pk)
+            for name, value in changes.items():
+                setattr(appointment, name, value)
+            if moved:
+                # The reminder was for the old slot.
+                appointment.reminder_sent_at = None
+            appointment.save()
+    except IntegrityError:
+        raise SlotUnavailable()
+    return appointment
@@ -0,0 +1,303 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import availability, cache, dashboard, matching
+from .booking import SlotUnavailable
+from .models import Doctor, Patient, Appointment, Specialist, SymptomSpecialtyMap
+
+User = get_user_model()
+
+MAX_ROWS = 10000
+
+
+# ---- ROW VALIDATION ----
+# Plain serializers: field-level checks only, no per-row database lookups.
+# References are resolved for the whole batch afterwards.
+class SpecialistRowSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=100)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+
+
+class SymptomMappingRowSerializer(serializers.Serializer):
+    symptom = serializers.CharField(max_length=100)
+    specialty = serializers.CharField(help_text="Specialist id or name")
+
+
+class DoctorRowSerializer(serializers.Serializer):
+    username = serializers.CharField(max_length=150, validators=[UnicodeUsernameValidator()])
+    email = serializers.EmailField(required=False, allow_blank=True, default='')
+    first_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    last_name = serializers.CharField(max_length=150, required=False, allow_blank=True, default='')
+    password = serializers.CharField(required=False, allow_blank=True, write_only=True)
+    specialty = serializers.CharField(required=False, allow_blank=True, help_text="Specialist id or name")
+    bio = serializers.CharField(required=False, allow_blank=True, default='')
+    is_available = serializers.BooleanField(required=False, default=True)
+
+
+class AppointmentRowSerializer(serializers.Serializer):
+    doctor = serializers.IntegerField()
+    patient = serializers.IntegerField()
+    date = serializers.DateField()
+    time = serializers.TimeField()
+    status = serializers.CharField(max_length=20, required=False, default='pending')
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True, default=None)
+
+
+def resolve_specialties(references):
+    """Maps each id-or-name reference to a Specialist id with one query."""
+    ids = {int(ref) for ref in references if ref.isdigit()}
+    names = {ref.lower() for ref in references if not ref.isdigit()}
+    found = {}
+    rows = Specialist.objects.annotate(lower_name=Lower('name')).filter(
+        Q(id__in=ids) | Q(lower_name__in=names)
+    ).values_list('id', 'lower_name')
+    for pk, lower_name in rows:
+        found[str(pk)] = pk
+        found.setdefault(lower_name, pk)
+    return {ref: found.get(ref if ref.isdigit() else ref.lower()) for ref in references}
+
+
+# ---- IMPORTERS ----
+class BulkImporter:
+    """
+    Validates a batch of rows, resolves references with a handful of queries
+    and writes with bulk_create/bulk_update in chunks inside one transaction.
+
+    By default a batch with any invalid row writes nothing; ``partial=True``
+    writes the valid rows and still reports the rest.
+    """
+    row_serializer_class = None
+
+    def __init__(self, rows, chunk_size=500, partial=False):
+        self.rows = rows
+        self.chunk_size = chunk_size
+        self.partial = partial
+        self.errors = {}
+
+    def add_error(self, index, field, message):
+        self.errors.setdefault(index, {}).setdefault(field, []).append(message)
+
+    def validate(self):
+        cleaned = {}
+        for index, row in enumerate(self.rows):
+            serializer = self.row_serializer_class(data=row)
+            if serializer.is_valid():
+                cleaned[index] = serializer.validated_data
+            else:
+                self.errors[index] = serializer.errors
+        self.resolve(cleaned)
+        return {index: data for index, data in cleaned.items() if index not in self.errors}
+
+    def resolve(self, cleaned):
+        """Batch-level checks: references, duplicates. Records errors in place."""
+
+    def write(self, valid):
+        raise NotImplementedError
+
+    def run(self):
+        if len(self.rows) > MAX_ROWS:
+            raise serializers.ValidationError({"detail": f"At most {MAX_ROWS} rows per request."})
+        valid = self.validate()
+        counts = {'created': 0, 'updated': 0}
+        if valid and (self.partial or not self.errors):
+            with transaction.atomic():
+                counts.update(self.write(valid))
+        return {
+            **counts,
+            'errors': [{'row': index, 'errors': errors} for index, errors in sorted(self.errors.items())],
+        }
+
+
+class SpecialistImporter(BulkImporter):
+    """Upserts specialists by name."""
+    row_serializer_class = SpecialistRowSerializer
+
+    def resolve(self, cleaned):
+        seen = {}
+        for index, data in cleaned.items():
+            key = data['name'].lower()
+            if key in seen:
+                self.add_error(index, 'name', f"Duplicate of row {seen[key]}.")
+            else:
+                seen[key] = index
+
+    def write(self, valid):
+        names = [data['name'] for data in valid.values()]
+        existing = {
+            s.name.lower(): s
+            for s in Specialist.objects.annotate(lower_name=Lower('name')).filter(
+                lower_name__in=[name.lower() for name in names]
+            )
+        }
+        to_create, to_update = [], []
+        for data in valid.values():
+            specialist = existing.get(data['name'].lower())
+            if specialist is None:
+                to_create.append(Specialist(name=data['name'], description=data['description']))
+            else:
+                # bulk_update() skips auto_now.
+                specialist.description, specialist.updated_at = data['description'], timezone.now()
+                to_update.append(specialist)
+        Specialist.objects.bulk_create(to_create, batch_size=self.chunk_size)
+        Specialist.objects.bulk_update(to_update, ['description', 'updated_at'], batch_size=self.chunk_size)
+        # bulk_create/bulk_update send no signals.
+        transaction.on_commit(matching.invalidate)
+        transaction.on_commit(lambda: cache.bump('specialist'))
+        return {'created': len(to_create), 'updated': len(to_update)}
+
+
+class SymptomMappingImporter(BulkImporter):
+    """Creates symptom mappings, skipping pairs that already exist."""
+    row_serializer_class = SymptomMappingRowSerializer
+
+    def resolve(self, cleaned):
+        specialties = resolve_specialties({data['specialty'] for data in cleaned.values()})
+        for index, data in cleaned.items():
+            data['specialty_id'] = specialties.get(data['specialty'])
+            if data['specialty_id'] is None:
+                self.add_error(index, 'specialty', f"Unknown specialty '{data['specialty']}'.")
+
+    def write(self, valid):
+        pairs = {(data['symptom'].strip().lower(), data['specialty_id']) for data in valid.values()}
+        existing = {
+            (symptom.lower(), specialty_id)
+            for symptom, specialty_id in SymptomSpecialtyMap.objects.filter(
+                specialty_id__in={pair[1] for pair in pairs}
+            ).values_list('symptom', 'specialty_id')
+        }
+        to_create, seen = [], set(existing)
+        for data in valid.values():
+            pair = (data['symptom'].strip().lower(), data['specialty_id'])
+            if pair not in seen:
+                seen.add(pair)
+                to_create.append(SymptomSpecialtyMap(symptom=data['symptom'].strip(), specialty_id=data['specialty_id']))
+        SymptomSpecialtyMap.objects.bulk_create(to_create, batch_size=self.chunk_size)
+        transaction.on_commit(matching.invalidate)
+        return {'created': len(to_create)}
+
+
+class DoctorImporter(BulkImporter):
+    """Creates doctor accounts (user + Doctor profile)."""
+    row_serializer_class = DoctorRowSerializer
+
+    def resolve(self, cleaned):
+        usernames = {data['username'] for data in cleaned.values()}
+        taken = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        specialties = resolve_specialties({data['specialty'] for data in cleaned.values() if data.get('specialty')})
+
+        seen = {}
+        for index, data in cleaned.items():
+            username = data['username']
+            if username in taken:
+                self.add_error(index, 'username', 'A user with that username already exists.')
+            elif username in seen:
+                self.add_error(index, 'username', f"Duplicate of row {seen[username]}.")
+            else:
+                seen[username] = index
+            reference = data.get('specialty')
+            data['specialty_id'] = specialties.get(reference) if reference else None
+            if reference and data['specialty_id'] is None:
+                self.add_error(index, 'specialty', f"Unknown specialty '{reference}'.")
+
+    def write(self, valid):
+        users = User.objects.bulk_create([
+            User(
+                username=data['username'], email=data['email'],
+                first_name=data['first_name'], last_name=data['last_name'],
+                # No password given: unusable until the doctor sets one.
+                password=make_password(data.get('password') or None),
+                role='doctor',
+            )
+            for data in valid.values()
+        ], batch_size=self.chunk_size)
+        Doctor.objects.bulk_create([
+            Doctor(user=user, specialty_id=data['specialty_id'], bio=data['bio'], is_available=data['is_available'])
+            for user, data in zip(users, valid.values())
+        ], batch_size=self.chunk_size)
+        transaction.on_commit(matching.invalidate)
+        transaction.on_commit(lambda: cache.bump('doctor'))
+        transaction.on_commit(lambda: cache.bump('user'))
+        return {'created': len(users)}
+
+
+class AppointmentImporter(BulkImporter):
+    """Books many appointments at once, checking slots for the whole batch in one pass."""
+    row_serializer_class = AppointmentRowSerializer
+
+    def resolve(self, cleaned):
+        if not cleaned:
+            return
+        doctor_ids = {data['doctor'] for data in cleaned.values()}
+        patient_ids = {data['patient'] for data in cleaned.values()}
+        known_doctors = dict(Doctor.objects.filter(id__in=doctor_ids).values_list('id', 'is_available'))
+        known_patients = set(Patient.objects.filter(id__in=patient_ids).values_list('id', flat=True))
+
+        # Cancelled rows hold no slot, so only active ones are checked.
+        dates = {data['date'] for data in cleaned.values() if data['status'] not in Appointment.INACTIVE_STATUSES}
+        scheduled = availability.scheduled_doctor_ids(known_doctors)
+        free = availability.free_slots_on(scheduled, dates)
+        booked = set(
+            Appointment.objects.filter(doctor_id__in=known_doctors, date__in=dates)
+            .exclude(status__in=Appointment.INACTIVE_STATUSES)
+            .values_list('doctor_id', 'date', 'time')
+        )
+
+        seen = {}
+        for index, data in cleaned.items():
+            doctor_id, slot = data['doctor'], (data['doctor'], data['date'], data['time'])
+            if doctor_id not in known_doctors:
+                self.add_error(index, 'doctor', f"Unknown doctor {doctor_id}.")
+                continue
+            if data['patient'] not in known_patients:
+                self.add_error(index, 'patient', f"Unknown patient {data['patient']}.")
+            if not known_doctors[doctor_id]:
+                self.add_error(index, 'doctor', 'This doctor is not accepting appointments.')
+            elif data['status'] in Appointment.INACTIVE_STATUSES:
+                continue
+            elif slot in booked or (
+                doctor_id in scheduled and data['time'] not in free.get(doctor_id, {}).get(data['date'], ())
+            ):
+                self.add_error(index, 'time', 'This time slot is not available.')
+            elif slot in seen:
+                self.add_error(index, 'time', f"Slot already requested by row {seen[slot]}.")
+            else:
+                seen[slot] = index
+
+    def write(self, valid):
+        pairs = {(data['doctor'], data['patient']) for data in valid.values()}
+        known_pairs = set(Appointment.objects.filter(
+            doctor_id__in={doctor_id for doctor_id, _ in pairs}, patient_id__in={patient_id for _, patient_id in pairs},
+        ).values_list('doctor_id', 'patient_id').distinct())
+        try:
+            with transaction.atomic():
+                created = Appointment.objects.bulk_create([
+                    Appointment(
+                        doctor_id=data['doctor'], patient_id=data['patient'], date=data['date'],
+                        time=data['time'], status=data['status'], notes=data['notes'],
+                    )
+                    for data in valid.values()
+                ], batch_size=self.chunk_size)
+        except IntegrityError:
+            # Someone booked one of the slots after validation.
+            raise SlotUnavailable('One or more slots were booked concurrently; nothing was imported.')
+        # bulk_create sends no signals.
+        dashboard.schedule_refresh({(data['doctor'], data['date']) for data in valid.values()})
+        # Patients newly visible to a doctor must reach that doctor's next sync.
+        new_patients = {patient_id for _, patient_id in pairs - known_pairs}
+        if new_patients:
+            Patient.objects.filter(id__in=new_patients).update(updated_at=timezone.now())
+        return {'created': len(created)}
+
+
+IMPORTERS = {
+    'specialists': SpecialistImporter,
+    'symptom-mappings': SymptomMappingImporter,
+    'doctors': DoctorImporter,
+    'appointments': AppointmentImporter,
+}
@@ -0,0 +1,229 @@
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_etags
+
+from .querysets import get_eager_plan
+
+KEY_PREFIX = 'respcache'
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+# ---- METRICS ----
+class CacheMetrics:
+    """Process-local hit/miss counters and the render time hits avoided."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = self.not_modified = 0
+            self.seconds_saved = 0.0
+
+    def record_hit(self, seconds_saved, not_modified=False):
+        with self._lock:
+            self.hits += 1
+            self.not_modified += int(not_modified)
+            self.seconds_saved += seconds_saved
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+                'seconds_saved': round(self.seconds_saved, 6),
+            }
+
+
+metrics = CacheMetrics()
+
+
+# ---- INVALIDATION ----
+# Each cached view depends on one or more groups ("doctor", "specialist",
+# "user"). Cache keys embed the groups' current version numbers, so bumping a
+# group on write orphans every entry built from the old data at once.
+def _version_key(group):
+    return f'{KEY_PREFIX}:version:{group}'
+
+
+def get_versions(groups):
+    cache = get_cache()
+    keys = [_version_key(group) for group in groups]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Seed from the clock rather than 0 so an evicted counter can't
+            # fall back to a version whose entries are still cached.
+            cache.add(key, time.time_ns() // 1000, timeout=None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def bump(group):
+    cache = get_cache()
+    key = _version_key(group)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # add() is a no-op if another process created the key first.
+        if not cache.add(key, time.time_ns() // 1000, timeout=None):
+            cache.incr(key)
+
+
+# ---- RESPONSE CACHE ----
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    tags = [tag.removeprefix('W/') for tag in parse_etags(header)]
+    return '*' in tags or etag in tags
+
+
+class CachedResponseMixin:
+    """
+    Caches rendered list/retrieve responses keyed by path, query string and
+    Accept header, and answers If-None-Match with 304. Only for views whose
+    output doesn't depend on who is asking.
+    """
+    cache_groups = ()
+    cache_max_age = 60
+    cache_timeout = None
+
+    def get_response_cache_key(self, request):
+        versions = get_versions(self.cache_groups)
+        query = sorted(request.query_params.lists())
+        raw = f"{request.path}|{query}|{request.META.get('HTTP_ACCEPT', '')}|{versions}"
+        digest = hashlib.sha1(raw.encode()).hexdigest()
+        return f'{KEY_PREFIX}:{type(self).__name__}:{digest}'
+
+    def cached(self, handler, request, *args, **kwargs):
+        key = self.get_response_cache_key(request)
+        entry = get_cache().get(key)
+        if entry is None:
+            metrics.record_miss()
+            self._response_cache = (key, time.perf_counter())
+            return handler(request, *args, **kwargs)
+
+        if etag_matches(request, entry['etag']):
+            metrics.record_hit(entry['seconds'], not_modified=True)
+            response = HttpResponseNotModified()
+        else:
+            metrics.record_hit(entry['seconds'])
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        self.set_cache_headers(response, entry['etag'], hit=True)
+        return response
+
+    def set_cache_headers(self, response, etag, hit):
+        response['ETag'] = etag
+        response['X-Cache'] = 'HIT' if hit else 'MISS'
+        patch_cache_control(response, public=True, max_age=self.cache_max_age)
+        patch_vary_headers(response, ['Accept'])
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        pending = getattr(self, '_response_cache', None)
+        if pending is None or response.status_code != 200 or response.streaming:
+            return response
+
+        key, started = pending
+        response.render()
+        etag = '"%s"' % hashlib.md5(response.content, usedforsecurity=False).hexdigest()
+        entry = {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'etag': etag,
+            'seconds': time.perf_counter() - started,
+        }
+        timeout = self.cache_timeout or getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+        get_cache().set(key, entry, timeout)
+
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        self.set_cache_headers(response, etag, hit=False)
+        return response
+
+
+# ---- CONDITIONAL DETAIL RESPONSES ----
+def last_modified_columns(serializer):
+    """
+    updated_at of the serializer's model and of every model its eager plan
+    joins in, i.e. every row the representation embeds. Users have no
+    timestamp; saving one touches their doctor/patient profile instead.
+    """
+    model = serializer.Meta.model
+    columns = []
+    for path in ('', *get_eager_plan(serializer).select_related):
+        related = model
+        for attr in filter(None, path.split('__')):
+            related = related._meta.get_field(attr).related_model
+        if any(field.name == 'updated_at' for field in related._meta.concrete_fields):
+            columns.append(f'{path}__updated_at' if path else 'updated_at')
+    return columns
+
+
+class ConditionalRetrieveMixin:
+    """
+    Detail responses carry Last-Modified and an ETag derived from row
+    timestamps (see last_modified_columns). A request whose validators still
+    match gets a 304 after one small query, without loading or serializing
+    the object.
+    """
+
+    def get_last_modified(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            stamps = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            ).values_list(*last_modified_columns(self.get_serializer())).first()
+        except (ValueError, TypeError, ValidationError):
+            # A malformed id; let retrieve() answer it as usual.
+            return None
+        if stamps is None:
+            return None
+        return max(stamp for stamp in stamps if stamp is not None)
+
+    def get_detail_etag(self, request, last_modified):
+        # The representation also depends on the negotiated format and ?fields=/?expand=.
+        raw = f"{request.path}|{last_modified.isoformat()}|{request.accepted_media_type}|{sorted(request.query_params.lists())}"
+        return 'W/"%s"' % hashlib.sha1(raw.encode()).hexdigest()
+
+    def retrieve(self, request, *args, **kwargs):
+        last_modified = self.get_last_modified()
+        if last_modified is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag = self.get_detail_etag(request, last_modified)
+        timestamp = int(last_modified.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(timestamp)
+        # Per-user data: clients may keep it but must revalidate.
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        return response
@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+# Server preference when the client accepts several equally.
+ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+# Never compressed: already compressed, or must reach the client unbuffered.
+SKIP_CONTENT_TYPES = ('text/event-stream', 'image/', 'video/', 'audio/', 'application/zip', 'application/gzip')
+
+
+# ---- NEGOTIATION ----
+def parse_accept_encoding(header):
+    """{coding: q} from an Accept-Encoding header; malformed q-values count as 0."""
+    accepted = {}
+    for item in header.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding.lower()] = q
+    return accepted
+
+
+def choose_encoding(header):
+    """The best coding we support that the client accepts, or None for identity."""
+    accepted = parse_accept_encoding(header)
+    best, best_q = None, 0.0
+    for coding in ENCODINGS:
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+# ---- ENCODERS ----
+def _brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """
+    gzip/brotli response compression negotiated from Accept-Encoding (brotli
+    when the package is installed and the client prefers it or is
+    indifferent). Bodies under COMPRESSION_MIN_SIZE bytes are sent as is;
+    so are async streams and event streams, which must not be buffered.
+    Like GZipMiddleware it pads gzip output with random bytes against
+    BREACH, and weakens strong ETags.
+    """
+    max_random_bytes = 100
+
+    def process_response(self, request, response):
+        if response.has_header('Content-Encoding') or response.status_code == 304:
+            return response
+        if response.get('Content-Type', '').startswith(SKIP_CONTENT_TYPES):
+            return response
+        if response.streaming and response.is_async:
+            return response
+        min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        if not response.streaming and len(response.content) < min_size:
+            return response
+
+        patch_vary_headers(response, ['Accept-Encoding'])
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        quality = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+        if response.streaming:
+            if encoding == 'br':
+                response.streaming_content = _brotli_sequence(response.streaming_content, quality)
+            else:
+                response.streaming_content = compress_sequence(
+                    response.streaming_content, max_random_bytes=self.max_random_bytes,
+                )
+            del response.headers['Content-Length']
+        else:
+            if encoding == 'br':
+                compressed = brotli.compress(response.content, quality=quality)
+            else:
+                compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
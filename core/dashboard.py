@@ -0,0 +1,219 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from rest_framework import serializers
+
+from .flat import get_flat_plan
+from .jobs import enqueue_unique
+from .models import Appointment, ArchivedAppointment, ArchivedPayment, DoctorDailyStats, Payment
+from .serializers import PatientSerializer
+
+ZERO = Decimal('0.00')
+
+
+def rollup_enabled():
+    return getattr(settings, 'DOCTOR_STATS_ROLLUP', False)
+
+
+def week_bounds(day):
+    """Monday..Sunday of the week containing ``day``."""
+    start = day - datetime.timedelta(days=day.weekday())
+    return start, start + datetime.timedelta(days=6)
+
+
+def day_bounds(start, end):
+    """[start 00:00, end + 1 day 00:00) in the current timezone, so created_at filters can use its index."""
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.datetime.combine(start, datetime.time.min, tzinfo=tz),
+        datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz),
+    )
+
+
+# ---- LIVE AGGREGATES ----
+def appointment_counts(doctor_ids, start, end, archived=False):
+    """
+    {(doctor_id, date): {status: count}} from one GROUP BY query; with
+    ``archived``, a second one adds the archive's rows (see core.archive).
+    """
+    counts = defaultdict(dict)
+    for model in (Appointment, ArchivedAppointment) if archived else (Appointment,):
+        rows = model.objects.filter(
+            doctor_id__in=doctor_ids, date__range=(start, end)
+        ).values_list('doctor_id', 'date', 'status').annotate(count=Count('id')).order_by()
+        for doctor_id, date, status, count in rows:
+            day_counts = counts[(doctor_id, date)]
+            day_counts[status] = day_counts.get(status, 0) + count
+    return counts
+
+
+def payment_totals(doctor_ids, start, end, archived=False):
+    """
+    {(doctor_id, date): (revenue, paid_payments)} for payments created on each
+    local date, paid ones only, from one GROUP BY query; with ``archived``, a
+    second one adds the archive's rows.
+    """
+    lower, upper = day_bounds(start, end)
+    totals = {}
+    for model in (Payment, ArchivedPayment) if archived else (Payment,):
+        rows = model.objects.filter(
+            appointment__doctor_id__in=doctor_ids, status__in=Payment.PAID_STATUSES,
+            created_at__gte=lower, created_at__lt=upper,
+        ).annotate(
+            day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()),
+        ).values_list('appointment__doctor_id', 'day').annotate(
+            revenue=Sum('amount'), payments=Count('id'),
+        ).order_by()
+        for doctor_id, day, revenue, payments in rows:
+            total_revenue, total_payments = totals.get((doctor_id, day), (ZERO, 0))
+            totals[(doctor_id, day)] = (total_revenue + revenue, total_payments + payments)
+    return totals
+
+
+def live_daily_stats(doctor_id, start, end):
+    """{date: (status_counts, revenue, paid_payments)} computed from the source tables (two queries)."""
+    counts = appointment_counts([doctor_id], start, end)
+    totals = payment_totals([doctor_id], start, end)
+    days = {day for _, day in counts} | {day for _, day in totals}
+    return {
+        day: (counts.get((doctor_id, day), {}), *totals.get((doctor_id, day), (ZERO, 0)))
+        for day in days
+    }
+
+
+def rollup_daily_stats(doctor_id, start, end):
+    """Same shape as live_daily_stats(), read from DoctorDailyStats (one query)."""
+    rows = DoctorDailyStats.objects.filter(doctor_id=doctor_id, date__range=(start, end)).values_list(
+        'date', 'status_counts', 'revenue', 'paid_payments',
+    )
+    return {day: (status_counts, revenue, payments) for day, status_counts, revenue, payments in rows}
+
+
+# ---- ROLLUP MAINTENANCE ----
+def refresh_daily_stats(keys):
+    """
+    Recomputes DoctorDailyStats for the given (doctor_id, date) pairs: four
+    aggregate queries over the covering range (live and archived rows, so
+    archiving never changes a day's stats) plus one upsert.
+    """
+    keys = {(doctor_id, date) for doctor_id, date in keys if doctor_id is not None and date is not None}
+    if not keys:
+        return 0
+    doctor_ids = {doctor_id for doctor_id, _ in keys}
+    start, end = min(date for _, date in keys), max(date for _, date in keys)
+    counts = appointment_counts(doctor_ids, start, end, archived=True)
+    totals = payment_totals(doctor_ids, start, end, archived=True)
+
+    rows = []
+    for doctor_id, date in keys:
+        status_counts = counts.get((doctor_id, date), {})
+        revenue, payments = totals.get((doctor_id, date), (ZERO, 0))
+        rows.append(DoctorDailyStats(
+            doctor_id=doctor_id, date=date, appointments=sum(status_counts.values()),
+            status_counts=status_counts, revenue=revenue, paid_payments=payments,
+        ))
+    DoctorDailyStats.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['doctor', 'date'],
+        update_fields=['appointments', 'status_counts', 'revenue', 'paid_payments', 'refreshed_at'],
+    )
+    return len(rows)
+
+
+def schedule_refresh(keys):
+    """
+    Queues a refresh of the (doctor_id, date) pairs for the worker once the
+    current transaction commits; a pair already waiting is queued only once.
+    """
+    if rollup_enabled():
+        enqueue_unique('doctor_stats_refresh', [
+            {'doctor_id': doctor_id, 'date': str(date)}
+            for doctor_id, date in set(keys)
+            if doctor_id is not None and date is not None
+        ])
+
+
+def rebuild_daily_stats(start, end, doctor_ids=None):
+    """Recomputes the rollup for [start, end] from scratch; for backfills and after bulk loads."""
+    lower, upper = day_bounds(start, end)
+    existing = DoctorDailyStats.objects.filter(date__range=(start, end))
+    if doctor_ids is not None:
+        existing = existing.filter(doctor_id__in=doctor_ids)
+
+    keys = set()
+    # Archived days keep their stats.
+    for appointment_model, payment_model in ((Appointment, Payment), (ArchivedAppointment, ArchivedPayment)):
+        appointments = appointment_model.objects.filter(date__range=(start, end))
+        payments = payment_model.objects.filter(created_at__gte=lower, created_at__lt=upper)
+        if doctor_ids is not None:
+            appointments = appointments.filter(doctor_id__in=doctor_ids)
+            payments = payments.filter(appointment__doctor_id__in=doctor_ids)
+        keys |= set(appointments.values_list('doctor_id', 'date').distinct())
+        keys |= set(payments.annotate(
+            day=TruncDate('created_at', tzinfo=timezone.get_current_timezone()),
+        ).values_list('appointment__doctor_id', 'day').distinct())
+    with transaction.atomic():
+        # Dropping first also clears days that no longer have any activity.
+        existing.delete()
+        return refresh_daily_stats(keys)
+
+
+# ---- DASHBOARD ----
+class ScheduleAppointmentSerializer(serializers.ModelSerializer):
+    patient_detail = PatientSerializer(source='patient', read_only=True)
+
+    class Meta:
+        model = Appointment
+        fields = ['id', 'patient_detail', 'date', 'time', 'status', 'notes']
+
+
+def _summary(stats, days):
+    status_counts = defaultdict(int)
+    revenue, payments = ZERO, 0
+    for day in days:
+        counts, day_revenue, day_payments = stats.get(day, ({}, ZERO, 0))
+        for status, count in counts.items():
+            status_counts[status] += count
+        revenue += Decimal(day_revenue)
+        payments += day_payments
+    return {
+        'appointments': sum(status_counts.values()),
+        'status_counts': dict(sorted(status_counts.items())),
+        'revenue': f'{revenue:.2f}',
+        'paid_payments': payments,
+    }
+
+
+def doctor_dashboard(doctor_id, day=None):
+    """
+    Today's and this week's schedule, status counts and paid revenue for one
+    doctor: three queries live, two when the rollup is enabled.
+    """
+    day = day or timezone.localdate()
+    week_start, week_end = week_bounds(day)
+
+    plan = get_flat_plan(ScheduleAppointmentSerializer())
+    schedule = plan.represent(plan.apply(
+        Appointment.objects.filter(doctor_id=doctor_id, date__range=(week_start, week_end))
+        .exclude(status__in=Appointment.INACTIVE_STATUSES).order_by('date', 'time')
+    ))
+    use_rollup = rollup_enabled()
+    stats = (rollup_daily_stats if use_rollup else live_daily_stats)(doctor_id, week_start, week_end)
+
+    days = [week_start + datetime.timedelta(days=n) for n in range(7)]
+    today = day.isoformat()
+    return {
+        'doctor': doctor_id,
+        'date': today,
+        'week_start': week_start.isoformat(),
+        'week_end': week_end.isoformat(),
+        'source': 'rollup' if use_rollup else 'live',
+        'today': {**_summary(stats, [day]), 'schedule': [a for a in schedule if a['date'] == today]},
+        'week': {**_summary(stats, days), 'schedule': schedule},
+        'by_day': [{'date': d.isoformat(), **_summary(stats, [d])} for d in days],
+    }
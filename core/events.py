@@ -0,0 +1,222 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import Appointment, Payment
+
+# ---- TOPICS ----
+# Private topics carry a doctor's or patient's own appointments and
+# payments; slot topics say which of a doctor's times were taken or freed,
+# without saying by whom.
+def doctor_topic(doctor_id):
+    return f'doctor:{doctor_id}'
+
+
+def patient_topic(patient_id):
+    return f'patient:{patient_id}'
+
+
+def slots_topic(doctor_id):
+    return f'slots:{doctor_id}'
+
+
+# ---- BROKER ----
+OVERFLOW = {'type': 'overflow', 'data': {'detail': 'Too many undelivered events; resync and reconnect.'}}
+
+
+class Subscription:
+    """
+    One client's bounded event queue, read on the event loop it was created
+    on. A client that falls ``max_queued`` events behind is cut off with an
+    OVERFLOW event instead of slowing publishers down or growing without
+    bound; it resyncs (/api/sync/) and reconnects.
+    """
+
+    def __init__(self, broker, topics, max_queued):
+        self.broker = broker
+        self.topics = frozenset(topics)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_queued)
+        self.closed = False
+
+    def offer(self, event):
+        # Runs on self.loop.
+        if self.closed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.closed = True
+            self.broker.unsubscribe(self)
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(OVERFLOW)
+
+    async def get(self, timeout=None):
+        """The next event, or None after ``timeout`` seconds without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessBroker:
+    """
+    Fans events out to the subscribers in this process. Publishing is
+    thread-safe and never blocks. With several server processes, use a
+    broker that relays between them (EVENTS_BROKER): anything with
+    subscribe/unsubscribe/publish/has_subscribers.
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics, max_queued):
+        subscription = Subscription(self, topics, max_queued)
+        with self._lock:
+            for topic in subscription.topics:
+                self._subscriptions[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._subscriptions.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[topic]
+
+    def has_subscribers(self):
+        return bool(self._subscriptions)
+
+    def subscriber_count(self, topic):
+        with self._lock:
+            return len(self._subscriptions.get(topic, ()))
+
+    def publish(self, topics, event):
+        with self._lock:
+            subscriptions = set().union(*(self._subscriptions.get(topic, ()) for topic in topics))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # Its loop has shut down.
+                self.unsubscribe(subscription)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(getattr(settings, 'EVENTS_BROKER', 'core.events.InProcessBroker'))()
+
+
+def format_sse(event):
+    data = json.dumps(event['data'], cls=JSONEncoder, separators=(',', ':'))
+    return f"event: {event['type']}\ndata: {data}\n\n".encode()
+
+
+# ---- PUBLISHING ----
+# Called from signals and bulk paths; events go out once the transaction
+# commits, and cost nothing while nobody in this process is listening.
+def _appointment_data(appointment_id, patient_id, doctor_id, date, time, status):
+    return {
+        'id': appointment_id, 'patient': patient_id, 'doctor': doctor_id,
+        'date': date, 'time': time, 'status': status,
+    }
+
+
+def _slot_event(doctor_id, date, time, available):
+    return {'type': 'slot', 'data': {'doctor': doctor_id, 'date': date, 'time': time, 'available': available}}
+
+
+def _publish_appointment(kind, data, freed=None, taken=None):
+    broker = get_broker()
+    broker.publish([doctor_topic(data['doctor']), patient_topic(data['patient'])], {'type': kind, 'data': data})
+    if freed is not None:
+        broker.publish([slots_topic(data['doctor'])], _slot_event(data['doctor'], *freed, True))
+    if taken is not None:
+        broker.publish([slots_topic(data['doctor'])], _slot_event(data['doctor'], *taken, False))
+
+
+def appointment_saved(appointment, created, previous):
+    """``previous`` is (date, time, status) as loaded, or None."""
+    if not get_broker().has_subscribers():
+        return
+    data = _appointment_data(
+        appointment.pk, appointment.patient_id, appointment.doctor_id,
+        appointment.date, appointment.time, appointment.status,
+    )
+    active = appointment.status not in Appointment.INACTIVE_STATUSES
+    slot = (appointment.date, appointment.time)
+    was_active = previous is not None and previous[2] not in Appointment.INACTIVE_STATUSES
+    if created:
+        kind, freed, taken = 'appointment.created', None, slot if active else None
+    elif not active:
+        kind, freed, taken = 'appointment.cancelled', previous[:2] if was_active else None, None
+    else:
+        kind = 'appointment.updated'
+        moved = not was_active or previous[:2] != slot
+        freed = previous[:2] if was_active and moved else None
+        taken = slot if moved else None
+    transaction.on_commit(lambda: _publish_appointment(kind, data, freed, taken))
+
+
+def appointment_deleted(appointment):
+    if not get_broker().has_subscribers():
+        return
+    data = _appointment_data(
+        appointment.pk, appointment.patient_id, appointment.doctor_id,
+        appointment.date, appointment.time, appointment.status,
+    )
+    freed = (appointment.date, appointment.time) if appointment.status not in Appointment.INACTIVE_STATUSES else None
+    transaction.on_commit(lambda: _publish_appointment('appointment.deleted', data, freed))
+
+
+def appointments_changed(ids):
+    """
+    For update() paths that move appointments between statuses: loads the
+    rows after commit, in one query, and publishes them. Their slot events
+    state the slot's current availability, which is safe to repeat.
+    """
+    ids = list(ids)
+    if not ids or not get_broker().has_subscribers():
+        return
+
+    def publish():
+        rows = Appointment.objects.filter(pk__in=ids).values_list(
+            'id', 'patient_id', 'doctor_id', 'date', 'time', 'status',
+        )
+        for row in rows:
+            data = _appointment_data(*row)
+            slot = (data['date'], data['time'])
+            if data['status'] in Appointment.INACTIVE_STATUSES:
+                _publish_appointment('appointment.cancelled', data, freed=slot)
+            else:
+                _publish_appointment('appointment.updated', data, taken=slot)
+    transaction.on_commit(publish)
+
+
+def payments_changed(transaction_ids):
+    """Publishes the current status of these payments after commit, in one query."""
+    transaction_ids = list(transaction_ids)
+    if not transaction_ids or not get_broker().has_subscribers():
+        return
+
+    def publish():
+        rows = Payment.objects.filter(transaction_id__in=transaction_ids).values_list(
+            'id', 'transaction_id', 'status', 'appointment_id', 'appointment__patient_id', 'appointment__doctor_id',
+        )
+        broker = get_broker()
+        for payment_id, transaction_id, status, appointment_id, patient_id, doctor_id in rows:
+            broker.publish([doctor_topic(doctor_id), patient_topic(patient_id)], {'type': 'payment.status', 'data': {
+                'id': payment_id, 'transaction_id': transaction_id, 'status': status, 'appointment': appointment_id,
+            }})
+    transaction.on_commit(publish)
@@ -0,0 +1,185 @@
+from collections import OrderedDict, namedtuple
+
+from rest_framework import serializers
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+MAX_PATHS = 50
+ALL = '*'
+
+
+# ---- FIELD SPECS ----
+# ?fields= and ?expand= take comma-separated dotted paths. They are parsed
+# into frozen trees, ((name, subtree), ...), so a spec can key the eager
+# loading and flat plan caches. A path that stops at a nested object
+# (``fields=doctor_detail``) selects all of it, marked with ALL.
+def parse_paths(value):
+    tree = {}
+    for path in value.split(',')[:MAX_PATHS]:
+        names = [name.strip() for name in path.split('.') if name.strip()]
+        node = tree
+        for name in names:
+            node = node.setdefault(name, {})
+        if names:
+            node[ALL] = {}
+    return tree
+
+
+def _freeze(tree):
+    return tuple(sorted((name, _freeze(subtree)) for name, subtree in tree.items()))
+
+
+def _branches(tree):
+    """The paths in ``tree`` that reach into a nested object; selecting inside one implies expanding it."""
+    return {name: _branches(subtree) for name, subtree in tree.items() if set(subtree) - {ALL}}
+
+
+def _merge(tree, other):
+    merged = dict(tree)
+    for name, subtree in other.items():
+        merged[name] = _merge(merged.get(name, {}), subtree)
+    return merged
+
+
+class FieldSpec(namedtuple('FieldSpec', ['fields', 'expand'])):
+    """
+    Which fields a serializer renders and which nested serializers it
+    expands, as frozen trees; None means all of them.
+    """
+
+    @classmethod
+    def parse(cls, fields=None, expand=None):
+        # An empty ?fields= means "no selection"; an empty ?expand= means "expand nothing".
+        fields = fields or None
+        if fields is None and expand is None:
+            return None
+        fields_tree = parse_paths(fields) if fields is not None else None
+        expand_tree = parse_paths(expand) if expand is not None else None
+        if fields_tree is not None and expand_tree is not None:
+            expand_tree = _merge(expand_tree, _branches(fields_tree))
+        return cls(
+            _freeze(fields_tree) if fields_tree is not None else None,
+            _freeze(expand_tree) if expand_tree is not None else None,
+        )
+
+    @classmethod
+    def from_request(cls, request):
+        params = getattr(request, 'query_params', None) or getattr(request, 'GET', {})
+        return cls.parse(params.get(FIELDS_PARAM), params.get(EXPAND_PARAM))
+
+    def keeps(self, name):
+        return self.fields is None or name in dict(self.fields)
+
+    def expands(self, name):
+        return self.expand is None or name in dict(self.expand)
+
+    def child(self, name):
+        """The spec for the nested serializer under ``name``."""
+        fields = dict(self.fields).get(name) if self.fields is not None else None
+        if fields is not None and ALL in dict(fields):
+            fields = None
+        expand = dict(self.expand).get(name, ()) if self.expand is not None else None
+        if fields is None and expand is None:
+            return None
+        return FieldSpec(fields, expand)
+
+
+def _is_root(serializer):
+    parent = serializer.parent
+    return parent is None or (isinstance(parent, serializers.ListSerializer) and parent.parent is None)
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer support for ``?fields=`` (which fields to render) and
+    ``?expand=`` (which nested objects to embed; the rest render as their
+    id), e.g. ``?fields=time,doctor_detail.user.full_name``. Without
+    ``expand`` every nested object is embedded, as before. The root
+    serializer reads both from the request, or from the ``fields`` and
+    ``expand`` arguments, and hands each nested serializer its part.
+    Writable fields stay in ``fields`` for input and are only left out of
+    the output (``_readable_fields``, which the flat and eager loading
+    plans read too).
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._field_spec = FieldSpec.parse(fields, expand)
+        self._explicit_spec = fields is not None or expand is not None
+
+    @property
+    def field_spec(self):
+        if not self._explicit_spec and _is_root(self):
+            request = self.context.get('request')
+            self._field_spec = FieldSpec.from_request(request) if request is not None else None
+            self._explicit_spec = True
+        return self._field_spec
+
+    def get_fields(self):
+        fields = super().get_fields()
+        spec = self.field_spec
+        if spec is None:
+            return fields
+        for name, field in list(fields.items()):
+            if field.write_only:
+                continue
+            if not spec.keeps(name):
+                if field.read_only:
+                    del fields[name]
+                continue
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if not isinstance(nested, serializers.BaseSerializer):
+                continue
+            if not spec.expands(name):
+                source = field.source or name
+                fields[name] = serializers.PrimaryKeyRelatedField(
+                    read_only=True, many=many, **({'source': source} if source != name else {}),
+                )
+            elif isinstance(nested, SparseFieldsetMixin):
+                nested._field_spec, nested._explicit_spec = spec.child(name), True
+        return fields
+
+    @property
+    def _readable_fields(self):
+        spec = self.field_spec
+        for field in super()._readable_fields:
+            if spec is None or spec.keeps(field.field_name):
+                yield field
+
+
+# ---- PLAN CACHES ----
+def plan_key(serializer):
+    """Eager loading and flat plans depend on the serializer class and its field spec."""
+    return type(serializer), getattr(serializer, 'field_spec', None)
+
+
+class PlanCache:
+    """
+    Least-recently-used cache for per-spec plans. Specs come from query
+    strings, so it is bounded.
+    """
+    MISSING = object()
+
+    def __init__(self, size=256):
+        self.size = size
+        self._entries = OrderedDict()
+
+    def get(self, key, default=MISSING):
+        try:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        except KeyError:
+            # Missing, or evicted by another thread in between.
+            return default
+
+    def set(self, key, value):
+        self._entries[key] = value
+        while len(self._entries) > self.size:
+            try:
+                self._entries.popitem(last=False)
+            except KeyError:
+                break
+
+    def clear(self):
+        self._entries.clear()
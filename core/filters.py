@@ -0,0 +1,79 @@
+from django.db import connections
+from django.db.models import Q
+from django.db.models.functions import Upper
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+TRUE_VALUES = ('1', 'true', 'yes')
+FALSE_VALUES = ('0', 'false', 'no')
+
+
+def parse_bool(value, name):
+    value = value.lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValidationError({name: "Expected true or false."})
+
+
+# ---- DOCTOR DISCOVERY FILTERS ----
+class DoctorFilterBackend(BaseFilterBackend):
+    """
+    ?specialty=<id or name>  ?available=true|false
+    ?search=<text> (name, username, bio)  ?ordering=name|-name|specialty|-specialty|id|-id
+
+    Specialty names are compared as UPPER(name) = UPPER(value) so the
+    functional index on Specialist can be used. Bio search uses the
+    full-text GIN index on PostgreSQL and falls back to icontains elsewhere.
+    """
+    ordering_fields = {
+        'name': ('user__last_name', 'user__first_name', 'id'),
+        'specialty': ('specialty__name', 'id'),
+        'id': ('id',),
+    }
+    search_config = 'english'
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        specialty = params.get('specialty', '').strip()
+        if specialty.isdigit():
+            queryset = queryset.filter(specialty_id=int(specialty))
+        elif specialty:
+            queryset = queryset.alias(specialty_name_upper=Upper('specialty__name')).filter(
+                specialty_name_upper=specialty.upper()
+            )
+
+        available = params.get('available')
+        if available:
+            queryset = queryset.filter(is_available=parse_bool(available, 'available'))
+
+        search = params.get('search', '').strip()
+        if search:
+            queryset = self.search(queryset, search)
+
+        ordering = params.get('ordering', 'id')
+        key = ordering.lstrip('-')
+        if key not in self.ordering_fields:
+            raise ValidationError({"ordering": f"Choose one of: {', '.join(sorted(self.ordering_fields))}."})
+        prefix = '-' if ordering.startswith('-') else ''
+        return queryset.order_by(*(prefix + field for field in self.ordering_fields[key]))
+
+    def search(self, queryset, text):
+        names = Q()
+        for term in text.split():
+            names &= (
+                Q(user__first_name__icontains=term)
+                | Q(user__last_name__icontains=term)
+                | Q(user__username__icontains=term)
+            )
+
+        if connections[queryset.db].vendor == 'postgresql':
+            from django.contrib.postgres.search import SearchQuery, SearchVector
+
+            queryset = queryset.alias(bio_vector=SearchVector('bio', config=self.search_config))
+            bio = Q(bio_vector=SearchQuery(text, config=self.search_config, search_type='websearch'))
+        else:
+            bio = Q(bio__icontains=text)
+        return queryset.filter(names | bio)
@@ -0,0 +1,182 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import fields as drf_fields, relations, serializers
+from rest_framework.response import Response
+
+from .fieldsets import PlanCache, plan_key
+from .instrumentation import timed
+
+
+# ---- FLAT (COMPILED) SERIALIZATION ----
+# A flat plan turns a read-only ModelSerializer into one values_list() query
+# and a generated function that builds the exact nested dicts the serializer
+# would, without instantiating serializers or model objects per row. Leaf
+# values go through the same DRF field's to_representation (dates, times,
+# decimals, timezones), so the JSON is byte-identical. Method fields need a
+# SQL equivalent in ``Meta.flat_expressions``: {name: callable(prefix) -> Expression}.
+
+# Fields whose to_representation returns the database value unchanged.
+IDENTITY_FIELDS = (
+    drf_fields.CharField, drf_fields.IntegerField, drf_fields.BooleanField,
+    drf_fields.JSONField, drf_fields.ReadOnlyField,
+)
+
+
+class NotFlattenable(Exception):
+    pass
+
+
+class FlatPlan:
+    def __init__(self, columns, expressions, build):
+        self.columns = columns
+        self.expressions = expressions
+        self.build = build
+
+    def apply(self, queryset, extra_columns=()):
+        """
+        values_list() queryset for this plan. Rows are named tuples, so
+        keyset pagination can still read its ordering columns by name;
+        ``extra_columns`` go last, after the ones build() reads by position.
+        """
+        extra = [name for name in extra_columns if name not in self.columns]
+        if self.expressions:
+            queryset = queryset.annotate(**self.expressions)
+        return queryset.prefetch_related(None).values_list(*self.columns, *self.expressions, *extra, named=True)
+
+    def to_representation(self, row):
+        return self.build(row)
+
+    def represent(self, rows):
+        build = self.build
+        with timed('serialize'):
+            return [build(row) for row in rows]
+
+
+class _Compiler:
+    def __init__(self):
+        self.positions = {}
+        self.expressions = {}
+        self.namespace = {}
+
+    def slot(self, name):
+        return f'r[{self.positions.setdefault(name, len(self.positions))}]'
+
+    def expression(self, expression):
+        alias = f'flat_expr_{len(self.expressions)}'
+        self.expressions[alias] = expression
+        return alias
+
+    def converter(self, field):
+        if isinstance(field, IDENTITY_FIELDS) or (
+            isinstance(field, relations.PrimaryKeyRelatedField) and field.pk_field is None
+        ):
+            return None
+        if isinstance(field, relations.RelatedField) or type(field) is drf_fields.Field:
+            raise NotFlattenable(f'{field.field_name}: {type(field).__name__}')
+        name = f'conv_{len(self.namespace)}'
+        self.namespace[name] = field.to_representation
+        return name
+
+    def node(self, serializer, model, prefix=''):
+        if not isinstance(serializer, serializers.ModelSerializer):
+            raise NotFlattenable(type(serializer).__name__)
+        if type(serializer).to_representation is not serializers.Serializer.to_representation:
+            raise NotFlattenable(f'{type(serializer).__name__} overrides to_representation')
+
+        flat_expressions = getattr(serializer.Meta, 'flat_expressions', {})
+        parts = []
+        for field in serializer._readable_fields:
+            key = repr(field.field_name)
+
+            if isinstance(field, drf_fields.SerializerMethodField):
+                if field.field_name not in flat_expressions:
+                    raise NotFlattenable(f'{type(serializer).__name__}.{field.field_name} has no flat expression')
+                alias = self.expression(flat_expressions[field.field_name](prefix))
+                parts.append(f'{key}: {{{alias}}}')
+                continue
+            if field.source == '*' or isinstance(field, serializers.ListSerializer):
+                raise NotFlattenable(f'{type(serializer).__name__}.{field.field_name}')
+
+            current, path, model_field = model, [], None
+            for attr in field.source_attrs:
+                try:
+                    model_field = current._meta.get_field(attr)
+                except FieldDoesNotExist:
+                    raise NotFlattenable(f'{type(serializer).__name__}.{field.field_name}')
+                if not model_field.concrete or model_field.many_to_many:
+                    raise NotFlattenable(f'{type(serializer).__name__}.{field.field_name}')
+                path.append(attr)
+                current = model_field.related_model if model_field.is_relation else None
+            column = prefix + '__'.join(path)
+
+            if isinstance(field, serializers.BaseSerializer):
+                inner = self.node(field, model_field.related_model, column + '__')
+                if any(f.null for f in self._chain(model, path)):
+                    parts.append(f'{key}: None if {self.slot(column)} is None else {inner}')
+                else:
+                    parts.append(f'{key}: {inner}')
+                continue
+
+            value = self.slot(column)
+            converter = self.converter(field)
+            parts.append(f'{key}: {value}' if converter is None else f'{key}: None if {value} is None else {converter}({value})')
+        return '{' + ', '.join(parts) + '}'
+
+    @staticmethod
+    def _chain(model, path):
+        for attr in path:
+            field = model._meta.get_field(attr)
+            yield field
+            model = field.related_model
+
+    def compile(self, serializer):
+        body = self.node(serializer, serializer.Meta.model)
+        # Expression aliases follow the plain columns in each row.
+        columns = list(self.positions)
+        for offset, alias in enumerate(self.expressions):
+            body = body.replace(f'{{{alias}}}', f'r[{len(columns) + offset}]')
+        source = f'def build(r):\n    return {body}\n'
+        namespace = dict(self.namespace)
+        exec(compile(source, f'<flat {type(serializer).__name__}>', 'exec'), namespace)
+        return FlatPlan(tuple(columns), dict(self.expressions), namespace['build'])
+
+
+_flat_cache = PlanCache()
+
+
+def get_flat_plan(serializer):
+    """The serializer's FlatPlan, or None if it can't be flattened. Cached per class and field spec."""
+    key = plan_key(serializer)
+    plan = _flat_cache.get(key)
+    if plan is PlanCache.MISSING:
+        try:
+            plan = _Compiler().compile(serializer)
+        except NotFlattenable:
+            plan = None
+        _flat_cache.set(key, plan)
+    return plan
+
+
+class FlatListMixin:
+    """
+    Serves list() from a flat plan when the serializer supports one: one
+    values_list() query and plain dicts instead of model instances and nested
+    serializers. Output is identical to the regular path.
+    """
+    flat_list = True
+
+    def get_flat_plan(self):
+        return get_flat_plan(self.get_serializer()) if self.flat_list else None
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_flat_plan()
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        paginator = self.paginator
+        ordering = paginator.get_ordering(self) if hasattr(paginator, 'get_ordering') else ()
+        queryset = plan.apply(self.filter_queryset(self.get_queryset()), [field.lstrip('-') for field in ordering])
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(plan.represent(page))
+        return Response(plan.represent(queryset))
+
@@ -0,0 +1,326 @@
+import cProfile
+import contextvars
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('core.performance')
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+# ---- PER-REQUEST STATS ----
+class RequestStats:
+    """What one request spent its time on. Filled in from any thread the request uses."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.timings = defaultdict(float)
+        self.sql_counts = defaultdict(int)
+        self.sql_sources = {}
+        self.response_bytes = None
+        self._depth = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record_query(self, sql, seconds):
+        with self._lock:
+            self.queries += 1
+            self.db_time += seconds
+            self.sql_counts[sql] += 1
+            repeated = self.sql_counts[sql] == 2 and sql not in self.sql_sources
+        if repeated:
+            # Only repeated statements are worth the stack walk.
+            self.sql_sources[sql] = serializer_field_in_stack()
+
+    def duplicates(self, threshold):
+        """[(source, sql, count)] for statements run at least ``threshold`` times."""
+        return [
+            (self.sql_sources.get(sql), sql, count)
+            for sql, count in self.sql_counts.items() if count >= threshold
+        ]
+
+
+def current_stats():
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """Adds the block's duration to the current request under ``name``; nested uses count once."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    stats._depth[name] += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats._depth[name] -= 1
+        if not stats._depth[name]:
+            stats.timings[name] += time.perf_counter() - started
+
+
+def serializer_field_in_stack(max_depth=80):
+    """'ParentSerializer.field' for the innermost DRF field reading an attribute, if any."""
+    from rest_framework.fields import Field
+
+    frame = sys._getframe(1)
+    for _ in range(max_depth):
+        if frame is None:
+            break
+        if frame.f_code.co_name in ('get_attribute', 'to_representation'):
+            field = frame.f_locals.get('self')
+            if isinstance(field, Field) and field.field_name and field.parent is not None:
+                return f'{type(field.parent).__name__}.{field.field_name}'
+        frame = frame.f_back
+    return None
+
+
+# ---- DATABASE HOOK ----
+def _execute_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.record_query(sql, time.perf_counter() - started)
+
+
+def _install_execute_wrapper(sender, connection, **kwargs):
+    # Installed on every connection (request threads, sync_to_async workers);
+    # the context variable decides which request a query belongs to.
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute_wrapper)
+
+
+_installed = False
+
+
+def install():
+    """Hooks the database, DRF authentication, serialization and rendering. Idempotent."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    from django.db import connections
+    from rest_framework import renderers, serializers
+    from rest_framework.request import Request
+
+    from .renderers import FastJSONRenderer
+
+    connection_created.connect(_install_execute_wrapper)
+    for connection in connections.all(initialized_only=True):
+        _install_execute_wrapper(None, connection)
+
+    def wrap(owner, name, label, is_property=False):
+        original = getattr(owner, name)
+        target = original.fget if is_property else original
+
+        def wrapper(*args, **kwargs):
+            with timed(label):
+                return target(*args, **kwargs)
+        wrapper.__wrapped__ = target
+        setattr(owner, name, property(wrapper) if is_property else wrapper)
+
+    wrap(Request, '_authenticate', 'auth')
+    wrap(serializers.Serializer, 'data', 'serialize', is_property=True)
+    wrap(serializers.ListSerializer, 'data', 'serialize', is_property=True)
+    wrap(renderers.JSONRenderer, 'render', 'render')
+    wrap(FastJSONRenderer, 'render', 'render')
+
+
+# ---- AGGREGATE METRICS ----
+class MetricsRegistry:
+    """Process-local counters per view, rendered in the Prometheus text format."""
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.sums = defaultdict(float)
+            self.histogram = defaultdict(lambda: [0] * (len(self.buckets) + 1))
+
+    def observe(self, view, method, status, stats, duplicates):
+        with self._lock:
+            self.requests[(view, method, str(status))] += 1
+            self.sums[('request_seconds', view)] += stats.total
+            self.sums[('db_queries', view)] += stats.queries
+            self.sums[('db_seconds', view)] += stats.db_time
+            for name, seconds in stats.timings.items():
+                self.sums[(f'{name}_seconds', view)] += seconds
+            if stats.response_bytes is not None:
+                self.sums[('response_bytes', view)] += stats.response_bytes
+            self.sums[('nplusone', view)] += len(duplicates)
+            counts = self.histogram[view]
+            for i, bound in enumerate(self.buckets):
+                if stats.total <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+
+    def render(self):
+        lines = [
+            '# HELP tibanow_requests_total Requests by view, method and status.',
+            '# TYPE tibanow_requests_total counter',
+        ]
+        with self._lock:
+            for (view, method, status), count in sorted(self.requests.items()):
+                lines.append(f'tibanow_requests_total{{view="{view}",method="{method}",status="{status}"}} {count}')
+
+            lines += [
+                '# HELP tibanow_request_duration_seconds Request wall time by view.',
+                '# TYPE tibanow_request_duration_seconds histogram',
+            ]
+            for view, counts in sorted(self.histogram.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f'tibanow_request_duration_seconds_bucket{{view="{view}",le="{bound}"}} {count}')
+                lines.append(f'tibanow_request_duration_seconds_bucket{{view="{view}",le="+Inf"}} {counts[-1]}')
+                lines.append(f'tibanow_request_duration_seconds_count{{view="{view}"}} {counts[-1]}')
+                lines.append(
+                    f'tibanow_request_duration_seconds_sum{{view="{view}"}} {self.sums[("request_seconds", view)]:.6f}'
+                )
+
+            metrics = sorted({name for name, _ in self.sums if name != 'request_seconds'})
+            for name in metrics:
+                lines.append(f'# TYPE tibanow_{name}_total counter')
+                for (metric, view), value in sorted(self.sums.items()):
+                    if metric == name:
+                        lines.append(f'tibanow_{name}_total{{view="{view}"}} {value:.6g}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+# ---- MIDDLEWARE ----
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enabled():
+    return _setting('PERF_INSTRUMENTATION', True) and f'{__name__}.PerformanceMiddleware' in settings.MIDDLEWARE
+
+
+class PerformanceMiddleware:
+    """
+    Records wall time, query count/time, repeated queries (N+1, attributed to
+    the serializer field that triggered them), auth/serialize/render time and
+    response size per request. Reports them in the metrics registry and, to
+    staff (see exposes_timing), a Server-Timing header, and cProfiles a
+    sampled fraction of requests.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not _setting('PERF_INSTRUMENTATION', True):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        install()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            profiler = self.start_profiler()
+            try:
+                response = self.get_response(request)
+            finally:
+                self.stop_profiler(profiler, request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    def start_profiler(self):
+        rate = _setting('PERF_PROFILE_SAMPLE_RATE', 0.0)
+        if not rate or random.random() >= rate:
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop_profiler(self, profiler, request):
+        if profiler is None:
+            return
+        profiler.disable()
+        directory = _setting('PERF_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '-', request.path).strip('-') or 'root'
+        path = os.path.join(directory, f'{time.strftime("%Y%m%dT%H%M%S")}-{request.method}-{slug}-{os.getpid()}.prof')
+        profiler.dump_stats(path)
+        logger.info('Profiled %s %s -> %s', request.method, request.path, path)
+
+    def finish(self, request, response, stats):
+        stats.total = time.perf_counter() - stats.started
+        if not response.streaming:
+            stats.response_bytes = len(response.content)
+
+        threshold = _setting('PERF_NPLUS1_THRESHOLD', 5)
+        duplicates = stats.duplicates(threshold)
+        for source, sql, count in duplicates:
+            logger.warning(
+                'Possible N+1 on %s %s: query ran %d times%s: %s',
+                request.method, request.path, count, f' (from {source})' if source else '', sql[:200],
+            )
+
+        if self.exposes_timing(request):
+            response['Server-Timing'] = self.server_timing(stats, duplicates)
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        registry.observe(view, request.method, response.status_code, stats, duplicates)
+        return response
+
+    @staticmethod
+    def exposes_timing(request):
+        # Timings and N+1 sources describe our queries: staff, DEBUG or opt-in only.
+        if settings.DEBUG or _setting('PERF_SERVER_TIMING', False):
+            return True
+        user = getattr(request, 'user', None)
+        return bool(user is not None and user.is_staff)
+
+    @staticmethod
+    def server_timing(stats, duplicates):
+        entries = [
+            f'total;dur={stats.total * 1000:.2f}',
+            f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries"',
+        ]
+        for name in ('auth', 'serialize', 'render'):
+            if name in stats.timings:
+                entries.append(f'{name};dur={stats.timings[name] * 1000:.2f}')
+        for source, _, count in duplicates:
+            entries.append(f'nplusone;desc="{source or "unknown"} x{count}"')
+        return ', '.join(entries)
@@ -0,0 +1,226 @@
+import datetime
+import json
+import logging
+import random
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import groupby
+
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger('core.jobs')
+
+BACKOFF_BASE = 5          # seconds; doubles per attempt
+BACKOFF_MAX = 3600
+STALE_AFTER = datetime.timedelta(minutes=10)
+
+
+# ---- TASK REGISTRY ----
+TASKS = {}
+
+
+def task(name, batched=False, max_attempts=5):
+    """
+    Registers a handler under ``name``. Plain handlers get one job's payload
+    as keyword arguments; ``batched`` handlers get a list of payloads for all
+    claimed jobs of that name and succeed or fail together.
+    """
+    def register(fn):
+        fn.task_name, fn.batched, fn.max_attempts = name, batched, max_attempts
+        TASKS[name] = fn
+        return fn
+    return register
+
+
+def enqueue(name, delay=0, **payload):
+    """
+    Queues ``name`` once the current transaction commits, so rolled-back
+    writes never trigger side effects and workers never see rows that
+    aren't committed yet. Outside a transaction the job is queued at once.
+    """
+    handler = TASKS[name]
+
+    def insert():
+        Job.objects.create(
+            name=name, payload=payload, max_attempts=handler.max_attempts,
+            run_at=timezone.now() + datetime.timedelta(seconds=delay),
+        )
+    transaction.on_commit(insert)
+
+
+def enqueue_many(name, payloads, delay=0):
+    """enqueue() for many payloads, inserted with one bulk_create on commit."""
+    handler = TASKS[name]
+    payloads = list(payloads)
+
+    def insert():
+        run_at = timezone.now() + datetime.timedelta(seconds=delay)
+        Job.objects.bulk_create([
+            Job(name=name, payload=payload, max_attempts=handler.max_attempts, run_at=run_at)
+            for payload in payloads
+        ])
+    if payloads:
+        transaction.on_commit(insert)
+
+
+def enqueue_unique(name, payloads, delay=0):
+    """
+    enqueue_many() that coalesces: payloads already waiting in a queued job
+    of ``name`` (or repeated in ``payloads``) are queued only once.
+    """
+    handler = TASKS[name]
+    payloads = list(payloads)
+
+    def insert():
+        seen = {
+            json.dumps(payload, sort_keys=True)
+            for payload in Job.objects.filter(name=name, status=Job.QUEUED).values_list('payload', flat=True)
+        }
+        run_at = timezone.now() + datetime.timedelta(seconds=delay)
+        jobs = []
+        for payload in payloads:
+            key = json.dumps(payload, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                jobs.append(Job(name=name, payload=payload, max_attempts=handler.max_attempts, run_at=run_at))
+        Job.objects.bulk_create(jobs)
+    if payloads:
+        transaction.on_commit(insert)
+
+
+# ---- EXECUTION ----
+def execute(name, payloads):
+    """
+    Runs one handler call, atomically: every payload for batched tasks, the
+    only one otherwise.
+    """
+    handler = TASKS[name]
+    with transaction.atomic():
+        if handler.batched:
+            handler(payloads)
+        else:
+            handler(**payloads[0])
+
+
+def _execute_in_pool(name, payloads):
+    # Pool threads and processes hold their own connections; the registry is
+    # filled on import, which a fresh process hasn't done yet.
+    from . import tasks  # noqa: F401
+    try:
+        execute(name, payloads)
+    finally:
+        close_old_connections()
+
+
+def backoff(attempts):
+    """Seconds before retry ``attempts`` + 1: exponential with jitter, capped."""
+    delay = min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+    return delay * (0.5 + random.random() / 2)
+
+
+def claim(batch_size, now=None):
+    """
+    Marks up to ``batch_size`` due jobs as running and returns them. Jobs
+    left running by a crashed worker are reclaimed after STALE_AFTER. Uses
+    SKIP LOCKED where supported, so several workers can claim concurrently.
+    """
+    now = now or timezone.now()
+    due = Q(status=Job.QUEUED, run_at__lte=now) | Q(status=Job.RUNNING, locked_at__lt=now - STALE_AFTER)
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True).filter(due)
+            .order_by('run_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        Job.objects.filter(id__in=ids).update(status=Job.RUNNING, locked_at=now, attempts=F('attempts') + 1)
+        return list(Job.objects.filter(id__in=ids).order_by('name', 'run_at'))
+
+
+def _groups(jobs):
+    """[(name, [jobs])]: one group per batched task name, one per job otherwise."""
+    for name, group in groupby(jobs, key=lambda job: job.name):
+        group = list(group)
+        handler = TASKS.get(name)
+        if handler is not None and handler.batched:
+            yield name, group
+        else:
+            yield from ((name, [job]) for job in group)
+
+
+def _finish(succeeded, failures, now=None):
+    now = now or timezone.now()
+    if succeeded:
+        Job.objects.filter(id__in=succeeded).update(status=Job.DONE, locked_at=None, last_error='')
+    for job, error in failures:
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+            logger.error('Job %s failed for good after %d attempts: %s', job, job.attempts, error.splitlines()[-1])
+        else:
+            job.status = Job.QUEUED
+            job.run_at = now + datetime.timedelta(seconds=backoff(job.attempts))
+        job.locked_at, job.last_error = None, error
+    Job.objects.bulk_update([job for job, _ in failures], ['status', 'run_at', 'locked_at', 'last_error'])
+
+
+def run_batch(jobs, executor=None):
+    """Runs claimed jobs (on ``executor`` if given) and records the outcomes. Returns (done, failed)."""
+    succeeded, failures, pending = [], [], []
+    for name, group in _groups(jobs):
+        if name not in TASKS:
+            for job in group:
+                # Retrying won't help; fail it for good.
+                job.attempts = job.max_attempts
+                failures.append((job, f'No task registered as {name!r}.'))
+            continue
+        payloads = [job.payload for job in group]
+        pending.append((group, executor.submit(_execute_in_pool, name, payloads) if executor else None))
+
+    for group, future in pending:
+        try:
+            if future is None:
+                execute(group[0].name, [job.payload for job in group])
+            else:
+                future.result()
+        except Exception:
+            failures += [(job, traceback.format_exc()) for job in group]
+        else:
+            succeeded += [job.id for job in group]
+    _finish(succeeded, failures)
+    return len(succeeded), len(failures)
+
+
+def make_executor(kind, concurrency):
+    if kind == 'inline' or concurrency <= 0:
+        return None
+    if kind == 'process':
+        # Forked children must not share the parent's database sockets.
+        connections.close_all()
+        return ProcessPoolExecutor(max_workers=concurrency)
+    return ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job')
+
+
+def work(batch_size=50, executor=None, once=False, poll_interval=1.0, on_idle=None, stop=None):
+    """
+    The worker loop: claim, run, record. With ``once`` it stops when no job
+    is due. ``on_idle`` is called between polls (the reminder sweep hooks in
+    here). Returns the number of jobs run.
+    """
+    total = 0
+    while stop is None or not stop():
+        jobs = claim(batch_size)
+        if jobs:
+            done, failed = run_batch(jobs, executor)
+            total += done + failed
+            continue
+        if once:
+            break
+        if on_idle is not None:
+            on_idle()
+        time.sleep(poll_interval)
+    return total
@@ -0,0 +1,25 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.archive import archivable_appointments, archive_appointments
+
+
+class Command(BaseCommand):
+    help = "Move finished appointments and their payments into the archive tables (for cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Age horizon. Default: ARCHIVE_AFTER_DAYS.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Appointments moved per transaction.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be moved.")
+
+    def handle(self, *args, **options):
+        before = None
+        if options['days'] is not None:
+            before = timezone.localdate() - datetime.timedelta(days=options['days'])
+        if options['dry_run']:
+            self.stdout.write(f"{archivable_appointments(before).count()} appointments would be archived.")
+            return
+        appointments, payments = archive_appointments(before, batch_size=options['batch_size'])
+        self.stdout.write(f"Archived {appointments} appointments and {payments} payments.")
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.benchmarks.asgi import compare_servers
+from core.benchmarks.data import generate
+
+
+class Command(BaseCommand):
+    help = "Compare WSGI and ASGI throughput and latency for the hot read endpoints (in-process clients)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--seed', action='store_true',
+                            help="Insert the deterministic benchmark dataset first (committed).")
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.stdout.write(f"Seeded: {generate()}")
+        results = compare_servers(requests=options['requests'], concurrency=options['concurrency'])
+        for path, modes in results.items():
+            self.stdout.write(path)
+            for mode, stats in modes.items():
+                self.stdout.write(
+                    f"  {mode:<11} {stats['rps']:>9} req/s   p50 {stats['p50_ms']:>8} ms"
+                    f"   p99 {stats['p99_ms']:>8} ms"
+                )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.benchmarks.bulk import compare_import_throughput
+
+
+class Command(BaseCommand):
+    help = "Compare per-row and bulk import throughput (rows/sec). All writes are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        results = compare_import_throughput(rows=options['rows'], chunk_size=options['chunk_size'])
+        for kind, rates in results.items():
+            speedup = rates['bulk'] / rates['per_row'] if rates['per_row'] else float('nan')
+            self.stdout.write(
+                f"{kind:<18} per-row {rates['per_row']:>10} rows/s   bulk {rates['bulk']:>10} rows/s   x{speedup:.1f}"
+            )
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.benchmarks.connections import MODES, available_modes, compare_connection_modes
+
+
+class Command(BaseCommand):
+    help = "Measure per-request latency with a new connection per request, persistent connections and a connection pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--mode', action='append', choices=list(MODES), help="Repeatable; defaults to every mode this database supports.")
+
+    def handle(self, *args, **options):
+        modes = options['mode'] or available_modes()
+        unsupported = set(modes) - set(available_modes())
+        if unsupported:
+            raise CommandError(f"Not supported here: {', '.join(sorted(unsupported))} (pooling needs PostgreSQL and psycopg[pool]).")
+        results = compare_connection_modes(requests=options['requests'], modes=modes)
+        for endpoint, by_mode in results.items():
+            self.stdout.write(endpoint)
+            for mode, result in by_mode.items():
+                self.stdout.write(
+                    f"  {mode:<12} p50 {result['p50_ms']:>7} ms   p95 {result['p95_ms']:>7} ms"
+                    f"   p99 {result['p99_ms']:>7} ms   {result['rps']:>8} req/s"
+                )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.benchmarks.payments import ingest_throughput
+
+
+class Command(BaseCommand):
+    help = "Measure payment event ingestion throughput, batched vs one at a time. All writes are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--appointments', type=int, default=2000)
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        results = ingest_throughput(appointments=options['appointments'], batch_size=options['batch_size'])
+        for label, result in results.items():
+            self.stdout.write(
+                f"{label:<12} {result['events']:>7} events   {result['events_per_sec']:>10} events/s"
+                f"   {result['queries_per_event']} queries/event"
+            )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from core.benchmarks.serializers import compare_serializers
+
+
+class Command(BaseCommand):
+    help = "Compare rows/sec of the nested list serializers and their flat plans. All writes are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=14,
+                            help="Dataset seed; pick one not already loaded into this database.")
+
+    def handle(self, *args, **options):
+        results = compare_serializers(rows=options['rows'], repeat=options['repeat'], seed=options['seed'])
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<14} {result['rows']:>7} rows   nested {result['nested_rows_per_sec']:>10} rows/s"
+                f"   flat {result['flat_rows_per_sec']:>10} rows/s   x{result['speedup']}"
+            )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.benchmarks.signup import signup_throughput
+
+
+class Command(BaseCommand):
+    help = "Measure signup throughput for the registration service per password hasher. All writes are rolled back."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200)
+        parser.add_argument('--hasher', action='append', dest='hashers',
+                            help="Hasher algorithm to try (repeatable). Default: default and md5.")
+
+    def handle(self, *args, **options):
+        results = signup_throughput(count=options['count'], hashers=options['hashers'] or ('default', 'md5'))
+        for label, result in results.items():
+            self.stdout.write(
+                f"{label:<28} {result['signups_per_sec']:>10} signups/s   {result['queries_per_signup']} queries/signup"
+            )
@@ -0,0 +1,49 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarks.suite import SCALES, compare, run_suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the benchmark suite in a scratch database: endpoint latency/query/allocation "
+        "micro-benchmarks plus a concurrent booking load. Prints or writes a JSON report."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--endpoint', action='append', dest='endpoints',
+                            help="Only benchmark this endpoint (repeatable).")
+        parser.add_argument('--no-load', action='store_false', dest='load')
+        parser.add_argument('--load-workers', type=int, default=16)
+        parser.add_argument('--load-bookings', type=int, default=400)
+        parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+        parser.add_argument('--baseline', help="A previous JSON report to compare against.")
+
+    def handle(self, *args, **options):
+        report = run_suite(
+            scale=options['scale'], seed=options['seed'], iterations=options['iterations'],
+            warmup=options['warmup'], endpoints=options['endpoints'], load=options['load'],
+            load_workers=options['load_workers'], load_bookings=options['load_bookings'],
+        )
+        payload = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(payload + '\n')
+            self.stderr.write(f"Report written to {options['output']}")
+        else:
+            self.stdout.write(payload)
+
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                changes = compare(json.load(handle), report)
+            for name, metrics in changes.items():
+                summary = '  '.join(
+                    f"{metric} {old}->{new} ({pct:+}%)" if pct is not None else f"{metric} {old}->{new}"
+                    for metric, (old, new, pct) in metrics.items()
+                )
+                self.stderr.write(f"{name:<22} {summary}")
@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.bulk import IMPORTERS
+from core.parsers import csv_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk import specialists, symptom mappings, doctors or appointments from a JSON or CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS))
+        parser.add_argument('path')
+        parser.add_argument('--partial', action='store_true', help="Write valid rows even if some rows fail.")
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def read_rows(self, path):
+        with open(path, newline='', encoding='utf-8') as handle:
+            if path.endswith('.csv'):
+                return csv_rows(handle)
+            rows = json.load(handle)
+        if not isinstance(rows, list):
+            raise CommandError("JSON input must be a list of objects.")
+        return rows
+
+    def handle(self, *args, **options):
+        rows = self.read_rows(options['path'])
+        importer = IMPORTERS[options['kind']](rows, chunk_size=options['chunk_size'], partial=options['partial'])
+        result = importer.run()
+        for error in result['errors']:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(rows)} rows: {result['created']} created, {result['updated']} updated, "
+            f"{len(result['errors'])} with errors"
+        ))
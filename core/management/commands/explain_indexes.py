@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core.benchmarks.plans import compare_plans
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway dataset and print query plans for the hot lookups with and without their indexes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doctors', type=int, default=200)
+        parser.add_argument('--patients', type=int, default=2000)
+        parser.add_argument('--appointments', type=int, default=20000)
+        parser.add_argument('--mappings', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        result = compare_plans(
+            doctors=options['doctors'],
+            patients=options['patients'],
+            appointments=options['appointments'],
+            mappings=options['mappings'],
+            seed=options['seed'],
+        )
+        self.stdout.write(f"Dataset: {result['dataset']} (scratch database, destroyed)")
+        for name in result['after']:
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {name}"))
+            self.stdout.write(f"-- before:\n{result['before'][name]}")
+            self.stdout.write(f"-- after:\n{result['after'][name]}")
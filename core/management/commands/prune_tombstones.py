@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from core.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = "Delete delta-sync tombstones past the retention window (for cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help="Retention. Default: SYNC_TOMBSTONE_DAYS.")
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones(days=options['days'])
+        self.stdout.write(f"Deleted {deleted} tombstones.")
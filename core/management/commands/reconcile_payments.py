@@ -0,0 +1,74 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.payments import SETTLEMENT_COLUMNS, paid_totals, reconcile
+
+
+class Command(BaseCommand):
+    help = (
+        "Diff a provider settlement CSV (transaction_id, amount, status) against the payments table. "
+        "The file is streamed in chunks; mismatches are written as CSV."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('settlement', help="Path to the settlement CSV.")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--output', help="Write mismatches here instead of stdout.")
+        parser.add_argument(
+            '--start', help="YYYY-MM-DD: the period the file covers; also reports unsettled payments and paid totals.",
+        )
+        parser.add_argument('--end', help="YYYY-MM-DD (inclusive).")
+
+    def handle(self, *args, **options):
+        start = end = None
+        if options['start'] and options['end']:
+            try:
+                start, end = parse_date(options['start']), parse_date(options['end'])
+            except ValueError:
+                start = end = None
+            if start is None or end is None:
+                raise CommandError("--start and --end must be YYYY-MM-DD dates.")
+
+        out = open(options['output'], 'w', newline='') if options['output'] else self.stdout
+        try:
+            with open(options['settlement'], newline='') as settlement:
+                reader = csv.DictReader(settlement)
+                missing = set(SETTLEMENT_COLUMNS) - set(reader.fieldnames or ())
+                if missing:
+                    raise CommandError(f"Settlement file lacks columns: {', '.join(sorted(missing))}.")
+                summary = self.write_diff(reader, out, options['chunk_size'], start, end)
+        finally:
+            if out is not self.stdout:
+                out.close()
+
+        self.stderr.write(
+            f"{summary['rows']} settlement rows, {summary['settled']} settled for {summary['amount']:.2f}; "
+            f"{summary['mismatches']} mismatches."
+        )
+        if start is not None:
+            count, amount = paid_totals(start, end)
+            self.stderr.write(f"Paid in the database {start}..{end}: {count} for {amount:.2f}.")
+
+    def write_diff(self, reader, out, chunk_size, start=None, end=None):
+        summary = {'rows': 0, 'settled': 0, 'amount': Decimal('0.00'), 'mismatches': 0}
+
+        def counted(rows):
+            for row in rows:
+                summary['rows'] += 1
+                if (row.get('status') or '').strip().lower() == 'paid':
+                    summary['settled'] += 1
+                    try:
+                        summary['amount'] += Decimal(row['amount'])
+                    except (InvalidOperation, TypeError):
+                        pass
+                yield row
+
+        writer = csv.writer(out)
+        writer.writerow(['transaction_id', 'problem', 'settlement', 'database'])
+        for mismatch in reconcile(counted(reader), chunk_size=chunk_size, start=start, end=end):
+            summary['mismatches'] += 1
+            writer.writerow(mismatch)
+        return summary
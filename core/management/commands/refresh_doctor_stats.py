@@ -0,0 +1,29 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from core.dashboard import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DoctorDailyStats rollup for a date range (default: the last 90 days and next 90)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help="YYYY-MM-DD")
+        parser.add_argument('--end', help="YYYY-MM-DD")
+        parser.add_argument('--doctor', type=int, action='append', dest='doctors',
+                            help="Only this doctor id (repeatable).")
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        try:
+            start = parse_date(options['start'] or '') or today - datetime.timedelta(days=90)
+            end = parse_date(options['end'] or '') or today + datetime.timedelta(days=90)
+        except ValueError:
+            raise CommandError("Dates must be valid YYYY-MM-DD values.")
+        if end < start:
+            raise CommandError("--end must not be before --start.")
+        count = rebuild_daily_stats(start, end, doctor_ids=options['doctors'])
+        self.stdout.write(f"Refreshed {count} doctor-days between {start} and {end}.")
@@ -0,0 +1,51 @@
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.jobs import make_executor, work
+from core.tasks import sweep_reminders
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (emails, payment side effects) and the periodic reminder sweep."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help="Jobs claimed per round.")
+        parser.add_argument('--executor', choices=['thread', 'process', 'inline'], default='thread')
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--sweep-interval', type=int, default=None,
+                            help="Seconds between reminder sweeps; 0 disables. Default: REMINDER_SWEEP_SECONDS.")
+        parser.add_argument('--once', action='store_true', help="Exit when no job is due.")
+
+    def handle(self, *args, **options):
+        stopping = []
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            # Finish the current round, then exit.
+            signal.signal(signum, lambda *_: stopping.append(True))
+
+        interval = options['sweep_interval']
+        if interval is None:
+            interval = getattr(settings, 'REMINDER_SWEEP_SECONDS', 300)
+        last_sweep = [0.0]
+
+        def sweep():
+            if interval and time.monotonic() - last_sweep[0] >= interval:
+                last_sweep[0] = time.monotonic()
+                queued = sweep_reminders()
+                if queued:
+                    self.stdout.write(f"Queued {queued} reminders.")
+
+        executor = make_executor(options['executor'], options['concurrency'])
+        try:
+            sweep()
+            total = work(
+                batch_size=options['batch_size'], executor=executor, once=options['once'],
+                poll_interval=options['poll_interval'], on_idle=sweep, stop=lambda: bool(stopping),
+            )
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        self.stdout.write(f"Ran {total} jobs.")
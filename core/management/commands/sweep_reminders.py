@@ -0,0 +1,18 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from core.tasks import sweep_reminders
+
+
+class Command(BaseCommand):
+    help = "Queue reminder jobs for appointments starting soon (for cron, if run_worker isn't sweeping)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=None, help="Look-ahead window. Default: REMINDER_WINDOW_HOURS.")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        window = datetime.timedelta(hours=options['hours']) if options['hours'] else None
+        queued = sweep_reminders(window=window, batch_size=options['batch_size'])
+        self.stdout.write(f"Queued {queued} reminders.")
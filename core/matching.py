@@ -0,0 +1,195 @@
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+EXACT, PARTIAL = 1.0, 0.85
+MIN_TOKEN_LENGTH = 2
+MIN_ENTRY_SCORE = 0.3
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def trigrams(token):
+    padded = f'${token}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """Levenshtein distance, giving up (returning limit + 1) once it exceeds ``limit``."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+# ---- SYMPTOM MATCHER ----
+class SymptomMatcher:
+    """
+    Immutable in-memory index over SymptomSpecialtyMap: an inverted index from
+    token to mapping rows plus a trigram index over the vocabulary for typo
+    tolerant lookups. Built once, then answers without touching the database.
+    """
+
+    def __init__(self, mappings, specialties, doctors):
+        # mappings: (symptom, specialty_id); specialties: {id: name};
+        # doctors: {specialty_id: [doctor dicts]}
+        self.specialties = specialties
+        self.doctors = doctors
+        self.entries = []
+        self.postings = defaultdict(list)
+        self.grams = defaultdict(set)
+
+        for symptom, specialty_id in mappings:
+            tokens = tokenize(symptom)
+            if not tokens or specialty_id not in specialties:
+                continue
+            index = len(self.entries)
+            self.entries.append((symptom, specialty_id, tokens))
+            for token in set(tokens):
+                self.postings[token].append(index)
+                for gram in trigrams(token):
+                    self.grams[gram].add(token)
+
+    def token_candidates(self, query_token):
+        """Vocabulary tokens similar to ``query_token`` with a 0..1 strength."""
+        if query_token in self.postings:
+            found = {query_token: EXACT}
+        else:
+            found = {}
+        if len(query_token) < MIN_TOKEN_LENGTH:
+            return found
+
+        limit = 1 if len(query_token) <= 5 else 2
+        query_grams = trigrams(query_token)
+        shared = defaultdict(int)
+        for gram in query_grams:
+            for token in self.grams.get(gram, ()):
+                shared[token] += 1
+
+        for token, count in shared.items():
+            if token in found:
+                continue
+            if len(query_token) >= 3 and query_token in token:
+                # Substring hit, the behaviour symptom__icontains used to give.
+                found[token] = PARTIAL * max(0.5, len(query_token) / len(token))
+                continue
+            if count * 3 < len(query_grams):
+                continue
+            distance = edit_distance(query_token, token, limit)
+            if distance <= limit:
+                found[token] = PARTIAL * (1 - distance / max(len(token), len(query_token)))
+        return found
+
+    def match_symptom(self, text):
+        """{specialty_id: (score, matched symptom)} for one free-text symptom."""
+        query_tokens = tokenize(text)
+        if not query_tokens:
+            return {}
+
+        entry_strengths = defaultdict(dict)
+        for position, query_token in enumerate(query_tokens):
+            for token, strength in self.token_candidates(query_token).items():
+                for index in self.postings[token]:
+                    best = entry_strengths[index]
+                    if strength > best.get(position, 0):
+                        best[position] = strength
+
+        scores = {}
+        for index, strengths in entry_strengths.items():
+            symptom, specialty_id, tokens = self.entries[index]
+            score = sum(strengths.values()) / max(len(query_tokens), len(tokens))
+            if score >= MIN_ENTRY_SCORE and score > scores.get(specialty_id, (0, None))[0]:
+                scores[specialty_id] = (score, symptom)
+        return scores
+
+    def match(self, symptoms, limit=None):
+        """
+        Ranks specialties by the summed match strength across all ``symptoms``,
+        so a specialty explaining several symptoms outranks a single strong hit.
+        """
+        totals = defaultdict(float)
+        matched = defaultdict(list)
+        for text in symptoms:
+            for specialty_id, (score, symptom) in self.match_symptom(text).items():
+                totals[specialty_id] += score
+                matched[specialty_id].append({'query': text, 'symptom': symptom, 'score': round(score, 3)})
+
+        ranked = sorted(totals, key=lambda pk: (-totals[pk], self.specialties[pk]))
+        if limit:
+            ranked = ranked[:limit]
+        return [
+            {
+                'specialty': {'id': pk, 'name': self.specialties[pk]},
+                'score': round(totals[pk], 3),
+                'matched_symptoms': matched[pk],
+                'doctors': self.doctors.get(pk, []),
+            }
+            for pk in ranked
+        ]
+
+    @classmethod
+    def from_database(cls):
+        from .models import Doctor, Specialist, SymptomSpecialtyMap
+
+        specialties = dict(Specialist.objects.values_list('id', 'name'))
+        mappings = list(SymptomSpecialtyMap.objects.values_list('symptom', 'specialty_id'))
+        doctors = defaultdict(list)
+        rows = (
+            Doctor.objects.filter(is_available=True, specialty__isnull=False)
+            .order_by('id')
+            .values_list('id', 'specialty_id', 'user__first_name', 'user__last_name')
+        )
+        for pk, specialty_id, first_name, last_name in rows:
+            doctors[specialty_id].append({'id': pk, 'full_name': f"{first_name} {last_name}".strip()})
+        return cls(mappings, specialties, dict(doctors))
+
+
+# ---- PROCESS-LOCAL INSTANCE ----
+# Rebuilt lazily after invalidation. Signals only reach this process, so the
+# TTL bounds how stale other workers can get.
+_lock = threading.Lock()
+_matcher = None
+_built_at = 0.0
+_generation = 0
+
+
+def get_matcher():
+    global _matcher, _built_at
+    ttl = getattr(settings, 'SYMPTOM_MATCHER_TTL', 300)
+    matcher = _matcher
+    if matcher is not None and (not ttl or time.monotonic() - _built_at < ttl):
+        return matcher
+
+    with _lock:
+        if _matcher is not None and (not ttl or time.monotonic() - _built_at < ttl):
+            return _matcher
+        generation = _generation
+        matcher = SymptomMatcher.from_database()
+        # Don't publish an index that was invalidated while it was being built.
+        if generation == _generation:
+            _matcher, _built_at = matcher, time.monotonic()
+        return matcher
+
+
+def invalidate():
+    global _matcher, _generation
+    _generation += 1
+    _matcher = None
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:21
+
+from django.db import migrations, models
+
+from core.operations import VendorRunSQL
+
+# SymptomMatchView filters with symptom__icontains, which Django renders as
+# UPPER("symptom"::text) LIKE UPPER(%s) on PostgreSQL. A trigram GIN index on
+# that expression turns the substring match into an index scan. SQLite has no
+# trigram index, so it gets a NOCASE B-tree that serves prefix matches.
+SYMPTOM_SEARCH_INDEX = VendorRunSQL(
+    forwards={
+        'postgresql': [
+            'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+            'CREATE INDEX symptom_trgm_idx ON core_symptomspecialtymap '
+            'USING gin (UPPER("symptom"::text) gin_trgm_ops)',
+        ],
+        'sqlite': [
+            'CREATE INDEX symptom_nocase_idx ON core_symptomspecialtymap (symptom COLLATE NOCASE)',
+        ],
+    },
+    backwards={
+        'postgresql': ['DROP INDEX IF EXISTS symptom_trgm_idx'],
+        'sqlite': ['DROP INDEX IF EXISTS symptom_nocase_idx'],
+    },
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['patient', '-date'], name='appt_patient_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='appointment',
+            index=models.Index(fields=['doctor', 'date', 'time'], name='appt_doctor_slot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['status', 'created_at'], name='payment_status_created_idx'),
+        ),
+        SYMPTOM_SEARCH_INDEX,
+    ]
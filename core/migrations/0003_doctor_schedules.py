@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def cancel_duplicate_slots(apps, schema_editor):
+    # The constraint below can't be added while a slot is double booked:
+    # keep the earliest booking of each slot and cancel the rest.
+    Appointment = apps.get_model('core', 'Appointment')
+    active = Appointment.objects.exclude(status__in=('cancelled',))
+    seen, duplicates = set(), []
+    for pk, *slot in active.order_by('id').values_list('id', 'doctor_id', 'date', 'time').iterator():
+        if tuple(slot) in seen:
+            duplicates.append(pk)
+        seen.add(tuple(slot))
+    Appointment.objects.filter(id__in=duplicates).update(status='cancelled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=30)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ScheduleException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField(blank=True, null=True)),
+                ('end_time', models.TimeField(blank=True, null=True)),
+                ('is_available', models.BooleanField(default=False)),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=30)),
+                ('reason', models.CharField(blank=True, max_length=200)),
+            ],
+        ),
+        migrations.RunPython(cancel_duplicate_slots, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='appointment',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ('cancelled',)), _negated=True), fields=('doctor', 'date', 'time'), name='unique_active_doctor_slot', violation_error_message='This time slot is already booked.'),
+        ),
+        migrations.AddField(
+            model_name='doctorschedule',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedules', to='core.doctor'),
+        ),
+        migrations.AddField(
+            model_name='scheduleexception',
+            name='doctor',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='schedule_exceptions', to='core.doctor'),
+        ),
+        migrations.AddIndex(
+            model_name='doctorschedule',
+            index=models.Index(fields=['doctor', 'weekday'], name='schedule_doctor_weekday_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='doctorschedule',
+            constraint=models.CheckConstraint(condition=models.Q(('end_time__gt', models.F('start_time'))), name='schedule_end_after_start'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduleexception',
+            index=models.Index(fields=['doctor', 'date'], name='exception_doctor_date_idx'),
+        ),
+    ]
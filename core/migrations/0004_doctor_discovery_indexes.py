@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:28
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+from core.operations import VendorRunSQL
+
+# DoctorFilterBackend searches bios with SearchVector('bio', config='english'),
+# rendered as to_tsvector('english'::regconfig, COALESCE(("bio")::text, '')).
+# A GIN index on the same expression serves those matches on PostgreSQL.
+# SQLite falls back to bio LIKE '%...%', which no index can help.
+DOCTOR_BIO_SEARCH_INDEX = VendorRunSQL(
+    forwards={
+        'postgresql': [
+            'CREATE INDEX doctor_bio_search_idx ON core_doctor '
+            "USING gin (to_tsvector('english'::regconfig, COALESCE((\"bio\")::text, '')))",
+        ],
+    },
+    backwards={
+        'postgresql': ['DROP INDEX IF EXISTS doctor_bio_search_idx'],
+    },
+)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_doctor_schedules'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doctor',
+            index=models.Index(fields=['specialty', 'is_available'], name='doctor_specialty_avail_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='specialist',
+            index=models.Index(django.db.models.functions.text.Upper('name'), name='specialist_name_upper_idx'),
+        ),
+        DOCTOR_BIO_SEARCH_INDEX,
+    ]
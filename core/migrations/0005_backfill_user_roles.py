@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+def backfill_roles(apps, schema_editor):
+    # Registration used to leave every account on the default 'patient' role.
+    # Roles now go into JWT claims, so doctor accounts need the right one.
+    CustomUser = apps.get_model('core', 'CustomUser')
+    CustomUser.objects.filter(doctor_profile__isnull=False).exclude(role='doctor').update(role='doctor')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_doctor_discovery_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_roles, migrations.RunPython.noop),
+    ]
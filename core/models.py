@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 
@@ -18,6 +19,15 @@ class CustomUser(AbstractUser):
 class Specialist(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Case-insensitive name lookups (doctor discovery by specialty name).
+            models.Index(Upper('name'), name='specialist_name_upper_idx'),
+            # Delta sync (core.sync) seeks on (updated_at, id).
+            models.Index(fields=['updated_at', 'id'], name='specialist_sync_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -39,10 +49,77 @@ class Doctor(models.Model):
     bio = models.TextField(blank=True)
     is_available = models.BooleanField(default=True)
     available_times = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['specialty', 'is_available'], name='doctor_specialty_avail_idx'),
+            models.Index(fields=['updated_at', 'id'], name='doctor_sync_idx'),
+        ]
 
     def __str__(self):
         return f"Dr. {self.user.get_full_name()}"
 
+# ---- DOCTOR SCHEDULE ----
+class DoctorSchedule(models.Model):
+    """A recurring weekly block of bookable time, cut into fixed-length slots."""
+    WEEKDAY_CHOICES = (
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    )
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='schedules'
+    )
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'weekday'], name='schedule_doctor_weekday_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(condition=models.Q(end_time__gt=models.F('start_time')), name='schedule_end_after_start'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+# ---- SCHEDULE EXCEPTION ----
+class ScheduleException(models.Model):
+    """
+    Overrides the weekly schedule on one date: blocks the whole day (no times),
+    blocks a time range, or with is_available=True adds extra hours.
+    """
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='schedule_exceptions'
+    )
+    date = models.DateField()
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    is_available = models.BooleanField(default=False)
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+    reason = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'date'], name='exception_doctor_date_idx'),
+        ]
+
+    def __str__(self):
+        kind = 'extra hours' if self.is_available else 'unavailable'
+        return f"{self.date} {kind}"
+
 # ---- PATIENT ----
 class Patient(models.Model):
     user = models.OneToOneField(
@@ -54,12 +131,23 @@ class Patient(models.Model):
     gender = models.CharField(max_length=10)
     phone = models.CharField(max_length=20)
     address = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='patient_sync_idx'),
+        ]
 
     def __str__(self):
         return self.user.get_full_name()
 
 # ---- APPOINTMENT ----
+# Appointments in these statuses free their slot for rebooking.
+INACTIVE_APPOINTMENT_STATUSES = ('cancelled',)
+
 class Appointment(models.Model):
+    INACTIVE_STATUSES = INACTIVE_APPOINTMENT_STATUSES
+
     patient = models.ForeignKey(
         Patient,
         null=True,
@@ -75,12 +163,42 @@ class Appointment(models.Model):
     time = models.TimeField()
     status = models.CharField(max_length=20, default='pending')
     notes = models.TextField(blank=True, null=True)
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # MyAppointmentsView: filter by patient, newest first.
+            models.Index(fields=['patient', '-date'], name='appt_patient_date_idx'),
+            # Per-doctor schedule lookups.
+            models.Index(fields=['doctor', 'date', 'time'], name='appt_doctor_slot_idx'),
+            # Reminder sweep: upcoming appointments not reminded yet.
+            models.Index(
+                fields=['date', 'time'], condition=models.Q(reminder_sent_at__isnull=True),
+                name='appt_reminder_due_idx',
+            ),
+            # Delta sync, per patient and per doctor.
+            models.Index(fields=['patient', 'updated_at', 'id'], name='appt_patient_sync_idx'),
+            models.Index(fields=['doctor', 'updated_at', 'id'], name='appt_doctor_sync_idx'),
+        ]
+        constraints = [
+            # Last line of defence against double booking under concurrency.
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'time'],
+                condition=~models.Q(status__in=INACTIVE_APPOINTMENT_STATUSES),
+                name='unique_active_doctor_slot',
+                violation_error_message='This time slot is already booked.',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.patient.user.username} → {self.doctor.user.username} @ {self.date} {self.time}"
 
 # ---- PAYMENT ----
 class Payment(models.Model):
+    # Payments in these statuses count as revenue.
+    PAID_STATUSES = ('paid',)
+
     appointment = models.OneToOneField(
         Appointment,
         on_delete=models.CASCADE,
@@ -94,10 +212,110 @@ class Payment(models.Model):
     transaction_id = models.CharField(max_length=100, unique=True)
     status = models.CharField(max_length=20, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='payment_status_created_idx'),
+            models.Index(fields=['updated_at', 'id'], name='payment_sync_idx'),
+        ]
 
     def __str__(self):
         return f"{self.transaction_id} - {self.status}"
 
+
+# ---- ARCHIVE ----
+# Finished appointments past ARCHIVE_AFTER_DAYS, and their payments, are
+# moved here by ``manage.py archive_appointments`` (core.archive) so the
+# live tables only hold recent and upcoming visits. Same columns and ids;
+# list endpoints read both with ?include_archived=true.
+ARCHIVABLE_APPOINTMENT_STATUSES = ('completed', 'cancelled')
+
+class ArchivedAppointment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    patient = models.ForeignKey(
+        Patient,
+        null=True,
+        on_delete=models.CASCADE,
+        related_name='archived_appointments'
+    )
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='archived_appointments'
+    )
+    date = models.DateField()
+    time = models.TimeField()
+    status = models.CharField(max_length=20)
+    notes = models.TextField(blank=True, null=True)
+    reminder_sent_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', '-date'], name='archived_appt_patient_idx'),
+            models.Index(fields=['doctor', 'date', 'time'], name='archived_appt_doctor_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived appointment #{self.pk} @ {self.date} {self.time}"
+
+
+class ArchivedPayment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    appointment = models.OneToOneField(
+        ArchivedAppointment,
+        on_delete=models.CASCADE,
+        related_name='payment'
+    )
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    method = models.CharField(
+        max_length=50,
+        choices=[('mpesa', 'M-Pesa'), ('stripe', 'Stripe')]
+    )
+    transaction_id = models.CharField(max_length=100, unique=True)
+    status = models.CharField(max_length=20)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='archived_payment_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_id} - {self.status} (archived)"
+
+
+# ---- DOCTOR DAILY STATS (ROLLUP) ----
+class DoctorDailyStats(models.Model):
+    """
+    Per-doctor, per-day appointment counts and paid revenue, maintained by
+    core.dashboard when DOCTOR_STATS_ROLLUP is on. Appointments count on their
+    own date, payments on the (local) date they were created.
+    """
+    doctor = models.ForeignKey(
+        Doctor,
+        on_delete=models.CASCADE,
+        related_name='daily_stats'
+    )
+    date = models.DateField()
+    appointments = models.PositiveIntegerField(default=0)
+    status_counts = models.JSONField(default=dict, blank=True)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    paid_payments = models.PositiveIntegerField(default=0)
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date'], name='unique_doctor_daily_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.doctor_id} @ {self.date}"
+
 # ---- SYMPTOM TO SPECIALTY MAP ----
 class SymptomSpecialtyMap(models.Model):
     symptom = models.CharField(max_length=100)
@@ -109,3 +327,56 @@ class SymptomSpecialtyMap(models.Model):
 
     def __str__(self):
         return f"{self.symptom} → {self.specialty.name}"
+
+
+# ---- BACKGROUND JOBS ----
+class Job(models.Model):
+    """A queued side effect, run by the ``run_worker`` command (core.jobs)."""
+    QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Claiming: due queued jobs (and stale running ones) in run_at order.
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+# ---- TOMBSTONES (DELTA SYNC) ----
+class Tombstone(models.Model):
+    """
+    A deleted row, kept so delta sync (core.sync) can tell clients to drop
+    it. ``patient_id``/``doctor_id`` are whose data it was, for scoping;
+    plain integers, as those rows may be gone too.
+    """
+    kind = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    patient_id = models.BigIntegerField(null=True, blank=True)
+    doctor_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.object_id} deleted {self.deleted_at}"
@@ -0,0 +1,36 @@
+from django.db.migrations.operations.base import Operation
+
+
+# ---- VENDOR-SPECIFIC MIGRATION SQL ----
+class VendorRunSQL(Operation):
+    """
+    Runs raw SQL chosen by database vendor, e.g. a GIN index on PostgreSQL and
+    a plain B-tree fallback on SQLite. Vendors without an entry are skipped.
+    """
+    reversible = True
+
+    def __init__(self, forwards, backwards=None):
+        self.forwards = forwards
+        self.backwards = backwards or {}
+
+    def deconstruct(self):
+        kwargs = {'forwards': self.forwards}
+        if self.backwards:
+            kwargs['backwards'] = self.backwards
+        return self.__class__.__qualname__, [], kwargs
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def _run(self, schema_editor, statements):
+        for sql in statements.get(schema_editor.connection.vendor, ()):
+            schema_editor.execute(sql, params=None)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._run(schema_editor, self.forwards)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self._run(schema_editor, self.backwards)
+
+    def describe(self):
+        return 'Vendor-specific SQL for %s' % ', '.join(sorted(self.forwards))
@@ -0,0 +1,178 @@
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# ---- KEYSET (CURSOR) PAGINATION ----
+def sort_rows(rows, ordering):
+    """Sorts model instances or named rows in Python by ``order_by()``-style fields."""
+    rows = list(rows)
+    for field in reversed(ordering):
+        name = field.lstrip('-')
+        rows.sort(key=lambda row: getattr(row, name), reverse=field.startswith('-'))
+    return rows
+
+
+class KeysetPagination(BasePagination):
+    """
+    Seeks on the ordering columns instead of using OFFSET, so every page costs
+    the same no matter how deep the client has scrolled. The ordering must end
+    in a unique column (normally ``id``) and its columns must be non-null.
+    """
+    ordering = ('id',)
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_ordering(self, view=None):
+        return getattr(view, 'keyset_ordering', None) or self.ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request, view)
+
+    def paginate_querysets(self, querysets, request, view=None):
+        """
+        Pages through several querysets as if they were one, e.g. a table
+        and its archive. They must share the ordering columns, and the
+        last one must be unique across all of them.
+        """
+        self.request = request
+        self.model = querysets[0].model
+        self.ordering_fields = self.get_ordering(view)
+        page_size = self.get_page_size(request)
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor['reverse'])
+        order_by = [self._direction(field, reverse) for field in self.ordering_fields]
+        rows = []
+        for queryset in querysets:
+            if cursor:
+                queryset = queryset.filter(self.seek_filter(cursor['values'], reverse))
+            rows.extend(queryset.order_by(*order_by)[:page_size + 1])
+        if len(querysets) > 1:
+            rows = sort_rows(rows, order_by)[:page_size + 1]
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.first_row = rows[0] if rows else None
+        self.last_row = rows[-1] if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or self.last_row is None:
+            return None
+        return self.encode_cursor(self.last_row, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_row is None:
+            return None
+        return self.encode_cursor(self.first_row, reverse=True)
+
+    # -- cursor handling --
+
+    def _direction(self, field, reverse):
+        descending = field.startswith('-')
+        name = field.lstrip('-')
+        return name if descending == reverse else f'-{name}'
+
+    def seek_filter(self, values, reverse):
+        """
+        (a, b, c) > (x, y, z) expanded as
+        a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z).
+        """
+        condition = Q()
+        for position, field in enumerate(self.ordering_fields):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') != reverse else 'gt'
+            term = Q(**{f'{name}__{lookup}': values[position]})
+            for previous, value in zip(self.ordering_fields[:position], values[:position]):
+                term &= Q(**{previous.lstrip('-'): value})
+            condition |= term
+        return condition
+
+    def _row_value(self, row, name):
+        value = getattr(row, name)
+        return value.isoformat() if hasattr(value, 'isoformat') else force_str(value)
+
+    def encode_cursor(self, row, reverse):
+        payload = {
+            'v': [self._row_value(row, field.lstrip('-')) for field in self.ordering_fields],
+            'r': int(reverse),
+        }
+        token = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+            raw_values = payload['v']
+            if len(raw_values) != len(self.ordering_fields):
+                raise ValueError
+            values = [
+                self.model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering_fields, raw_values)
+            ]
+        except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError,
+                FieldDoesNotExist, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return {'values': values, 'reverse': bool(payload.get('r'))}
+
+
+class AppointmentPagination(KeysetPagination):
+    ordering = ('date', 'time', 'id')
+
+
+class PaymentPagination(KeysetPagination):
+    ordering = ('created_at', 'id')
+
+
+class DoctorPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -0,0 +1,30 @@
+import codecs
+import csv
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+def csv_rows(handle):
+    """Rows of a CSV text stream with a header row, minus empty cells."""
+    return [
+        {key.strip(): value.strip() for key, value in row.items() if key and value not in (None, '')}
+        for row in csv.DictReader(handle)
+    ]
+
+
+class CSVParser(BaseParser):
+    """
+    Parses a CSV body with a header row into a list of dicts. Empty cells are
+    dropped so optional columns fall back to their defaults.
+    """
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            return csv_rows(codecs.getreader(encoding)(stream))
+        except (csv.Error, UnicodeDecodeError) as exc:
+            raise ParseError(f"CSV parse error - {exc}")
@@ -0,0 +1,214 @@
+import itertools
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import dashboard
+from .dashboard import day_bounds
+from .events import appointments_changed, payments_changed
+from .jobs import enqueue_many
+from .bulk import BulkImporter
+from .models import Appointment, Payment
+
+# Later states win: a replayed or late "pending" callback never undoes "paid".
+STATUS_RANK = {'pending': 0, 'failed': 1, 'paid': 2, 'refunded': 3}
+
+# Payment status -> (appointment statuses it applies to, new appointment status).
+APPOINTMENT_TRANSITIONS = {
+    'paid': (('pending',), 'confirmed'),
+    'refunded': (('pending', 'confirmed'), 'cancelled'),
+}
+
+
+# ---- EVENT INGESTION ----
+class PaymentEventSerializer(serializers.Serializer):
+    transaction_id = serializers.CharField(max_length=100)
+    appointment = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'))
+    method = serializers.ChoiceField(choices=Payment._meta.get_field('method').choices)
+    status = serializers.ChoiceField(choices=list(STATUS_RANK))
+
+
+class PaymentEventImporter(BulkImporter):
+    """
+    Upserts provider callbacks by transaction_id. Duplicates, replays and
+    out-of-order deliveries are harmless: an event ranked below the payment's
+    current status changes nothing. Linked appointments move with their
+    payment in the same transaction.
+    """
+    row_serializer_class = PaymentEventSerializer
+
+    def resolve(self, cleaned):
+        if not cleaned:
+            return
+        self.appointments = {
+            pk: (doctor_id, date)
+            for pk, doctor_id, date in Appointment.objects.filter(
+                id__in={data['appointment'] for data in cleaned.values()}
+            ).values_list('id', 'doctor_id', 'date')
+        }
+        # Payment.appointment is one-to-one: one transaction per appointment and vice versa.
+        pairs = Payment.objects.filter(
+            Q(appointment_id__in=self.appointments) | Q(transaction_id__in={data['transaction_id'] for data in cleaned.values()})
+        ).values_list('appointment_id', 'transaction_id')
+        owners, targets = {}, {}
+        for appointment_id, transaction_id in pairs:
+            owners[appointment_id], targets[transaction_id] = transaction_id, appointment_id
+        for index, data in cleaned.items():
+            appointment_id, transaction_id = data['appointment'], data['transaction_id']
+            if appointment_id not in self.appointments:
+                self.add_error(index, 'appointment', f"Unknown appointment {appointment_id}.")
+                continue
+            if targets.setdefault(transaction_id, appointment_id) != appointment_id:
+                self.add_error(index, 'appointment', f"{transaction_id} belongs to appointment {targets[transaction_id]}.")
+            elif owners.setdefault(appointment_id, transaction_id) != transaction_id:
+                self.add_error(index, 'appointment', f"Appointment {appointment_id} is already paid by {owners[appointment_id]}.")
+
+    def write(self, valid):
+        events = {}
+        for data in valid.values():
+            # Within a batch too, the highest-ranked event wins (the last on a tie).
+            current = events.get(data['transaction_id'])
+            if current is None or STATUS_RANK[data['status']] >= STATUS_RANK[current['status']]:
+                events[data['transaction_id']] = data
+
+        # A payment belongs to one appointment, so locking the appointments
+        # serializes batches that touch the same transaction_id, including
+        # two that both find it missing; whichever waits sees the other's row.
+        list(Appointment.objects.select_for_update().filter(
+            id__in={data['appointment'] for data in events.values()},
+        ).order_by('id').values_list('id', flat=True))
+        existing = {
+            transaction_id: (status, amount, method, created_at)
+            for transaction_id, status, amount, method, created_at in Payment.objects.select_for_update().filter(
+                transaction_id__in=events,
+            ).values_list('transaction_id', 'status', 'amount', 'method', 'created_at')
+        }
+
+        rows, transitions, refresh = [], {}, set()
+        counts = {'created': 0, 'updated': 0, 'unchanged': 0}
+        now = timezone.now()
+        for transaction_id, data in events.items():
+            status = data['status']
+            previous = existing.get(transaction_id)
+            if previous is not None and (
+                STATUS_RANK[previous[0]] > STATUS_RANK[status]
+                or (status, data['amount'], data['method']) == previous[:3]
+            ):
+                # Stale events don't touch amount or method either.
+                counts['unchanged'] += 1
+                continue
+            counts['updated' if previous else 'created'] += 1
+            rows.append(Payment(
+                transaction_id=transaction_id, appointment_id=data['appointment'],
+                amount=data['amount'], method=data['method'], status=status,
+            ))
+            if previous is None or status != previous[0]:
+                transitions.setdefault(status, []).append((data['appointment'], transaction_id))
+            doctor_id, date = self.appointments[data['appointment']]
+            refresh |= {(doctor_id, date), (doctor_id, timezone.localdate(previous[3] if previous else now))}
+
+        Payment.objects.bulk_create(
+            rows, batch_size=self.chunk_size, update_conflicts=True,
+            unique_fields=['transaction_id'], update_fields=['amount', 'method', 'status', 'updated_at'],
+        )
+        counts['appointments_updated'] = 0
+        for status, changed in transitions.items():
+            if status in APPOINTMENT_TRANSITIONS:
+                from_statuses, new_status = APPOINTMENT_TRANSITIONS[status]
+                counts['appointments_updated'] += Appointment.objects.filter(
+                    id__in=[appointment_id for appointment_id, _ in changed], status__in=from_statuses,
+                ).update(status=new_status, updated_at=now)
+            if status in Payment.PAID_STATUSES:
+                # Receipts; the appointment has already moved, so the job only emails.
+                enqueue_many('payment_status_changed', [{'transaction_id': tid} for _, tid in changed])
+        # bulk_create() and update() send no signals.
+        dashboard.schedule_refresh(refresh)
+        payments_changed(row.transaction_id for row in rows)
+        appointments_changed(
+            appointment_id for status, changed in transitions.items() if status in APPOINTMENT_TRANSITIONS
+            for appointment_id, _ in changed
+        )
+        return counts
+
+
+def ingest_events(events, chunk_size=500):
+    """Applies a batch of payment events; invalid events are reported and skipped."""
+    return PaymentEventImporter(events, chunk_size=chunk_size, partial=True).run()
+
+
+# ---- RECONCILIATION ----
+SETTLEMENT_COLUMNS = ('transaction_id', 'amount', 'status')
+
+
+def _settled_amount(value):
+    try:
+        return Decimal(value).quantize(Decimal('0.01'))
+    except (InvalidOperation, TypeError):
+        return None
+
+
+def reconcile(rows, chunk_size=1000, start=None, end=None):
+    """
+    Diffs settlement rows (dicts with SETTLEMENT_COLUMNS, e.g. from a
+    csv.DictReader) against the payments table one chunk at a time, so
+    memory use only grows by the transaction ids seen. Yields
+    (transaction_id, problem, settled value, our value) for every mismatch;
+    problem is 'missing', 'amount', 'status' or 'invalid'. Given the local
+    dates [start, end] the file covers, payments we hold as paid that it
+    doesn't mention follow as 'unsettled'.
+    """
+    rows = iter(rows)
+    seen = set()
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        ids = [(row.get('transaction_id') or '').strip() for row in chunk]
+        seen.update(ids)
+        ours = {
+            transaction_id: (amount, status)
+            for transaction_id, amount, status in Payment.objects.filter(
+                transaction_id__in=ids,
+            ).values_list('transaction_id', 'amount', 'status')
+        }
+        for transaction_id, row in zip(ids, chunk):
+            amount = _settled_amount(row.get('amount'))
+            status = (row.get('status') or '').strip().lower()
+            if not transaction_id or amount is None:
+                yield transaction_id, 'invalid', row.get('amount'), None
+            elif transaction_id not in ours:
+                yield transaction_id, 'missing', f'{amount}', None
+            else:
+                our_amount, our_status = ours[transaction_id]
+                if amount != our_amount:
+                    yield transaction_id, 'amount', f'{amount}', f'{our_amount}'
+                if status != our_status:
+                    yield transaction_id, 'status', status, our_status
+
+    if start is None or end is None:
+        return
+    lower, upper = day_bounds(start, end)
+    paid = Payment.objects.filter(
+        status__in=Payment.PAID_STATUSES, created_at__gte=lower, created_at__lt=upper,
+    ).order_by('id')
+    last_id = 0
+    while True:
+        chunk = list(paid.filter(id__gt=last_id).values_list('id', 'transaction_id', 'amount')[:chunk_size])
+        if not chunk:
+            return
+        last_id = chunk[-1][0]
+        for _, transaction_id, amount in chunk:
+            if transaction_id not in seen:
+                yield transaction_id, 'unsettled', None, f'{amount}'
+
+
+def paid_totals(start, end):
+    """(count, amount) of paid payments created on local dates [start, end], to check a settlement's totals."""
+    lower, upper = day_bounds(start, end)
+    totals = Payment.objects.filter(
+        status__in=Payment.PAID_STATUSES, created_at__gte=lower, created_at__lt=upper,
+    ).aggregate(count=Count('id'), amount=Sum('amount'))
+    return totals['count'], totals['amount'] or Decimal('0.00')
@@ -0,0 +1,35 @@
+import hashlib
+import hmac
+
+from django.conf import settings
+from rest_framework import permissions
+
+
+class IsDoctorOwnerOrAdmin(permissions.BasePermission):
+    """
+    Read access for any authenticated user; writes only by staff or by the
+    doctor the object belongs to (``obj.doctor``).
+    """
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated)
+
+    def has_object_permission(self, request, view, obj):
+        if request.method in permissions.SAFE_METHODS or request.user.is_staff:
+            return True
+        return obj.doctor.user_id == request.user.id
+
+
+class HasWebhookSignature(permissions.BasePermission):
+    """
+    Provider callbacks signed with PAYMENT_WEBHOOK_SECRET:
+    ``X-Signature: sha256=<hex HMAC-SHA256 of the raw body>``.
+    """
+
+    def has_permission(self, request, view):
+        secret = getattr(settings, 'PAYMENT_WEBHOOK_SECRET', '')
+        signature = request.headers.get('X-Signature', '')
+        if not secret or not signature:
+            return False
+        expected = hmac.new(secret.encode(), request.body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(signature, f'sha256={expected}')
@@ -0,0 +1,168 @@
+from collections import namedtuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework import serializers
+
+from .authentication import request_doctor_id, request_patient_id
+from .fieldsets import PlanCache, plan_key
+
+
+# ---- EAGER LOADING PLANS ----
+# A plan lists the joins and columns a serializer reads, so list endpoints
+# can fetch a whole page in one query instead of one query per nested row.
+EagerPlan = namedtuple('EagerPlan', ['select_related', 'prefetch_related', 'only'])
+
+_plan_cache = PlanCache()
+
+
+def _walk(serializer, model, prefix=''):
+    """
+    Returns (select_related, prefetch_related, only) for a ModelSerializer
+    instance. ``only`` is None when the serializer reads attributes that can't
+    be mapped to columns (properties, undeclared method fields).
+    """
+    meta = getattr(serializer, 'Meta', None)
+    eager_sources = getattr(meta, 'eager_sources', {})
+    select = list(getattr(meta, 'select_related', ()))
+    prefetch = list(getattr(meta, 'prefetch_related', ()))
+    only = set()
+    restrict = True
+
+    for field in serializer._readable_fields:
+        if field.source == '*':
+            if field.field_name in eager_sources:
+                only.update(eager_sources[field.field_name])
+            else:
+                restrict = False
+            continue
+
+        current, path = model, []
+        for position, attr in enumerate(field.source_attrs):
+            try:
+                model_field = current._meta.get_field(attr)
+            except FieldDoesNotExist:
+                restrict = False
+                break
+            path.append(attr)
+            is_last = position == len(field.source_attrs) - 1
+
+            if not model_field.is_relation:
+                only.add('__'.join(path))
+                break
+
+            if model_field.many_to_many or model_field.one_to_many:
+                child = getattr(field, 'child', None)
+                prefetch.append('__'.join(path))
+                if is_last and isinstance(child, serializers.ModelSerializer):
+                    sub_select, sub_prefetch, _ = _walk(child, model_field.related_model)
+                    prefetch.extend('__'.join(path + [p]) for p in sub_select + sub_prefetch)
+                break
+
+            # Forward FK / one-to-one, or reverse one-to-one.
+            if model_field.concrete:
+                only.add('__'.join(path))
+            if is_last and isinstance(field, serializers.ModelSerializer):
+                select.append('__'.join(path))
+                sub_select, sub_prefetch, sub_only = _walk(field, model_field.related_model)
+                select.extend('__'.join(path + [p]) for p in sub_select)
+                prefetch.extend('__'.join(path + [p]) for p in sub_prefetch)
+                if sub_only is not None:
+                    only.update('__'.join(path + [p]) for p in sub_only)
+            elif not is_last:
+                select.append('__'.join(path))
+            current = model_field.related_model
+
+    return select, prefetch, (only if restrict else None)
+
+
+def get_eager_plan(serializer):
+    key = plan_key(serializer)
+    plan = _plan_cache.get(key)
+    if plan is PlanCache.MISSING:
+        select, prefetch, only = _walk(serializer, serializer.Meta.model)
+        plan = EagerPlan(
+            tuple(dict.fromkeys(select)),
+            tuple(dict.fromkeys(prefetch)),
+            tuple(sorted(only)) if only is not None else None,
+        )
+        _plan_cache.set(key, plan)
+    return plan
+
+
+def eager_load(queryset, serializer):
+    """
+    Applies the serializer's select_related/prefetch_related/only() plan to
+    ``queryset``. Querysets for a different model are returned untouched.
+    """
+    if not isinstance(serializer, serializers.ModelSerializer):
+        return queryset
+    if queryset.model is not serializer.Meta.model:
+        return queryset
+
+    plan = get_eager_plan(serializer)
+    if plan.select_related:
+        queryset = queryset.select_related(*plan.select_related)
+    if plan.prefetch_related:
+        queryset = queryset.prefetch_related(*plan.prefetch_related)
+    if plan.only:
+        queryset = queryset.only(*plan.only)
+    return queryset
+
+
+class EagerLoadingMixin:
+    """
+    Applies the serializer's eager loading plan to list and detail querysets.
+    Hooked into ``filter_queryset`` so views that override ``get_queryset``
+    still get it.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return eager_load(queryset, self.get_serializer())
+
+
+# ---- ROW-LEVEL SCOPING ----
+PROFILE_IDS = {'patient': request_patient_id, 'doctor': request_doctor_id}
+
+
+def scope_queryset(queryset, request, scopes):
+    """
+    Filters ``queryset`` in SQL to the rows the requester may see. Staff see
+    everything; patients and doctors the rows ``scopes[role]`` reaches from
+    their profile id: a lookup (``'patient_id'``) or a callable returning a
+    Q or expression. Anyone else sees nothing. The profile id comes from
+    the token claims, so this adds no query.
+    """
+    user = request.user
+    if user.is_staff:
+        return queryset
+    role = getattr(user, 'role', None)
+    scope = scopes.get(role)
+    profile_id = PROFILE_IDS[role](request) if scope is not None else None
+    if profile_id is None:
+        return queryset.none()
+    return queryset.filter(scope(profile_id) if callable(scope) else Q(**{scope: profile_id}))
+
+
+class ScopedQuerysetMixin:
+    """Applies ``scopes`` (see scope_queryset) to the view's queryset."""
+    scopes = {}
+
+    def get_queryset(self):
+        return scope_queryset(super().get_queryset(), self.request, self.scopes)
+
+
+class ScopedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Only accepts related rows the requester may see (``scopes``, see scope_queryset)."""
+
+    def __init__(self, scopes, **kwargs):
+        self.scopes = scopes
+        super().__init__(**kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        if request is None:
+            return queryset
+        return scope_queryset(queryset, request, self.scopes)
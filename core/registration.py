@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .models import Doctor, Patient
+
+User = get_user_model()
+
+PROFILE_FIELDS = {
+    'patient': ('age', 'gender', 'phone', 'address'),
+    'doctor': ('bio', 'specialty'),
+}
+
+
+def registration_hasher():
+    """
+    Algorithm used to hash passwords at signup: REGISTRATION_PASSWORD_HASHER,
+    or 'default' for the first entry of PASSWORD_HASHERS. A cheaper hasher
+    here only affects new accounts; Django re-hashes with the preferred
+    hasher on the user's first successful login.
+    """
+    return getattr(settings, 'REGISTRATION_PASSWORD_HASHER', 'default')
+
+
+# ---- SIGNUP ----
+def register_user(*, role, username, password, email='', first_name='', last_name='', hasher=None, **profile):
+    """
+    Creates the user with its role and its Patient/Doctor profile in one
+    transaction: two INSERTs, and nothing left behind if either fails.
+    """
+    if role not in PROFILE_FIELDS:
+        raise ValueError(f"Unknown role '{role}'.")
+    unknown = set(profile) - set(PROFILE_FIELDS[role])
+    if unknown:
+        raise TypeError(f"Unexpected {role} profile fields: {', '.join(sorted(unknown))}")
+
+    user = User(
+        username=User.normalize_username(username),
+        email=User.objects.normalize_email(email),
+        first_name=first_name,
+        last_name=last_name,
+        role=role,
+        password=make_password(password, hasher=hasher or registration_hasher()),
+    )
+    # Hash before opening the transaction so the write locks are held briefly.
+    with transaction.atomic():
+        user.save(force_insert=True)
+        if role == 'patient':
+            Patient.objects.create(
+                user=user,
+                age=profile.get('age') or 0,
+                gender=profile.get('gender', ''),
+                phone=profile.get('phone', ''),
+                address=profile.get('address', ''),
+            )
+        else:
+            Doctor.objects.create(user=user, bio=profile.get('bio', ''), specialty=profile.get('specialty'))
+    return user
@@ -0,0 +1,135 @@
+import struct
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to DRF's encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional; falls back to _pack below
+    msgpack = None
+
+
+# ---- FAST JSON ----
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer backed by orjson when it's installed. Output matches DRF's
+    compact JSON byte for byte: dates, times, datetimes and anything orjson
+    doesn't know go through DRF's encoder, and U+2028/U+2029 are escaped the
+    same way. Indented (browsable API, ``; indent=``) or ASCII-only output
+    uses DRF's path.
+    """
+    option = (
+        orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if orjson else None
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.ensure_ascii or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context or {})):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=JSONEncoder().default, option=self.option)
+        except TypeError:
+            # Out-of-range ints and the like; let the stdlib decide.
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+# ---- MESSAGEPACK ----
+def _pack(value, default, out):
+    """Minimal MessagePack encoder for JSON-shaped data, used when msgpack isn't installed."""
+    if value is None:
+        out.append(b'\xc0')
+    elif value is True or value is False:
+        out.append(b'\xc3' if value else b'\xc2')
+    elif isinstance(value, int):
+        if 0 <= value < 0x80 or -0x20 <= value < 0:
+            out.append(struct.pack('b' if value < 0 else 'B', value))
+        elif value >= 0:
+            for code, fmt, limit in ((0xcc, 'B', 8), (0xcd, 'H', 16), (0xce, 'I', 32), (0xcf, 'Q', 64)):
+                if value < 1 << limit:
+                    out.append(bytes([code]) + struct.pack('>' + fmt, value))
+                    break
+            else:
+                raise OverflowError(value)
+        else:
+            for code, fmt, limit in ((0xd0, 'b', 7), (0xd1, 'h', 15), (0xd2, 'i', 31), (0xd3, 'q', 63)):
+                if value >= -(1 << limit):
+                    out.append(bytes([code]) + struct.pack('>' + fmt, value))
+                    break
+            else:
+                raise OverflowError(value)
+    elif isinstance(value, float):
+        out.append(b'\xcb' + struct.pack('>d', value))
+    elif isinstance(value, str):
+        data = value.encode()
+        size = len(data)
+        if size < 32:
+            out.append(bytes([0xa0 | size]))
+        elif size < 1 << 8:
+            out.append(b'\xd9' + struct.pack('>B', size))
+        elif size < 1 << 16:
+            out.append(b'\xda' + struct.pack('>H', size))
+        else:
+            out.append(b'\xdb' + struct.pack('>I', size))
+        out.append(data)
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        data = bytes(value)
+        size = len(data)
+        if size < 1 << 8:
+            out.append(b'\xc4' + struct.pack('>B', size))
+        elif size < 1 << 16:
+            out.append(b'\xc5' + struct.pack('>H', size))
+        else:
+            out.append(b'\xc6' + struct.pack('>I', size))
+        out.append(data)
+    elif isinstance(value, (list, tuple)):
+        _header(len(value), 0x90, b'\xdc', b'\xdd', out)
+        for item in value:
+            _pack(item, default, out)
+    elif isinstance(value, dict):
+        _header(len(value), 0x80, b'\xde', b'\xdf', out)
+        for key, item in value.items():
+            _pack(key, default, out)
+            _pack(item, default, out)
+    else:
+        _pack(default(value), default, out)
+
+
+def _header(size, fix, code16, code32, out):
+    if size < 16:
+        out.append(bytes([fix | size]))
+    elif size < 1 << 16:
+        out.append(code16 + struct.pack('>H', size))
+    else:
+        out.append(code32 + struct.pack('>I', size))
+
+
+def packb(data, default):
+    if msgpack is not None:
+        return msgpack.packb(data, use_bin_type=True, default=default)
+    out = []
+    _pack(data, default, out)
+    return b''.join(out)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    ``Accept: application/msgpack``. Same data as the JSON responses, with
+    dates, decimals and the like converted by DRF's encoder first. Uses the
+    msgpack package when installed.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return packb(data, JSONEncoder().default)
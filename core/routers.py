@@ -0,0 +1,134 @@
+import contextvars
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA_DB_ALIAS = 'replica'
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def replica_reads():
+    """Lets reads in this block go to the replica (when one is configured)."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_configured():
+    return REPLICA_DB_ALIAS in connections.settings
+
+
+# ---- ROUTER ----
+class ReplicaRouter:
+    """
+    Writes, and reads by default, go to the primary. Reads inside
+    replica_reads() go to the replica, unless they run in a transaction on
+    the primary: those must see that transaction's own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return REPLICA_DB_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from the primary.
+        return db == DEFAULT_DB_ALIAS
+
+
+# ---- READ-YOUR-WRITES ----
+def _pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+def pin_to_primary(user):
+    """Sends ``user``'s replica reads to the primary for REPLICA_PIN_SECONDS."""
+    seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 10)
+    if seconds and user is not None and user.is_authenticated:
+        cache.set(_pin_key(user.pk), True, timeout=seconds)
+
+
+def pinned_to_primary(user):
+    return user is not None and user.is_authenticated and cache.get(_pin_key(user.pk), False)
+
+
+class PrimaryPinningMiddleware:
+    """
+    Pins a user to the primary for a short window after any successful write,
+    so what they just booked or paid shows up on their next read even while
+    the replica lags. Unused without a replica.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self.wrote(request, response):
+            pin_to_primary(getattr(request, 'user', None))
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self.wrote(request, response):
+            await sync_to_async(pin_to_primary)(getattr(request, 'user', None))
+        return response
+
+    def wrote(self, request, response):
+        return request.method not in SAFE_METHODS and response.status_code < 400
+
+
+# ---- VIEWS ----
+class ReplicaReadMixin:
+    """
+    Serves safe requests from the read replica: all of them, or for viewsets
+    only the actions in ``replica_actions`` (e.g. ('list',)). With
+    ``read_your_writes`` a user pinned by PrimaryPinningMiddleware reads
+    from the primary instead.
+    """
+    replica_actions = None
+    read_your_writes = True
+
+    def uses_replica(self, request):
+        if request.method not in SAFE_METHODS or not replica_configured():
+            return False
+        if self.replica_actions is None:
+            return True
+        action = getattr(self, 'action_map', {}).get(request.method.lower())
+        return action in self.replica_actions
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.uses_replica(request):
+            return super().dispatch(request, *args, **kwargs)
+        with replica_reads():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # The user is known only now; dispatch() restores the flag afterwards.
+        if _replica_reads.get() and self.read_your_writes and pinned_to_primary(request.user):
+            _replica_reads.set(False)
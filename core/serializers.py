@@ -1,31 +1,48 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Concat, Trim
 from django.contrib.auth.password_validation import validate_password
-from .models import Doctor, Patient, Appointment, Specialist, Payment, SymptomSpecialtyMap
+from .models import (
+    Doctor, Patient, Appointment, Specialist, Payment, SymptomSpecialtyMap,
+    DoctorSchedule, ScheduleException, ArchivedAppointment, ArchivedPayment,
+)
+from .booking import book_appointment, reschedule_appointment
+from .fieldsets import SparseFieldsetMixin
+from .querysets import ScopedPrimaryKeyRelatedField
+from .registration import PROFILE_FIELDS, register_user
 
 User = get_user_model()
 
 # ✅ User Serializer with full_name
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'full_name', 'is_staff']
+        eager_sources = {'full_name': ('first_name', 'last_name')}
+        # get_full_name in SQL, for flat list responses (core.flat).
+        flat_expressions = {
+            'full_name': lambda prefix: Trim(
+                Concat(F(f'{prefix}first_name'), Value(' '), F(f'{prefix}last_name')), output_field=CharField()
+            ),
+        }
 
     def get_full_name(self, obj):
-        return f"{obj.first_name} {obj.last_name}".strip()
+        # Spaces only, like SQL TRIM() in flat_expressions.
+        return f"{obj.first_name} {obj.last_name}".strip(' ')
 
 
 # ✅ Specialist Serializer
-class SpecialistSerializer(serializers.ModelSerializer):
+class SpecialistSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Specialist
         fields = ['id', 'name', 'description']
 
 
 # ✅ Doctor Serializer
-class DoctorSerializer(serializers.ModelSerializer):
+class DoctorSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     specialty = SpecialistSerializer(read_only=True)
 
@@ -35,7 +52,7 @@ class DoctorSerializer(serializers.ModelSerializer):
 
 
 # ✅ Patient Serializer
-class PatientSerializer(serializers.ModelSerializer):
+class PatientSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
@@ -44,7 +61,7 @@ class PatientSerializer(serializers.ModelSerializer):
 
 
 # ✅ Appointment Serializer
-class AppointmentSerializer(serializers.ModelSerializer):
+class AppointmentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     doctor = serializers.PrimaryKeyRelatedField(queryset=Doctor.objects.all(), write_only=True)
     doctor_detail = DoctorSerializer(source='doctor', read_only=True)
     patient_detail = PatientSerializer(source='patient', read_only=True)
@@ -52,24 +69,68 @@ class AppointmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Appointment
         fields = ['id', 'doctor', 'doctor_detail', 'patient_detail', 'date', 'time', 'status', 'notes']
+        # Slot uniqueness is enforced by the booking service (409 Conflict)
+        # rather than a racy pre-check here.
+        validators = []
 
     def create(self, validated_data):
         validated_data.pop('user', None)  # Just in case
-        return super().create(validated_data)
+        return book_appointment(**validated_data)
+
+    def update(self, instance, validated_data):
+        return reschedule_appointment(instance, **validated_data)
 
 
 # ✅ Payment Serializer
-class PaymentSerializer(serializers.ModelSerializer):
-    appointment = serializers.PrimaryKeyRelatedField(queryset=Appointment.objects.all(), write_only=True)
+class PaymentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # Patients and doctors can only pay for their own appointments.
+    appointment = ScopedPrimaryKeyRelatedField(
+        {'patient': 'patient_id', 'doctor': 'doctor_id'}, queryset=Appointment.objects.all(), write_only=True,
+    )
     appointment_detail = AppointmentSerializer(source='appointment', read_only=True)
 
     class Meta:
         model = Payment
         fields = ['id', 'appointment', 'appointment_detail', 'amount', 'method', 'transaction_id', 'status', 'created_at']
 
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        # Only staff (and provider callbacks) settle payments.
+        if 'status' in fields and request is not None and not request.user.is_staff:
+            fields['status'].read_only = True
+        return fields
+
+
+# ✅ Archive Serializers (read-only; same shape as the live ones)
+class ArchivedAppointmentSerializer(AppointmentSerializer):
+    class Meta(AppointmentSerializer.Meta):
+        model = ArchivedAppointment
+
+
+class ArchivedPaymentSerializer(PaymentSerializer):
+    appointment = serializers.PrimaryKeyRelatedField(queryset=ArchivedAppointment.objects.all(), write_only=True)
+    appointment_detail = ArchivedAppointmentSerializer(source='appointment', read_only=True)
+
+    class Meta(PaymentSerializer.Meta):
+        model = ArchivedPayment
+
+
+# ✅ Schedule Serializers
+class DoctorScheduleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = DoctorSchedule
+        fields = ['id', 'doctor', 'weekday', 'start_time', 'end_time', 'slot_minutes']
+
+
+class ScheduleExceptionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = ScheduleException
+        fields = ['id', 'doctor', 'date', 'start_time', 'end_time', 'is_available', 'slot_minutes', 'reason']
+
 
 # ✅ Symptom Match Serializer
-class SymptomSpecialtyMapSerializer(serializers.ModelSerializer):
+class SymptomSpecialtyMapSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = SymptomSpecialtyMap
         fields = ['id', 'symptom', 'specialty']
@@ -112,25 +173,11 @@ class RegisterSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         validated_data.pop('password2')
-        is_patient = validated_data.pop('is_patient', False)
-        is_doctor = validated_data.pop('is_doctor', False)
-
-        age = validated_data.pop('age', None)
-        gender = validated_data.pop('gender', '')
-        phone = validated_data.pop('phone', '')
-        address = validated_data.pop('address', '')
-
-        bio = validated_data.pop('bio', '')
-        specialty = validated_data.pop('specialty', None)
-
-        user = User.objects.create_user(**validated_data)
-        user.is_patient = is_patient
-        user.is_doctor = is_doctor
-        user.save()
-
-        if is_patient:
-            Patient.objects.create(user=user, age=age or 0, gender=gender, phone=phone, address=address)
-        elif is_doctor:
-            Doctor.objects.create(user=user, bio=bio, specialty=specialty)
-
-        return user
+        validated_data.pop('is_doctor', None)
+        role = 'patient' if validated_data.pop('is_patient', False) else 'doctor'
+
+        # Drop the other role's profile fields.
+        for fields in PROFILE_FIELDS.values():
+            for field in set(fields) - set(PROFILE_FIELDS[role]):
+                validated_data.pop(field, None)
+        return register_user(role=role, **validated_data)
@@ -0,0 +1,187 @@
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import cache, dashboard, events, matching, sync
+from .archive import is_archiving
+from .models import CustomUser, Specialist, Doctor, Patient, SymptomSpecialtyMap, Appointment, Payment
+
+
+def _invalidate_matcher():
+    # Again after commit, in case another request rebuilt from pre-commit data.
+    matching.invalidate()
+    transaction.on_commit(matching.invalidate)
+
+
+def _only_touches(update_fields, fields):
+    return update_fields is not None and set(update_fields) <= set(fields)
+
+
+# ---- SYMPTOM MATCHER INVALIDATION ----
+@receiver([post_save, post_delete], sender=SymptomSpecialtyMap)
+@receiver([post_save, post_delete], sender=Specialist)
+@receiver([post_save, post_delete], sender=Doctor)
+def invalidate_symptom_matcher(sender, **kwargs):
+    _invalidate_matcher()
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_symptom_matcher_on_rename(sender, created=False, update_fields=None, **kwargs):
+    # Logins save last_login only; doctor names can't have changed. A new
+    # user isn't anyone's doctor yet, so signups don't count either.
+    if not created and not _only_touches(update_fields, ['last_login']):
+        _invalidate_matcher()
+
+
+# ---- RESPONSE CACHE INVALIDATION ----
+def _bump(group):
+    cache.bump(group)
+    transaction.on_commit(lambda: cache.bump(group))
+
+
+@receiver([post_save, post_delete], sender=Doctor)
+def invalidate_doctor_responses(sender, **kwargs):
+    _bump('doctor')
+
+
+@receiver([post_save, post_delete], sender=Specialist)
+def invalidate_specialist_responses(sender, **kwargs):
+    _bump('specialist')
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def invalidate_user_responses(sender, created=False, update_fields=None, **kwargs):
+    if not created and not _only_touches(update_fields, ['last_login']):
+        _bump('user')
+
+
+# ---- DETAIL VALIDATORS ----
+@receiver(post_save, sender=CustomUser)
+def touch_profiles_on_user_change(sender, instance, created=False, update_fields=None, **kwargs):
+    # Doctor and patient responses embed the user, which has no updated_at
+    # of its own; their Last-Modified/ETag must still move.
+    if not created and not _only_touches(update_fields, ['last_login']):
+        now = timezone.now()
+        Doctor.objects.filter(user_id=instance.pk).update(updated_at=now)
+        Patient.objects.filter(user_id=instance.pk).update(updated_at=now)
+
+
+# ---- APPOINTMENT SNAPSHOT ----
+# An appointment's columns as loaded (None while unsaved), which the stats,
+# sync and event handlers below diff against. One post_init hook for all of
+# them: it runs for every row a list loads. Reads __dict__ so deferred
+# fields aren't loaded.
+LoadedAppointment = namedtuple('LoadedAppointment', ['doctor_id', 'patient_id', 'date', 'time', 'status'])
+
+
+def _snapshot(instance):
+    if instance.pk is None:
+        return None
+    return LoadedAppointment(*(instance.__dict__.get(field) for field in LoadedAppointment._fields))
+
+
+@receiver(post_init, sender=Appointment)
+def remember_appointment_state(sender, instance, **kwargs):
+    instance._loaded = _snapshot(instance)
+
+
+# ---- DOCTOR DAILY STATS ROLLUP ----
+@receiver([post_save, post_delete], sender=Appointment)
+def refresh_appointment_stats(sender, instance, **kwargs):
+    if is_archiving():
+        return
+    # A reschedule changes the day; both the old and the new one need refreshing.
+    keys = {(instance.doctor_id, instance.date)}
+    if instance._loaded is not None:
+        keys.add((instance._loaded.doctor_id, instance._loaded.date))
+    dashboard.schedule_refresh(keys)
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def refresh_payment_stats(sender, instance, **kwargs):
+    if is_archiving() or not dashboard.rollup_enabled():
+        return
+    doctor_id = Appointment.objects.filter(pk=instance.appointment_id).values_list('doctor_id', flat=True).first()
+    dashboard.schedule_refresh({(doctor_id, timezone.localdate(instance.created_at))})
+
+
+# ---- DELTA SYNC TOMBSTONES ----
+@receiver(post_delete, sender=Specialist)
+def record_specialist_deletion(sender, instance, **kwargs):
+    sync.record_deletion('specialists', instance.pk)
+
+
+@receiver(post_delete, sender=Doctor)
+def record_doctor_deletion(sender, instance, **kwargs):
+    sync.record_deletion('doctors', instance.pk, doctor_id=instance.pk)
+
+
+@receiver(post_delete, sender=Patient)
+def record_patient_deletion(sender, instance, **kwargs):
+    sync.record_deletion('patients', instance.pk, patient_id=instance.pk)
+
+
+@receiver(post_delete, sender=Appointment)
+def record_appointment_deletion(sender, instance, **kwargs):
+    if is_archiving():
+        return
+    sync.record_deletion('appointments', instance.pk, patient_id=instance.patient_id, doctor_id=instance.doctor_id)
+
+
+@receiver(post_delete, sender=Payment)
+def record_payment_deletion(sender, instance, **kwargs):
+    if is_archiving():
+        return
+    # Deleted before its appointment when that cascades, so the row is still there.
+    owners = Appointment.objects.filter(pk=instance.appointment_id).values_list('patient_id', 'doctor_id').first()
+    sync.record_deletion('payments', instance.pk, *(owners or ()))
+
+
+@receiver(post_save, sender=Appointment)
+def touch_patient_on_new_pair(sender, instance, **kwargs):
+    # A first appointment lets the doctor see this patient
+    # (PatientViewSet.scopes), whose row may predate the doctor's sync
+    # cursor; move it past the cursor.
+    loaded = instance._loaded
+    if loaded is not None and (loaded.doctor_id, loaded.patient_id) == (instance.doctor_id, instance.patient_id):
+        return
+    if instance.patient_id is not None and not Appointment.objects.filter(
+        doctor_id=instance.doctor_id, patient_id=instance.patient_id,
+    ).exclude(pk=instance.pk).exists():
+        Patient.objects.filter(pk=instance.patient_id).update(updated_at=timezone.now())
+
+
+# ---- REAL-TIME EVENTS ----
+@receiver(post_save, sender=Appointment)
+def publish_appointment_saved(sender, instance, created=False, **kwargs):
+    loaded = instance._loaded
+    events.appointment_saved(instance, created, loaded and (loaded.date, loaded.time, loaded.status))
+
+
+@receiver(post_delete, sender=Appointment)
+def publish_appointment_deleted(sender, instance, **kwargs):
+    if is_archiving():
+        return
+    events.appointment_deleted(instance)
+
+
+@receiver(post_init, sender=Payment)
+def remember_payment_status(sender, instance, **kwargs):
+    instance._event_status = instance.__dict__.get('status') if instance.pk else None
+
+
+@receiver(post_save, sender=Payment)
+def publish_payment_status(sender, instance, created=False, **kwargs):
+    if created or instance.status != instance._event_status:
+        events.payments_changed([instance.transaction_id])
+    instance._event_status = instance.status
+
+
+# Registered last, so every Appointment post_save handler above sees the
+# state from before this save; the next save diffs against this one.
+@receiver(post_save, sender=Appointment)
+def update_appointment_state(sender, instance, **kwargs):
+    instance._loaded = _snapshot(instance)
@@ -0,0 +1,55 @@
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# ---- STREAMING JSON LISTS ----
+def iter_json_array(queryset, serializer, chunk_size=500):
+    """
+    Serializes ``queryset`` row by row from a server-side cursor and yields a
+    JSON array in chunks of ``chunk_size`` rows, so memory use stays flat
+    however large the table is. ``serializer`` can also be a flat plan.
+    """
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    yield b'['
+    separator = b''
+    buffer = []
+    for instance in queryset.iterator(chunk_size=chunk_size):
+        buffer.append(encoder.encode(serializer.to_representation(instance)))
+        if len(buffer) >= chunk_size:
+            yield separator + ','.join(buffer).encode('utf-8')
+            separator, buffer = b',', []
+    if buffer:
+        yield separator + ','.join(buffer).encode('utf-8')
+    yield b']'
+
+
+class StreamingListMixin:
+    """
+    Opt-in streaming for list endpoints: ``?stream=true`` returns the whole
+    (filtered) collection as a chunked JSON array instead of a page.
+    """
+    stream_query_param = 'stream'
+    stream_chunk_size = 500
+
+    def wants_stream(self, request):
+        return request.query_params.get(self.stream_query_param, '').lower() in ('1', 'true', 'yes')
+
+    def get_stream_ordering(self):
+        paginator = self.paginator
+        if paginator is not None and hasattr(paginator, 'get_ordering'):
+            return paginator.get_ordering(self)
+        return ('pk',)
+
+    def list(self, request, *args, **kwargs):
+        if not self.wants_stream(request):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).order_by(*self.get_stream_ordering())
+        serializer = self.get_serializer()
+        plan = self.get_flat_plan() if hasattr(self, 'get_flat_plan') else None
+        if plan is not None:
+            queryset, serializer = plan.apply(queryset), plan
+        return StreamingHttpResponse(
+            iter_json_array(queryset, serializer, self.stream_chunk_size),
+            content_type='application/json',
+        )
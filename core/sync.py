@@ -0,0 +1,174 @@
+import base64
+import binascii
+import datetime
+import json
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .flat import get_flat_plan
+from .models import Tombstone
+from .querysets import eager_load, scope_queryset
+
+SINCE_PARAM = 'since'
+
+# One synced collection: its serializer, its row scopes (see
+# scope_queryset; None for the public catalog) and what it embeds (an
+# ?expand= value, see core.fieldsets; nested rows of other types go out as
+# ids, since they have their own change streams).
+SyncType = namedtuple('SyncType', ['serializer_class', 'scopes', 'expand'], defaults=[None, ''])
+
+
+# ---- DELTA SYNC ----
+# A sync token holds one keyset cursor, (updated_at, id), per type and one
+# for tombstones. Each sync returns the rows past the cursors in that order
+# via the (updated_at, id) indexes, so steady-state cost follows the number
+# of changes, not the size of the tables.
+#
+# Timestamps are taken at save time but rows only become visible at commit,
+# so a slow transaction can commit a row older than a cursor already handed
+# out. Rows newer than SYNC_SETTLE_SECONDS are therefore left for the next
+# sync. Tokens older than SYNC_TOMBSTONE_DAYS (how long tombstones are
+# kept, see prune_tombstones) get a full resync with ``reset: true``.
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def encode_token(cursors, issued_at):
+    payload = {
+        'c': {name: [stamp.isoformat(), pk] for name, (stamp, pk) in cursors.items()},
+        't': issued_at.isoformat(),
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+
+
+def decode_token(token):
+    """({name: (updated_at, id)}, issued_at) from a sync token."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+        cursors = {}
+        for name, (stamp, pk) in payload['c'].items():
+            cursors[name] = (_parse_stamp(stamp), int(pk))
+        return cursors, _parse_stamp(payload['t'])
+    except (binascii.Error, UnicodeDecodeError, ValueError, KeyError, TypeError, AttributeError):
+        raise ValidationError({SINCE_PARAM: 'Invalid sync token.'})
+
+
+def _parse_stamp(value):
+    stamp = parse_datetime(value)
+    if stamp is None or timezone.is_naive(stamp):
+        raise ValueError(value)
+    return stamp
+
+
+def changed_since(queryset, cursor, horizon, field='updated_at'):
+    """Rows with (``field``, id) past ``cursor`` and ``field`` up to ``horizon``, in that order."""
+    queryset = queryset.filter(**{f'{field}__lte': horizon})
+    if cursor is not None:
+        stamp, pk = cursor
+        # The range condition alone lets the database seek; the OR trims ties.
+        queryset = queryset.filter(**{f'{field}__gte': stamp}).filter(
+            Q(**{f'{field}__gt': stamp}) | Q(pk__gt=pk)
+        )
+    return queryset.order_by(field, 'pk')
+
+
+def _changes(sync_type, request, cursor, horizon, limit):
+    """(representations, new cursor, more) for one type."""
+    serializer = sync_type.serializer_class(expand=sync_type.expand)
+    model = serializer.Meta.model
+    queryset = model.objects.all()
+    if sync_type.scopes is not None:
+        queryset = scope_queryset(queryset, request, sync_type.scopes)
+    queryset = changed_since(queryset, cursor, horizon)
+
+    plan = get_flat_plan(serializer)
+    if plan is not None:
+        rows = list(plan.apply(queryset, ['updated_at', 'id'])[:limit + 1])
+        represent = plan.to_representation
+    else:
+        rows = list(eager_load(queryset, serializer)[:limit + 1])
+        represent = serializer.to_representation
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        cursor = (rows[-1].updated_at, rows[-1].id)
+    return [represent(row) for row in rows], cursor, more
+
+
+def _tombstones(sync_types, request):
+    public = [name for name, sync_type in sync_types.items() if sync_type.scopes is None]
+    private = [name for name in sync_types if name not in public]
+    queryset = Tombstone.objects.filter(kind__in=public)
+    if private:
+        queryset = queryset | scope_queryset(
+            Tombstone.objects.filter(kind__in=private), request,
+            {'patient': 'patient_id', 'doctor': 'doctor_id'},
+        )
+    return queryset
+
+
+def sync_changes(request, sync_types, token=None, limit=None):
+    """
+    The rows of every type in ``sync_types`` ({name: SyncType}) created,
+    changed or deleted since ``token`` (everything when None), at most
+    ``limit`` per type. Returns the response body: ``changes`` and
+    ``deleted`` (ids) per type, the next ``token``, ``more`` when any type
+    was cut off, and ``reset`` when the client must drop its copy first.
+    """
+    now = timezone.now()
+    limit = limit or _setting('SYNC_PAGE_SIZE', 500)
+    horizon = now - datetime.timedelta(seconds=_setting('SYNC_SETTLE_SECONDS', 2))
+
+    cursors, issued_at = decode_token(token) if token else ({}, now)
+    reset = False
+    if token and issued_at < now - datetime.timedelta(days=_setting('SYNC_TOMBSTONE_DAYS', 30)):
+        # Deletions since then may have been pruned.
+        cursors, issued_at, reset = {}, now, True
+
+    body = {'changes': {}, 'deleted': {name: [] for name in sync_types}}
+    more = False
+    for name, sync_type in sync_types.items():
+        rows, cursor, cut = _changes(sync_type, request, cursors.get(name), horizon, limit)
+        body['changes'][name] = rows
+        if cursor is not None:
+            cursors[name] = cursor
+        more |= cut
+
+    if token and not reset:
+        tombstones = list(changed_since(
+            _tombstones(sync_types, request), cursors.get('deleted'), horizon, field='deleted_at',
+        ).values_list('kind', 'object_id', 'deleted_at', 'id')[:limit + 1])
+        more |= len(tombstones) > limit
+        tombstones = tombstones[:limit]
+        for kind, object_id, _, _ in tombstones:
+            body['deleted'][kind].append(object_id)
+        if tombstones:
+            cursors['deleted'] = tombstones[-1][2:]
+    else:
+        # A full download has nothing to delete; later syncs start here.
+        cursors['deleted'] = (horizon, 0)
+
+    # A new token only restarts the retention clock once the client has caught up.
+    body['token'] = encode_token(cursors, issued_at if more else now)
+    body['more'] = more
+    body['reset'] = reset
+    return body
+
+
+# ---- RETENTION ----
+def record_deletion(kind, object_id, patient_id=None, doctor_id=None):
+    Tombstone.objects.create(kind=kind, object_id=object_id, patient_id=patient_id, doctor_id=doctor_id)
+
+
+def prune_tombstones(days=None, now=None):
+    """Deletes tombstones older than ``days`` (SYNC_TOMBSTONE_DAYS). Returns the count."""
+    days = days if days is not None else _setting('SYNC_TOMBSTONE_DAYS', 30)
+    cutoff = (now or timezone.now()) - datetime.timedelta(days=days)
+    deleted, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,112 @@
+import datetime
+
+from django.conf import settings
+from django.core.mail import send_mail, send_mass_mail
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import dashboard, events
+from .jobs import enqueue_many, task
+from .models import Appointment, Payment
+from .payments import APPOINTMENT_TRANSITIONS
+
+
+def _describe(appointment):
+    return f"Dr. {appointment.doctor.user.get_full_name()} on {appointment.date:%A %d %B %Y} at {appointment.time:%H:%M}"
+
+
+# ---- NOTIFICATIONS ----
+@task('booking_confirmation')
+def booking_confirmation(appointment_id):
+    appointment = Appointment.objects.select_related('doctor__user', 'patient__user').filter(pk=appointment_id).first()
+    if appointment is None or appointment.patient is None or not appointment.patient.user.email:
+        return
+    send_mail(
+        'Your appointment is booked',
+        f"Hello {appointment.patient.user.first_name},\n\nYour appointment with {_describe(appointment)} is booked.",
+        None, [appointment.patient.user.email],
+    )
+
+
+@task('payment_status_changed')
+def payment_status_changed(transaction_id):
+    """Moves the appointment along with its payment (idempotent) and emails a receipt once paid."""
+    payment = Payment.objects.select_related(
+        'appointment__doctor__user', 'appointment__patient__user',
+    ).filter(transaction_id=transaction_id).first()
+    if payment is None:
+        return
+    appointment = payment.appointment
+    if payment.status in APPOINTMENT_TRANSITIONS:
+        from_statuses, new_status = APPOINTMENT_TRANSITIONS[payment.status]
+        if Appointment.objects.filter(pk=appointment.pk, status__in=from_statuses).update(status=new_status, updated_at=timezone.now()):
+            dashboard.schedule_refresh({(appointment.doctor_id, appointment.date)})
+            events.appointments_changed([appointment.pk])
+    patient = appointment.patient
+    if payment.status in Payment.PAID_STATUSES and patient is not None and patient.user.email:
+        send_mail(
+            'Payment received',
+            f"We received {payment.amount} ({payment.get_method_display()}, ref {payment.transaction_id}) "
+            f"for your appointment with {_describe(appointment)}.",
+            None, [patient.user.email],
+        )
+
+
+@task('appointment_reminder', batched=True)
+def appointment_reminders(payloads):
+    """Sends all claimed reminders over one mail connection."""
+    appointments = Appointment.objects.filter(
+        pk__in=[payload['appointment_id'] for payload in payloads],
+    ).exclude(status__in=Appointment.INACTIVE_STATUSES).select_related('doctor__user', 'patient__user')
+    send_mass_mail([
+        (
+            'Appointment reminder',
+            f"Hello {appointment.patient.user.first_name},\n\nA reminder of your appointment with {_describe(appointment)}.",
+            None, [appointment.patient.user.email],
+        )
+        for appointment in appointments
+        if appointment.patient is not None and appointment.patient.user.email
+    ])
+
+
+# ---- STATS ROLLUP ----
+@task('doctor_stats_refresh', batched=True)
+def doctor_stats_refresh(payloads):
+    """Recomputes DoctorDailyStats for every claimed (doctor, date), in one pass."""
+    dashboard.refresh_daily_stats({
+        (payload['doctor_id'], datetime.date.fromisoformat(payload['date'])) for payload in payloads
+    })
+
+
+# ---- REMINDER SWEEP ----
+def upcoming_appointments(now, window):
+    """Active, not yet reminded appointments starting in [now, now + window] (local time)."""
+    now = timezone.localtime(now)
+    cutoff = now + window
+    return Appointment.objects.filter(
+        reminder_sent_at__isnull=True, date__range=(now.date(), cutoff.date()),
+    ).filter(
+        Q(date__gt=now.date()) | Q(time__gte=now.time()),
+        Q(date__lt=cutoff.date()) | Q(time__lte=cutoff.time()),
+    ).exclude(status__in=Appointment.INACTIVE_STATUSES)
+
+
+def sweep_reminders(window=None, batch_size=500, now=None):
+    """
+    Queues a reminder job for every appointment due one, ``batch_size`` at a
+    time. Each batch is marked reminded in the same transaction that queues
+    its jobs, so overlapping sweeps never remind twice. Returns the count.
+    """
+    now = now or timezone.now()
+    window = window or datetime.timedelta(hours=getattr(settings, 'REMINDER_WINDOW_HOURS', 24))
+    upcoming = upcoming_appointments(now, window).order_by('date', 'time', 'id')
+    queued = 0
+    while True:
+        with transaction.atomic():
+            ids = list(upcoming.select_for_update(skip_locked=True).values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return queued
+            Appointment.objects.filter(id__in=ids).update(reminder_sent_at=now)
+            enqueue_many('appointment_reminder', [{'appointment_id': pk} for pk in ids])
+        queued += len(ids)
@@ -1,3 +1,1758 @@
-from django.test import TestCase
+import asyncio
+import datetime
+from decimal import Decimal
 
-# Create your tests here.
+import csv
+import gzip
+import hashlib
+import hmac
+import io
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, IntegrityError, OperationalError
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework import serializers as drf_serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import availability, compression, matching
+from .cache import metrics as cache_metrics
+from .booking import book_appointment, reschedule_appointment, SlotUnavailable
+from .registration import register_user
+from .authentication import user_claims
+from .benchmarks.data import generate
+from .instrumentation import PerformanceMiddleware, registry as perf_registry
+from .serializers import AppointmentSerializer, DoctorSerializer, PaymentSerializer
+from .flat import get_flat_plan
+from .dashboard import rebuild_daily_stats
+from .benchmarks.payments import provider_events, settlement_rows
+from . import jobs
+from .tasks import sweep_reminders
+from .payments import ingest_events, reconcile
+from .sync import prune_tombstones
+from .archive import archive_appointments
+from .events import get_broker, patient_topic, slots_topic
+from .renderers import FastJSONRenderer, MessagePackRenderer, packb
+from .routers import REPLICA_DB_ALIAS, ReplicaRouter, replica_reads
+from .benchmarks.http import bearer
+from .views import AppointmentViewSet, SpecialistViewSet
+from .benchmarks.endpoints import measure_endpoint
+from .benchmarks.stats import percentile
+from .benchmarks.plans import hot_queries
+from .benchmarks.suite import compare
+from .models import (
+    CustomUser, Specialist, Doctor, Patient, Appointment, Payment, SymptomSpecialtyMap,
+    DoctorSchedule, ScheduleException, DoctorDailyStats, Job, Tombstone,
+    ArchivedAppointment, ArchivedPayment,
+)
+
+
+# ---- TEST DATA HELPERS ----
+def make_specialist(name='Cardiology'):
+    return Specialist.objects.create(name=name, description=f"{name} clinic")
+
+
+def make_doctor(username, specialty=None):
+    user = CustomUser.objects.create_user(
+        username=username, first_name='Doc', last_name=username, role='doctor'
+    )
+    return Doctor.objects.create(user=user, specialty=specialty, bio=f"Bio of {username}")
+
+
+def make_patient(username):
+    user = CustomUser.objects.create_user(
+        username=username, first_name='Pat', last_name=username, role='patient'
+    )
+    return Patient.objects.create(user=user, age=30, gender='F', phone='0700000000', address='Nairobi')
+
+
+def make_appointment(doctor, patient, days=0, hour=9, status='pending'):
+    return Appointment.objects.create(
+        doctor=doctor,
+        patient=patient,
+        date=datetime.date(2025, 1, 1) + datetime.timedelta(days=days),
+        time=datetime.time(hour, 0),
+        status=status,
+    )
+
+
+def make_payment(appointment, transaction_id, status='pending'):
+    return Payment.objects.create(
+        appointment=appointment, amount=Decimal('1500.00'), method='mpesa',
+        transaction_id=transaction_id, status=status,
+    )
+
+
+@contextmanager
+def sqlite_replica():
+    """
+    Routes replica reads to a second, empty SQLite database. Nothing is
+    copied into it, so it behaves like a replica that is far behind.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        connections.settings[REPLICA_DB_ALIAS] = {
+            **connections['default'].settings_dict, 'NAME': os.path.join(directory, 'replica.sqlite3'),
+        }
+        try:
+            call_command('migrate', database=REPLICA_DB_ALIAS, verbosity=0)
+            with override_settings(DATABASE_ROUTERS=['core.routers.ReplicaRouter']):
+                yield
+        finally:
+            connections[REPLICA_DB_ALIAS].close()
+            del connections[REPLICA_DB_ALIAS]
+            del connections.settings[REPLICA_DB_ALIAS]
+
+
+# ---- QUERY COUNT HARNESS ----
+class ConstantQueryCountMixin:
+    """
+    Asserts that an endpoint issues the same number of queries no matter how
+    many rows it returns, i.e. that nested serializers don't fan out per row.
+    """
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(ctx.captured_queries), response
+
+    def assertConstantQueries(self, url, add_rows, small=1, large=25):
+        add_rows(small)
+        small_count, _ = self.count_queries(url)
+        add_rows(large - small)
+        large_count, response = self.count_queries(url)
+        self.assertEqual(
+            small_count, large_count,
+            f"{url} issued {small_count} queries for {small} rows but {large_count} for {large}",
+        )
+        return response
+
+
+class ListQueryCountTests(ConstantQueryCountMixin, APITestCase):
+    def setUp(self):
+        self.specialty = make_specialist()
+        self.patient = make_patient('patient0')
+        self.client.force_authenticate(self.patient.user)
+        self.counter = 0
+
+    def add_appointments(self, count):
+        for _ in range(count):
+            self.counter += 1
+            doctor = make_doctor(f"doc{self.counter}", self.specialty)
+            appointment = make_appointment(doctor, self.patient, days=self.counter)
+            make_payment(appointment, f"TX{self.counter}")
+
+    def test_appointment_list(self):
+        self.assertConstantQueries('/api/appointments/', self.add_appointments)
+
+    def test_my_appointments(self):
+        self.assertConstantQueries('/api/appointments/my/', self.add_appointments)
+
+    def test_payment_list(self):
+        response = self.assertConstantQueries('/api/payments/', self.add_appointments)
+        first = response.json()['results'][0]
+        self.assertEqual(first['appointment_detail']['doctor_detail']['specialty']['name'], 'Cardiology')
+        self.assertEqual(first['appointment_detail']['patient_detail']['user']['full_name'], 'Pat patient0')
+
+    def test_doctor_list(self):
+        self.assertConstantQueries('/api/doctors/', self.add_appointments)
+
+    def test_patient_list(self):
+        # Patients only see themselves; staff see every row.
+        self.client.force_authenticate(CustomUser.objects.create_user(username='admin', is_staff=True))
+
+        def add_patients(count):
+            for _ in range(count):
+                self.counter += 1
+                make_patient(f"extra{self.counter}")
+
+        self.assertConstantQueries('/api/patients/', add_patients)
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.patient = make_patient('patient0')
+        self.client.force_authenticate(self.patient.user)
+        doctors = [make_doctor('doc0'), make_doctor('doc1')]
+        # Pairs of appointments share (date, time) so the id tie-breaker matters.
+        self.appointments = [
+            make_appointment(doctors[index % 2], self.patient, days=index // 4, hour=9 + (index // 2) % 2)
+            for index in range(7)
+        ]
+        self.expected = [
+            a.id for a in sorted(self.appointments, key=lambda a: (a.date, a.time, a.id))
+        ]
+
+    def walk(self, url, link):
+        ids, pages = [], 0
+        while url:
+            body = self.client.get(url).json()
+            ids.extend(row['id'] for row in body['results'])
+            url, pages = body[link], pages + 1
+        return ids, pages
+
+    def test_forward_pages_follow_keyset_order(self):
+        ids, pages = self.walk('/api/appointments/?page_size=3', 'next')
+        self.assertEqual(ids, self.expected)
+        self.assertEqual(pages, 3)
+
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get('/api/appointments/?page_size=3').json()
+        second = self.client.get(first['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(back['previous'])
+
+    def test_invalid_cursor_is_404(self):
+        response = self.client.get('/api/appointments/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+    def test_payments_paginate_on_created_at(self):
+        for index, appointment in enumerate(self.appointments):
+            make_payment(appointment, f"TX{index}")
+        body = self.client.get('/api/payments/?page_size=5').json()
+        self.assertEqual(len(body['results']), 5)
+        self.assertIsNotNone(body['next'])
+
+    def test_stream_returns_every_row(self):
+        response = self.client.get('/api/appointments/?stream=true')
+        self.assertTrue(response.streaming)
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['id'] for row in rows], self.expected)
+        self.assertEqual(rows[0]['doctor_detail']['user']['username'], 'doc0')
+
+
+class SymptomMatcherTests(APITestCase):
+    def setUp(self):
+        matching.invalidate()
+        self.neuro = make_specialist('Neurology')
+        self.cardio = make_specialist('Cardiology')
+        self.gp = make_specialist('General Practice')
+        for symptom, specialty in [
+            ('headache', self.neuro), ('dizziness', self.neuro), ('numbness', self.neuro),
+            ('chest pain', self.cardio), ('palpitations', self.cardio), ('dizziness', self.cardio),
+            ('fever', self.gp), ('headache', self.gp),
+        ]:
+            SymptomSpecialtyMap.objects.create(symptom=symptom, specialty=specialty)
+        self.doctor = make_doctor('neuro1', self.neuro)
+
+    def ranked_names(self, *symptoms):
+        return [r['specialty']['name'] for r in matching.get_matcher().match(symptoms)]
+
+    def test_multi_symptom_ranking(self):
+        self.assertEqual(self.ranked_names('headache', 'numbness')[0], 'Neurology')
+        self.assertEqual(self.ranked_names('chest pain', 'dizziness')[0], 'Cardiology')
+
+    def test_fuzzy_and_partial_matches(self):
+        self.assertIn('Neurology', self.ranked_names('hedache'))
+        self.assertIn('Cardiology', self.ranked_names('palpitation'))
+        self.assertIn('Cardiology', self.ranked_names('chest'))
+        self.assertEqual(self.ranked_names('zzzz'), [])
+
+    def test_endpoint_answers_from_memory(self):
+        self.client.get('/api/symptom-match/?symptom=headache')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/symptom-match/?symptoms=headache,numbness')
+        self.assertEqual(response.status_code, 200)
+        top = response.json()[0]
+        self.assertEqual(top['specialty']['name'], 'Neurology')
+        self.assertEqual(top['doctors'], [{'id': self.doctor.id, 'full_name': 'Doc neuro1'}])
+
+    def test_no_match_is_404(self):
+        self.assertEqual(self.client.get('/api/symptom-match/?symptom=zzzz').status_code, 404)
+        self.assertEqual(self.client.get('/api/symptom-match/').status_code, 404)
+
+    def test_signals_invalidate_index(self):
+        self.assertNotIn('Dermatology', self.ranked_names('rash'))
+        SymptomSpecialtyMap.objects.create(symptom='skin rash', specialty=make_specialist('Dermatology'))
+        self.assertIn('Dermatology', self.ranked_names('rash'))
+
+
+class AvailabilityTests(APITestCase):
+    # 2030-01-07 is a Monday.
+    monday = datetime.date(2030, 1, 7)
+
+    def setUp(self):
+        self.specialty = make_specialist()
+        self.doctor = make_doctor('doc0', self.specialty)
+        self.other = make_doctor('doc1', self.specialty)
+        for doctor in (self.doctor, self.other):
+            DoctorSchedule.objects.create(
+                doctor=doctor, weekday=0, start_time=datetime.time(9), end_time=datetime.time(11), slot_minutes=30
+            )
+        self.patient = make_patient('patient0')
+
+    def test_weekly_schedule_minus_bookings_and_exceptions(self):
+        Appointment.objects.create(doctor=self.doctor, patient=self.patient, date=self.monday, time=datetime.time(9))
+        Appointment.objects.create(
+            doctor=self.doctor, patient=self.patient, date=self.monday, time=datetime.time(10), status='cancelled'
+        )
+        ScheduleException.objects.create(
+            doctor=self.doctor, date=self.monday, start_time=datetime.time(10, 30), end_time=datetime.time(11)
+        )
+        ScheduleException.objects.create(doctor=self.doctor, date=self.monday + datetime.timedelta(days=7))
+        slots = availability.free_slots([self.doctor.id], self.monday, self.monday + datetime.timedelta(days=7))
+        self.assertEqual(slots[self.doctor.id], {self.monday: [datetime.time(9, 30), datetime.time(10)]})
+
+    def test_specialty_slots_in_bounded_queries(self):
+        with self.assertNumQueries(4):
+            slots = availability.specialty_free_slots(
+                self.specialty.id, self.monday, self.monday + datetime.timedelta(days=13)
+            )
+        self.assertEqual(set(slots), {self.doctor.id, self.other.id})
+        self.assertEqual(len(slots[self.other.id]), 2)
+        self.assertEqual(len(slots[self.other.id][self.monday]), 4)
+
+    def test_scattered_dates_expand_only_their_windows(self):
+        dates = [self.monday, self.monday + datetime.timedelta(days=7), self.monday + datetime.timedelta(weeks=52)]
+        # One free_slots() pass (three queries) per MAX_RANGE_DAYS window.
+        with self.assertNumQueries(6):
+            slots = availability.free_slots_on([self.doctor.id], dates)
+        self.assertEqual(list(slots[self.doctor.id]), dates)
+
+    def test_slots_endpoint(self):
+        response = self.client.get(f'/api/doctors/{self.doctor.id}/slots/?start=2030-01-07&end=2030-01-08')
+        self.assertEqual(response.json(), {'2030-01-07': ['09:00', '09:30', '10:00', '10:30']})
+
+    def test_booking_taken_or_unscheduled_slot_is_409(self):
+        self.client.force_authenticate(self.patient.user)
+        payload = {'doctor': self.doctor.id, 'date': '2030-01-07', 'time': '09:00'}
+        self.assertEqual(self.client.post('/api/appointments/', payload).status_code, 201)
+        self.assertEqual(self.client.post('/api/appointments/book/', payload).status_code, 409)
+        payload['time'] = '12:00'
+        self.assertEqual(self.client.post('/api/appointments/', payload).status_code, 409)
+
+    def test_unique_constraint_ignores_cancelled(self):
+        first = book_appointment(doctor=self.doctor, patient=self.patient, date=self.monday, time=datetime.time(9))
+        first.status = 'cancelled'
+        first.save()
+        book_appointment(doctor=self.doctor, patient=self.patient, date=self.monday, time=datetime.time(9))
+        with self.assertRaises(SlotUnavailable):
+            reschedule_appointment(first, status='pending')
+
+    def test_reschedule_is_validated_like_a_booking(self):
+        appointment = book_appointment(doctor=self.doctor, patient=self.patient, date=self.monday, time=datetime.time(9))
+        # Off the schedule.
+        with self.assertRaises(SlotUnavailable):
+            reschedule_appointment(appointment, time=datetime.time(12))
+        # Its own slot doesn't count as taken.
+        reschedule_appointment(appointment, time=datetime.time(9), notes='moved nowhere')
+        reschedule_appointment(appointment, time=datetime.time(10))
+        self.assertEqual(Appointment.objects.get(pk=appointment.pk).time, datetime.time(10))
+
+        self.doctor.is_available = False
+        self.doctor.save()
+        with self.assertRaises(SlotUnavailable):
+            reschedule_appointment(appointment, time=datetime.time(9, 30))
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.time, datetime.time(10))
+        # Changes that keep the slot don't need the doctor.
+        reschedule_appointment(appointment, notes='bring results')
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    attempts = 12
+
+    def test_parallel_bookings_for_one_slot(self):
+        doctor = make_doctor('doc0')
+        patients = [make_patient(f'patient{i}') for i in range(self.attempts)]
+        date, time = datetime.date(2030, 1, 7), datetime.time(9)
+        barrier = threading.Barrier(self.attempts)
+        outcomes = []
+
+        def attempt(patient):
+            try:
+                barrier.wait()
+                book_appointment(doctor=doctor, patient=patient, date=date, time=time)
+                outcomes.append('booked')
+            except SlotUnavailable:
+                outcomes.append('conflict')
+            except OperationalError:
+                # SQLite may refuse a writer outright instead of queueing it.
+                outcomes.append('locked')
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=attempt, args=(p,)) for p in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(outcomes), self.attempts)
+        self.assertEqual(outcomes.count('booked'), 1, outcomes)
+        self.assertEqual(Appointment.objects.filter(doctor=doctor, date=date, time=time).count(), 1)
+
+
+class BulkImportTests(APITestCase):
+    def setUp(self):
+        admin = CustomUser.objects.create_user(username='admin', is_staff=True, role='admin')
+        self.client.force_authenticate(admin)
+        self.cardio = make_specialist('Cardiology')
+
+    def test_specialists_upsert_by_name(self):
+        response = self.client.post('/api/bulk/specialists/', [
+            {'name': 'cardiology', 'description': 'Hearts'},
+            {'name': 'Dermatology', 'description': 'Skin'},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.json()['created'], response.json()['updated']), (1, 1))
+        self.cardio.refresh_from_db()
+        self.assertEqual(self.cardio.description, 'Hearts')
+
+    def test_csv_symptom_mappings(self):
+        body = 'symptom,specialty\nchest pain,Cardiology\npalpitations,%d\nrash,Unknown\n' % self.cardio.id
+        response = self.client.post('/api/bulk/symptom-mappings/?partial=true', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(response.json()['errors'][0]['row'], 2)
+        self.assertEqual(SymptomSpecialtyMap.objects.filter(specialty=self.cardio).count(), 2)
+
+    def test_doctors_all_or_nothing_with_row_errors(self):
+        make_doctor('taken')
+        rows = [
+            {'username': 'new1', 'specialty': 'cardiology'},
+            {'username': 'taken'},
+            {'username': 'new1'},
+            {'username': 'new2', 'specialty': '999'},
+        ]
+        response = self.client.post('/api/bulk/doctors/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['row'] for e in response.json()['errors']], [1, 2, 3])
+        self.assertFalse(CustomUser.objects.filter(username='new1').exists())
+
+    def test_doctor_import_query_count_is_flat(self):
+        def run(count, offset):
+            rows = [{'username': f'doc{offset + i}', 'specialty': 'Cardiology'} for i in range(count)]
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post('/api/bulk/doctors/', rows, format='json')
+            self.assertEqual(response.json()['created'], count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(run(2, 0), run(40, 100))
+        self.assertEqual(Doctor.objects.filter(specialty=self.cardio, user__role='doctor').count(), 42)
+
+    def test_bulk_booking_rejects_conflicts(self):
+        doctor, patient = make_doctor('doc0'), make_patient('pat0')
+        make_appointment(doctor, patient, hour=9)
+        rows = [
+            {'doctor': doctor.id, 'patient': patient.id, 'date': '2025-01-01', 'time': '09:00'},
+            {'doctor': doctor.id, 'patient': patient.id, 'date': '2025-01-01', 'time': '10:00'},
+            {'doctor': doctor.id, 'patient': patient.id, 'date': '2025-01-01', 'time': '10:00'},
+            # Cancelled rows hold no slot, taken or not.
+            {'doctor': doctor.id, 'patient': patient.id, 'date': '2025-01-01', 'time': '09:00', 'status': 'cancelled'},
+        ]
+        response = self.client.post('/api/bulk/appointments/?partial=1', rows, format='json')
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual([e['row'] for e in response.json()['errors']], [0, 2])
+
+    def test_imports_invalidate_symptom_matcher(self):
+        SymptomSpecialtyMap.objects.create(symptom='chest pain', specialty=self.cardio)
+        matching.get_matcher()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/bulk/specialists/', [{'name': 'Dermatology'}], format='json')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/bulk/symptom-mappings/', [{'symptom': 'rash', 'specialty': 'Dermatology'}], format='json')
+        top = matching.get_matcher().match(['rash'])[0]
+        self.assertEqual((top['specialty']['name'], top['doctors']), ('Dermatology', []))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/bulk/doctors/', [{'username': 'derm1', 'specialty': 'Dermatology'}], format='json')
+        self.assertEqual(len(matching.get_matcher().match(['rash'])[0]['doctors']), 1)
+
+    def test_imports_invalidate_cached_responses(self):
+        self.client.get('/api/specialists/')
+        self.client.get('/api/doctors/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/bulk/specialists/', [{'name': 'Dermatology'}], format='json')
+        response = self.client.get('/api/specialists/')
+        self.assertEqual((response['X-Cache'], len(response.json())), ('MISS', 2))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/bulk/doctors/', [{'username': 'derm1', 'specialty': 'Dermatology'}], format='json')
+        response = self.client.get('/api/doctors/')
+        self.assertEqual((response['X-Cache'], len(response.json())), ('MISS', 1))
+
+    def test_requires_admin(self):
+        self.client.force_authenticate(make_patient('pat0').user)
+        self.assertEqual(self.client.post('/api/bulk/specialists/', [], format='json').status_code, 403)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        self.specialty = make_specialist()
+        self.doctor = make_doctor('doc0', self.specialty)
+        cache_metrics.reset()
+
+    def test_second_request_is_served_from_cache(self):
+        first = self.client.get('/api/doctors/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/doctors/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertIn('max-age=60', second['Cache-Control'])
+        self.assertEqual(cache_metrics.snapshot()['hits'], 1)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get('/api/specialists/').headers['ETag']
+        response = self.client.get('/api/specialists/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_writes_invalidate_dependent_views(self):
+        self.client.get('/api/doctors/')
+        self.client.get(f'/api/specialists/{self.specialty.id}/')
+        self.doctor.user.last_name = 'Renamed'
+        self.doctor.user.save()
+        response = self.client.get('/api/doctors/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()[0]['user']['last_name'], 'Renamed')
+        # Specialist responses don't depend on users.
+        self.assertEqual(self.client.get(f'/api/specialists/{self.specialty.id}/')['X-Cache'], 'HIT')
+
+    def test_query_string_is_part_of_the_key(self):
+        self.client.get('/api/doctors/?page=1')
+        self.assertEqual(self.client.get('/api/doctors/?page=2')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/doctors/?page=1')['X-Cache'], 'HIT')
+
+
+class DoctorDiscoveryTests(ConstantQueryCountMixin, APITestCase):
+    url = '/api/doctors/by-specialty/'
+
+    def setUp(self):
+        self.cardiology = make_specialist('Cardiology')
+        self.dermatology = make_specialist('Dermatology')
+        self.alice = make_doctor('alice', self.cardiology)
+        self.bob = make_doctor('bob', self.cardiology)
+        self.bob.is_available = False
+        self.bob.bio = 'Treats palpitations and arrhythmia'
+        self.bob.save()
+        self.carol = make_doctor('carol', self.dermatology)
+
+    def ids(self, query):
+        response = self.client.get(f'{self.url}?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_specialty_by_name_is_case_insensitive(self):
+        self.assertEqual(self.ids('specialty=cardiology'), [self.alice.id, self.bob.id])
+        self.assertEqual(self.ids('specialty=DERMATOLOGY'), [self.carol.id])
+        self.assertEqual(self.ids('specialty=Unknown'), [])
+
+    def test_specialty_by_id(self):
+        self.assertEqual(self.ids(f'specialty={self.dermatology.id}'), [self.carol.id])
+
+    def test_available_filter(self):
+        self.assertEqual(self.ids('specialty=Cardiology&available=true'), [self.alice.id])
+        self.assertEqual(self.ids('available=false'), [self.bob.id])
+        self.assertEqual(self.client.get(f'{self.url}?available=maybe').status_code, 400)
+
+    def test_search_matches_names_and_bio(self):
+        self.assertEqual(self.ids('search=caro'), [self.carol.id])
+        self.assertEqual(self.ids('search=palpitations'), [self.bob.id])
+
+    def test_ordering(self):
+        self.assertEqual(self.ids('ordering=-name'), [self.carol.id, self.bob.id, self.alice.id])
+        self.assertEqual(self.ids('ordering=specialty'), [self.alice.id, self.bob.id, self.carol.id])
+        self.assertEqual(self.client.get(f'{self.url}?ordering=bio').status_code, 400)
+
+    def test_paginated(self):
+        response = self.client.get(f'{self.url}?page_size=2').json()
+        self.assertEqual(response['count'], 3)
+        self.assertEqual(len(response['results']), 2)
+        self.assertIsNotNone(response['next'])
+
+    def test_filtered_list_query_count_is_constant(self):
+        def add_doctors(n):
+            start = Doctor.objects.count()
+            for i in range(n):
+                make_doctor(f'extra{start + i}', self.cardiology)
+
+        self.assertConstantQueries(f'{self.url}?specialty=cardiology&page_size=100', add_doctors)
+
+    def test_doctor_list_accepts_the_same_filters(self):
+        response = self.client.get('/api/doctors/?specialty=cardiology&available=true')
+        self.assertEqual([row['id'] for row in response.json()], [self.alice.id])
+
+
+class RegistrationTests(APITestCase):
+    url = '/api/auth/register/'
+
+    def payload(self, **extra):
+        return {
+            'username': 'newpatient', 'email': 'new@example.com', 'first_name': 'New', 'last_name': 'Patient',
+            'password': 'S3cure-pass!', 'password2': 'S3cure-pass!', **extra,
+        }
+
+    def test_patient_signup_sets_role_and_profile(self):
+        response = self.client.post(self.url, self.payload(is_patient=True, age=41, phone='0711111111'), format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        user = CustomUser.objects.get(username='newpatient')
+        self.assertEqual(user.role, 'patient')
+        self.assertEqual(user.patient_profile.age, 41)
+        self.assertTrue(user.check_password('S3cure-pass!'))
+        self.assertFalse(Doctor.objects.filter(user=user).exists())
+
+    def test_doctor_signup(self):
+        specialty = make_specialist()
+        response = self.client.post(
+            self.url, self.payload(username='newdoc', is_doctor=True, specialty=specialty.id, age=50), format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        user = CustomUser.objects.get(username='newdoc')
+        self.assertEqual(user.role, 'doctor')
+        self.assertEqual(user.doctor_profile.specialty, specialty)
+
+    def test_service_writes_two_rows_atomically(self):
+        with self.assertNumQueries(4):  # savepoint, user, profile, release
+            register_user(role='patient', username='svc', password='x')
+        # Profile insert fails after the user insert; the user must not survive.
+        with mock.patch.object(Doctor.objects, 'create', side_effect=IntegrityError), self.assertRaises(IntegrityError):
+            register_user(role='doctor', username='svc2', password='x')
+        self.assertFalse(CustomUser.objects.filter(username='svc2').exists())
+
+    @override_settings(
+        REGISTRATION_PASSWORD_HASHER='md5',
+        PASSWORD_HASHERS=[
+            'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+            'django.contrib.auth.hashers.MD5PasswordHasher',
+        ],
+    )
+    def test_fast_hasher_is_upgraded_on_login(self):
+        user = register_user(role='patient', username='fast', password='S3cure-pass!')
+        self.assertTrue(user.password.startswith('md5$'))
+        self.assertTrue(user.check_password('S3cure-pass!'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('pbkdf2_sha256$'))
+
+    def test_md5_accounts_survive_switching_signups_back(self):
+        with override_settings(REGISTRATION_PASSWORD_HASHER='md5'):
+            user = register_user(role='patient', username='fast', password='S3cure-pass!')
+        self.assertTrue(user.password.startswith('md5$'))
+        self.assertTrue(user.check_password('S3cure-pass!'))
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class TokenClaimsTests(APITestCase):
+    def setUp(self):
+        self.patient = make_patient('pat0')
+        self.patient.user.set_password('S3cure-pass!')
+        self.patient.user.save()
+        self.doctor = make_doctor('doc0')
+        self.doctor.user.set_password('S3cure-pass!')
+        self.doctor.user.save()
+
+    def login(self, username):
+        response = self.client.post('/api/auth/login/', {'username': username, 'password': 'S3cure-pass!'})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_login_returns_role_and_embeds_profile_claims(self):
+        data = self.login('doc0')
+        self.assertEqual((data['role'], data['username']), ('doctor', 'doc0'))
+        self.assertIn('refresh', data)
+        token = AccessToken(data['access'])
+        self.assertEqual(token['doctor_id'], self.doctor.id)
+        self.assertIsNone(token['patient_id'])
+        self.assertEqual(AccessToken(self.login('pat0')['access'])['patient_id'], self.patient.id)
+
+    def test_authenticated_requests_skip_the_user_lookup(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.login('pat0')['access']}")
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/role/')
+        self.assertEqual(response.json(), {'username': 'pat0', 'role': 'patient'})
+
+        make_appointment(self.doctor, self.patient)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/appointments/my/')
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('FROM "core_customuser"', ctx.captured_queries[0]['sql'])
+
+    def test_tokens_without_claims_fall_back_to_the_database(self):
+        token = AccessToken.for_user(self.patient.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.get('/api/auth/role/')
+        self.assertEqual(response.json()['role'], 'patient')
+
+    def test_verified_endpoints_see_revoked_staff(self):
+        admin = CustomUser.objects.create_user(username='admin', password='S3cure-pass!', is_staff=True)
+        access = self.login('admin')['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get('/api/metrics/cache/').status_code, 200)
+        admin.is_staff = False
+        admin.save()
+        self.assertEqual(self.client.get('/api/metrics/cache/').status_code, 403)
+        admin.is_active = False
+        admin.save()
+        self.assertEqual(self.client.get('/api/metrics/cache/').status_code, 401)
+
+    def test_refresh_reissues_current_claims(self):
+        make_payment(make_appointment(self.doctor, self.patient), 'TX0')
+        admin = CustomUser.objects.create_user(username='admin', password='S3cure-pass!', is_staff=True)
+        refresh = self.login('admin')['refresh']
+        admin.is_staff = False
+        admin.save()
+        response = self.client.post('/api/auth/refresh/', {'refresh': refresh})
+        self.assertEqual(response.status_code, 200, response.content)
+        access = AccessToken(response.json()['access'])
+        self.assertEqual((access['is_staff'], access['role']), (False, 'patient'))
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+        self.assertEqual(self.client.get('/api/payments/').json()['results'], [])
+
+        admin.is_active = False
+        admin.save()
+        self.assertEqual(self.client.post('/api/auth/refresh/', {'refresh': refresh}).status_code, 401)
+
+
+class AsyncViewTests(TransactionTestCase):
+    # TransactionTestCase: fan_out() loads run on other threads and
+    # connections, which can't see data inside a test transaction.
+
+    def setUp(self):
+        self.specialty = make_specialist()
+        self.doctor = make_doctor('doc0', self.specialty)
+        self.patient = make_patient('pat0')
+        DoctorSchedule.objects.create(
+            doctor=self.doctor, weekday=0, start_time=datetime.time(9), end_time=datetime.time(10), slot_minutes=30,
+        )
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    async def test_doctor_list_matches_the_sync_view(self):
+        sync = await self.async_client.get('/api/doctors/?specialty=cardiology')
+        response = await self.async_client.get('/api/async/doctors/?specialty=cardiology')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), sync.json())
+        # Queries run on sync_to_async threads still count towards the request.
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    async def test_detail_fans_out_to_slots(self):
+        response = await self.async_client.get(f'/api/async/doctors/{self.doctor.id}/?start=2030-01-07&end=2030-01-07')
+        data = response.json()
+        self.assertEqual(data['user']['username'], 'doc0')
+        self.assertEqual(data['slots'], {'2030-01-07': ['09:00', '09:30']})
+
+        response = await self.async_client.get(f'/api/async/specialists/{self.specialty.id}/?start=2030-01-07&end=2030-01-07')
+        data = response.json()
+        self.assertEqual([d['id'] for d in data['doctors']], [self.doctor.id])
+        self.assertEqual(data['slots'][str(self.doctor.id)], {'2030-01-07': ['09:00', '09:30']})
+
+        response = await self.async_client.get('/api/async/specialists/999/')
+        self.assertEqual(response.status_code, 404)
+
+    async def test_symptom_match(self):
+        await SymptomSpecialtyMap.objects.acreate(symptom='chest pain', specialty=self.specialty)
+        await sync_to_async(matching.invalidate)()
+        response = await self.async_client.get('/api/async/symptom-match/?symptoms=chest pain')
+        self.assertEqual(response.json()[0]['specialty']['name'], 'Cardiology')
+        self.assertEqual((await self.async_client.get('/api/async/symptom-match/')).status_code, 404)
+
+    async def test_my_appointments_requires_a_token(self):
+        self.assertEqual((await self.async_client.get('/api/async/appointments/my/')).status_code, 401)
+
+        await sync_to_async(make_appointment)(self.doctor, self.patient)
+        token = AccessToken.for_user(self.patient.user)
+        for claim, value in (await sync_to_async(user_claims)(self.patient.user)).items():
+            token[claim] = value
+        response = await self.async_client.get('/api/async/appointments/my/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+
+class BenchmarkSuiteTests(APITestCase):
+    def test_generator_is_deterministic(self):
+        counts = generate(specialists=3, doctors=4, patients=5, appointments=20, mappings=6, seed=7)
+        first = list(Appointment.objects.order_by('id').values_list('doctor__user__username', 'date', 'time'))
+        self.assertEqual(counts['appointments'], 20)
+        self.assertEqual(counts['schedules'], 20)
+        Appointment.objects.all().delete()
+        Doctor.objects.all().delete()
+        CustomUser.objects.all().delete()
+        generate(specialists=3, doctors=4, patients=5, appointments=20, mappings=6, seed=7)
+        second = list(Appointment.objects.order_by('id').values_list('doctor__user__username', 'date', 'time'))
+        self.assertEqual(first, second)
+
+    def test_endpoint_measurement(self):
+        generate(specialists=2, doctors=3, patients=3, appointments=10, mappings=4)
+        result = measure_endpoint(self.client, '/api/specialists/', {}, iterations=5, warmup=1, alloc_iterations=1)
+        self.assertEqual(result['requests'], 5)
+        self.assertEqual(result['queries_max'], 1)
+        self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertGreater(result['peak_alloc_kib'], 0)
+
+    def test_plan_queries_on_an_empty_database(self):
+        self.assertEqual(set(hot_queries()), {'payments_by_status', 'symptom_substring', 'symptom_prefix'})
+
+    def test_percentiles_and_comparison(self):
+        self.assertEqual(percentile(list(range(1, 101)), 99), 99)
+        self.assertIsNone(percentile([], 50))
+        changes = compare(
+            {'endpoints': {'a': {'p50_ms': 10.0, 'rps': 100.0}}},
+            {'endpoints': {'a': {'p50_ms': 5.0, 'rps': 200.0}, 'b': {'p50_ms': 1.0}}},
+        )
+        self.assertEqual(changes, {'a': {'rps': (100.0, 200.0, 100.0), 'p50_ms': (10.0, 5.0, -50.0)}})
+
+
+class PerformanceMiddlewareTests(APITestCase):
+    def setUp(self):
+        perf_registry.reset()
+        self.doctor = make_doctor('doc0', make_specialist())
+        self.patient = make_patient('pat0')
+
+    def test_server_timing_is_for_staff_only(self):
+        self.assertFalse(self.client.get('/api/specialists/').has_header('Server-Timing'))
+        self.client.force_authenticate(self.patient.user)
+        self.assertFalse(self.client.get('/api/specialists/').has_header('Server-Timing'))
+        self.client.force_authenticate(CustomUser.objects.create_user(username='admin', is_staff=True))
+        self.assertIn('total;dur=', self.client.get('/api/specialists/')['Server-Timing'])
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    def test_server_timing_reports_queries_and_serialization(self):
+        response = self.client.get('/api/doctors/')
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertIn('db;dur=', timing)
+        self.assertIn('desc="1 queries"', timing)
+        self.assertIn('serialize;dur=', timing)
+        self.assertNotIn('nplusone', timing)
+
+    @override_settings(PERF_SERVER_TIMING=True)
+    def test_repeated_queries_are_attributed_to_the_serializer_field(self):
+        for day in range(6):
+            make_payment(make_appointment(self.doctor, self.patient, days=day), f'tx{day}')
+
+        def view(request):
+            # No eager loading: every payment loads its appointment separately.
+            return HttpResponse(json.dumps(PaymentSerializer(Payment.objects.all(), many=True).data, default=str))
+
+        request = RequestFactory().get('/payments/')
+        with self.assertLogs('core.performance', 'WARNING') as logs:
+            response = PerformanceMiddleware(view)(request)
+        self.assertIn('nplusone;desc="PaymentSerializer.appointment_detail x6"', response['Server-Timing'])
+        self.assertIn('PaymentSerializer.appointment_detail', logs.output[0])
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_prometheus_endpoint(self):
+        self.client.get('/api/specialists/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 401)
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer scrape-me')
+        body = response.content.decode()
+        self.assertIn('tibanow_requests_total{view="specialist-list",method="GET",status="200"} 1', body)
+        self.assertIn('tibanow_db_queries_total{view="specialist-list"}', body)
+        self.assertIn('tibanow_response_cache_misses_total', body)
+
+    @override_settings(PERF_PROFILE_SAMPLE_RATE=1.0)
+    def test_sampled_requests_are_profiled(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(PERF_PROFILE_DIR=directory):
+            self.client.get('/api/specialists/')
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+
+class FlatSerializerTests(APITestCase):
+    def setUp(self):
+        self.doctor = make_doctor('doc0', make_specialist())
+        self.unassigned = make_doctor('doc1')
+        self.unassigned.user.first_name = ''
+        self.unassigned.user.save()
+        self.patient = make_patient('pat0')
+        first = make_appointment(self.doctor, self.patient)
+        first.notes = 'Caf\u00e9 \u2028 follow-up'
+        first.save()
+        orphan = make_appointment(self.unassigned, self.patient, hour=10)
+        orphan.patient = None
+        orphan.save()
+        make_payment(first, 'tx0')
+        make_payment(orphan, 'tx1', status='completed')
+
+    def assertFlatMatches(self, serializer_class, queryset):
+        plan = get_flat_plan(serializer_class())
+        expected = JSONRenderer().render(serializer_class(queryset, many=True).data)
+        with CaptureQueriesContext(connection) as ctx:
+            actual = FastJSONRenderer().render(plan.represent(plan.apply(queryset)))
+        self.assertEqual(actual, expected)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_output_is_byte_identical(self):
+        self.assertFlatMatches(AppointmentSerializer, Appointment.objects.order_by('id'))
+        self.assertFlatMatches(PaymentSerializer, Payment.objects.order_by('id'))
+        self.assertFlatMatches(DoctorSerializer, Doctor.objects.order_by('id'))
+
+    def test_full_name_trims_like_sql(self):
+        CustomUser.objects.filter(pk=self.doctor.user_id).update(first_name='\tDoc ', last_name='Smith\n')
+        self.assertFlatMatches(DoctorSerializer, Doctor.objects.order_by('id'))
+
+    def test_list_endpoints_serve_flat_rows(self):
+        admin = CustomUser.objects.create_user(username='admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/payments/?page_size=1')
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(response.json()['results'][0]['appointment_detail']['doctor_detail']['user']['full_name'], 'Doc doc0')
+
+        # Keyset cursors are still read from the flat rows.
+        response = self.client.get(response.json()['next'])
+        self.assertIsNone(response.json()['results'][0]['appointment_detail']['patient_detail'])
+        self.assertEqual(
+            response.json()['results'][0]['appointment_detail']['doctor_detail']['user']['full_name'], 'doc1',
+        )
+
+        streamed = b''.join(self.client.get('/api/appointments/?stream=true').streaming_content)
+        self.assertEqual(json.loads(streamed), AppointmentSerializer(Appointment.objects.order_by('date', 'time', 'id'), many=True).data)
+
+    def test_unsupported_serializers_fall_back(self):
+        class NoSQLSerializer(drf_serializers.ModelSerializer):
+            label = drf_serializers.SerializerMethodField()
+
+            class Meta:
+                model = Doctor
+                fields = ['id', 'label']
+
+            def get_label(self, obj):
+                return str(obj.pk)
+
+        self.assertIsNone(get_flat_plan(NoSQLSerializer()))
+
+    def test_renderer_matches_drf(self):
+        data = {
+            'when': datetime.datetime(2025, 1, 1, 9, 30, 0, 123456, tzinfo=datetime.timezone.utc),
+            'day': datetime.date(2025, 1, 1),
+            'amount': Decimal('12.50'),
+            'text': 'line\u2028break \u00e9',
+            1: [None, True, 1.5],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class DoctorDashboardTests(APITestCase):
+    url = '/api/doctors/dashboard/?date=2025-01-01'
+
+    def setUp(self):
+        # 2025-01-01 is a Wednesday; its week runs 2024-12-30 .. 2025-01-05.
+        self.doctor = make_doctor('doc0', make_specialist())
+        self.patient = make_patient('pat0')
+        first = make_appointment(self.doctor, self.patient)
+        second = make_appointment(self.doctor, self.patient, hour=10, status='completed')
+        make_appointment(self.doctor, self.patient, days=1, status='cancelled')
+        make_appointment(self.doctor, self.patient, days=-2, status='confirmed')
+        make_appointment(self.doctor, self.patient, days=7)
+        make_appointment(make_doctor('doc1'), self.patient)
+        make_payment(first, 'tx0', status='paid')
+        make_payment(second, 'tx1')
+        Payment.objects.update(created_at=datetime.datetime(2025, 1, 1, 12, tzinfo=datetime.timezone.utc))
+
+    def test_aggregates_in_sql(self):
+        self.client.force_authenticate(self.doctor.user)
+        with CaptureQueriesContext(connection) as ctx:
+            data = self.client.get(self.url).json()
+        # Profile lookup, schedule, status counts, revenue.
+        self.assertEqual(len(ctx.captured_queries), 4)
+        self.assertEqual(data['week_start'], '2024-12-30')
+        self.assertEqual(data['today']['status_counts'], {'completed': 1, 'pending': 1})
+        self.assertEqual(data['today']['revenue'], '1500.00')
+        self.assertEqual(len(data['today']['schedule']), 2)
+        self.assertEqual(data['week']['status_counts'], {'cancelled': 1, 'completed': 1, 'confirmed': 1, 'pending': 1})
+        self.assertEqual(data['week']['paid_payments'], 1)
+        # Cancelled appointments aren't on the schedule.
+        self.assertEqual([a['date'] for a in data['week']['schedule']], ['2024-12-30', '2025-01-01', '2025-01-01'])
+        self.assertEqual(data['by_day'][3]['appointments'], 1)
+
+    def test_rollup_matches_live_and_follows_writes(self):
+        self.client.force_authenticate(self.doctor.user)
+        live = self.client.get(self.url).json()
+        rebuild_daily_stats(datetime.date(2024, 12, 1), datetime.date(2025, 1, 31))
+        self.assertEqual(DoctorDailyStats.objects.filter(doctor=self.doctor).count(), 4)
+
+        with override_settings(DOCTOR_STATS_ROLLUP=True):
+            rollup = self.client.get(self.url).json()
+            self.assertEqual(rollup.pop('source'), 'rollup')
+            live.pop('source')
+            self.assertEqual(rollup, live)
+
+            # Rescheduling moves the appointment out of both days' counts and into the new one.
+            appointment = Appointment.objects.get(doctor=self.doctor, date='2024-12-30')
+            with self.captureOnCommitCallbacks(execute=True):
+                appointment.date = datetime.date(2025, 1, 3)
+                appointment.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                Payment.objects.get(transaction_id='tx1').delete()
+                Payment.objects.create(
+                    appointment=appointment, amount=Decimal('200.00'), method='mpesa', transaction_id='tx2', status='paid',
+                )
+            # Refreshes run on the worker; a pair already queued isn't queued again.
+            with self.captureOnCommitCallbacks(execute=True):
+                appointment.notes = 'Bring the X-ray'
+                appointment.save()
+            refreshes = Job.objects.filter(name='doctor_stats_refresh', status=Job.QUEUED)
+            self.assertEqual(refreshes.filter(payload__date='2025-01-03').count(), 1)
+            jobs.work(once=True)
+            self.assertFalse(refreshes.exists())
+            rollup = self.client.get(self.url).json()
+
+        live = self.client.get(self.url).json()
+        rollup.pop('source'), live.pop('source')
+        self.assertEqual(rollup['by_day'], live['by_day'])
+        self.assertEqual(rollup['by_day'][0]['appointments'], 0)
+        self.assertEqual(rollup['by_day'][4]['status_counts'], {'confirmed': 1})
+
+    def test_access(self):
+        self.client.force_authenticate(self.patient.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        admin = CustomUser.objects.create_user(username='admin', is_staff=True)
+        self.client.force_authenticate(admin)
+        response = self.client.get(f'{self.url}&doctor={self.doctor.id}')
+        self.assertEqual(response.json()['doctor'], self.doctor.id)
+        self.assertEqual(self.client.get(f'/api/doctors/dashboard/?date=2025-13-01&doctor={self.doctor.id}').status_code, 400)
+
+
+class PaymentEventTests(APITestCase):
+    url = '/api/payments/events/'
+
+    def setUp(self):
+        self.doctor = make_doctor('doc0')
+        self.patient = make_patient('pat0')
+        self.appointments = [make_appointment(self.doctor, self.patient, days=day) for day in range(4)]
+        self.client.force_authenticate(CustomUser.objects.create_user(username='admin', is_staff=True))
+
+    def test_replays_and_out_of_order_events_are_idempotent(self):
+        ids = [a.id for a in self.appointments]
+        events = provider_events(ids, seed=3, replay_ratio=1, failure_ratio=0)
+        # Deliver the final "paid" events before their "pending" ones.
+        events.sort(key=lambda event: event['status'] == 'pending')
+        result = self.client.post(self.url, events, format='json').json()
+        self.assertEqual((result['created'], result['errors']), (4, []))
+        self.assertEqual(result['appointments_updated'], 4)
+        self.assertEqual(set(Payment.objects.values_list('status', flat=True)), {'paid'})
+        self.assertEqual(set(Appointment.objects.values_list('status', flat=True)), {'confirmed'})
+
+        with CaptureQueriesContext(connection) as ctx:
+            result = self.client.post(self.url, events, format='json').json()
+        self.assertEqual((result['created'], result['updated'], result['unchanged']), (0, 0, 4))
+        self.assertLess(len(ctx.captured_queries), 10)
+        self.assertEqual(Payment.objects.count(), 4)
+
+    def test_refund_cancels_and_conflicts_are_reported(self):
+        first, second = self.appointments[:2]
+        base = {'amount': '1500.00', 'method': 'mpesa'}
+        self.client.post(self.url, {**base, 'transaction_id': 'tx0', 'appointment': first.id, 'status': 'paid'}, format='json')
+        result = self.client.post(self.url, [
+            {**base, 'transaction_id': 'tx0', 'appointment': first.id, 'status': 'refunded'},
+            {**base, 'transaction_id': 'tx1', 'appointment': first.id, 'status': 'paid'},
+            {**base, 'transaction_id': 'tx0', 'appointment': second.id, 'status': 'paid'},
+            {**base, 'transaction_id': 'tx2', 'appointment': 999, 'status': 'paid'},
+        ], format='json').json()
+        self.assertEqual(result['updated'], 1)
+        self.assertEqual([error['row'] for error in result['errors']], [1, 2, 3])
+        first.refresh_from_db()
+        self.assertEqual(first.status, 'cancelled')
+
+        response = self.client.post(self.url, [{**base, 'transaction_id': 'tx3', 'appointment': 999, 'status': 'paid'}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_stale_events_change_nothing(self):
+        event = {'transaction_id': 'tx0', 'appointment': self.appointments[0].id, 'method': 'mpesa'}
+        self.client.post(self.url, {**event, 'amount': '1500.00', 'status': 'paid'}, format='json')
+        result = self.client.post(self.url, {**event, 'amount': '900.00', 'status': 'pending'}, format='json').json()
+        self.assertEqual((result['updated'], result['unchanged']), (0, 1))
+        payment = Payment.objects.get(transaction_id='tx0')
+        self.assertEqual((payment.status, payment.amount), ('paid', Decimal('1500.00')))
+
+    @override_settings(PAYMENT_WEBHOOK_SECRET='s3cret')
+    def test_signed_callbacks(self):
+        self.client.force_authenticate(None)
+        body = json.dumps({
+            'transaction_id': 'tx0', 'appointment': self.appointments[0].id,
+            'amount': '1500.00', 'method': 'stripe', 'status': 'paid',
+        }).encode()
+        signature = 'sha256=' + hmac.new(b's3cret', body, hashlib.sha256).hexdigest()
+
+        response = self.client.post(self.url, body, content_type='application/json')
+        self.assertIn(response.status_code, (401, 403))
+        response = self.client.post(self.url, body, content_type='application/json', HTTP_X_SIGNATURE='sha256=bad')
+        self.assertIn(response.status_code, (401, 403))
+        response = self.client.post(self.url, body, content_type='application/json', HTTP_X_SIGNATURE=signature)
+        self.assertEqual(response.json()['created'], 1)
+
+    def test_reconcile_command_streams_a_settlement_file(self):
+        events = provider_events([a.id for a in self.appointments], seed=5, failure_ratio=0)
+        self.client.post(self.url, events, format='json')
+        rows = settlement_rows(events, seed=5, drift=2)
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as settlement:
+            writer = csv.DictWriter(settlement, fieldnames=['transaction_id', 'amount', 'status'])
+            writer.writeheader()
+            writer.writerows(rows)
+        self.addCleanup(os.remove, settlement.name)
+
+        out, err = io.StringIO(), io.StringIO()
+        call_command('reconcile_payments', settlement.name, '--chunk-size', '2', stdout=out, stderr=err)
+        mismatches = list(csv.DictReader(io.StringIO(out.getvalue())))
+        self.assertEqual(len(mismatches), 2)
+        self.assertLessEqual({m['problem'] for m in mismatches}, {'amount', 'missing'})
+        self.assertIn('4 settlement rows', err.getvalue())
+
+    def test_reconcile_reports_paid_payments_the_provider_never_settled(self):
+        for n, appointment in enumerate(self.appointments[:3]):
+            make_payment(appointment, f'TX{n}', status='paid')
+        make_payment(self.appointments[3], 'TX3', status='pending')
+        settled = [{'transaction_id': 'TX0', 'amount': '1500.00', 'status': 'paid'}]
+        today = timezone.localdate()
+        self.assertEqual(list(reconcile(settled)), [])
+        self.assertEqual(
+            sorted(reconcile(settled, chunk_size=1, start=today, end=today)),
+            [('TX1', 'unsettled', None, '1500.00'), ('TX2', 'unsettled', None, '1500.00')],
+        )
+        yesterday = today - datetime.timedelta(days=1)
+        self.assertEqual(list(reconcile(settled, start=yesterday, end=yesterday)), [])
+
+
+class BackgroundJobTests(APITestCase):
+    def setUp(self):
+        self.doctor = make_doctor('doc0')
+        self.patient = make_patient('pat0')
+        self.patient.user.email = 'pat0@example.com'
+        self.patient.user.save()
+
+    def test_booking_confirmation_is_queued_after_commit(self):
+        self.client.force_authenticate(self.patient.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/appointments/book/', {'doctor': self.doctor.id, 'date': '2030-01-07', 'time': '09:00'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(list(Job.objects.values_list('name', 'status')), [('booking_confirmation', 'queued')])
+        # Nothing was sent inline.
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(jobs.work(once=True), 1)
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertEqual(mail.outbox[0].to, ['pat0@example.com'])
+
+    def test_only_staff_payment_writes_move_the_appointment(self):
+        appointment = make_appointment(self.doctor, self.patient)
+        payment = {'appointment': appointment.id, 'amount': '1500.00', 'method': 'mpesa', 'transaction_id': 'tx0', 'status': 'paid'}
+        self.client.force_authenticate(self.patient.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/payments/', payment).status_code, 201)
+        self.assertFalse(Job.objects.exists())
+
+        Payment.objects.filter(transaction_id='tx0').update(status='pending')
+        self.client.force_authenticate(CustomUser.objects.create_user(username='admin', is_staff=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f"/api/payments/{Payment.objects.get().id}/", {'status': 'paid'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(jobs.work(once=True), 1)
+        self.assertEqual(Appointment.objects.get().status, 'confirmed')
+
+    def test_failures_back_off_then_fail(self):
+        calls = []
+
+        @jobs.task('test_flaky', max_attempts=2)
+        def flaky(n):
+            calls.append(n)
+            raise RuntimeError('provider down')
+        self.addCleanup(jobs.TASKS.pop, 'test_flaky')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue('test_flaky', n=1)
+        Job.objects.create(name='no_such_task', run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.work(once=True)
+        job = Job.objects.get(name='test_flaky')
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('provider down', job.last_error)
+        self.assertEqual(Job.objects.get(name='no_such_task').status, Job.FAILED)
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.work(once=True)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.FAILED)
+        self.assertEqual(calls, [1, 1])
+
+    def test_reminder_sweep_batches_and_never_repeats(self):
+        now = timezone.make_aware(datetime.datetime(2030, 1, 7, 22, 0))
+        soon = [
+            Appointment.objects.create(doctor=self.doctor, patient=self.patient, date=datetime.date(2030, 1, 8), time=datetime.time(hour))
+            for hour in (8, 9, 10)
+        ]
+        Appointment.objects.create(doctor=self.doctor, patient=self.patient, date=datetime.date(2030, 1, 7), time=datetime.time(23), status='cancelled')
+        Appointment.objects.create(doctor=self.doctor, patient=self.patient, date=datetime.date(2030, 1, 9), time=datetime.time(8))
+        Appointment.objects.create(doctor=self.doctor, patient=self.patient, date=datetime.date(2030, 1, 7), time=datetime.time(21))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sweep_reminders(batch_size=2, now=now), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sweep_reminders(batch_size=2, now=now), 0)
+        self.assertEqual(Job.objects.filter(name='appointment_reminder').count(), 3)
+        self.assertEqual(set(Appointment.objects.exclude(reminder_sent_at=None).values_list('id', flat=True)), {a.id for a in soon})
+
+        # One batched handler call for all three.
+        with mock.patch('core.tasks.send_mass_mail') as send_mass_mail:
+            jobs.work(once=True)
+        send_mass_mail.assert_called_once()
+        self.assertEqual(len(send_mass_mail.call_args.args[0]), 3)
+
+        # Moving an appointment re-arms its reminder.
+        reschedule_appointment(soon[0], time=datetime.time(11))
+        self.assertIsNone(Appointment.objects.get(pk=soon[0].pk).reminder_sent_at)
+
+
+class JobExecutorTests(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Worker threads would write through one shared-cache connection and lock each other out.
+            self.skipTest('needs a database that allows concurrent writers')
+
+    def test_thread_pool_runs_jobs_on_their_own_connections(self):
+        patient = make_patient('pat0')
+        patient.user.email = 'pat0@example.com'
+        patient.user.save()
+        appointments = [make_appointment(make_doctor(f'doc{i}'), patient) for i in range(3)]
+        for appointment in appointments:
+            jobs.enqueue('booking_confirmation', appointment_id=appointment.id)
+
+        executor = jobs.make_executor('thread', 3)
+        try:
+            self.assertEqual(jobs.work(once=True, executor=executor), 3)
+        finally:
+            executor.shutdown()
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {Job.DONE})
+        self.assertEqual(len(mail.outbox), 3)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    def test_reads_go_to_the_replica_only_when_asked(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Doctor), 'default')
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Doctor), 'replica')
+            self.assertEqual(router.db_for_write(Doctor), 'default')
+            # Inside a transaction on the primary, reads must see its writes.
+            with mock.patch.object(connection, 'in_atomic_block', True):
+                self.assertEqual(router.db_for_read(Doctor), 'default')
+        self.assertEqual(router.db_for_read(Doctor), 'default')
+        self.assertTrue(router.allow_migrate('default', 'core'))
+        self.assertFalse(router.allow_migrate('replica', 'core'))
+
+    @mock.patch('core.routers.replica_configured', return_value=True)
+    def test_views_choose_which_requests_use_the_replica(self, _):
+        factory = RequestFactory()
+        self.assertTrue(SpecialistViewSet(action_map={'get': 'retrieve'}).uses_replica(factory.get('/')))
+        self.assertFalse(SpecialistViewSet(action_map={'post': 'create'}).uses_replica(factory.post('/')))
+        self.assertTrue(AppointmentViewSet(action_map={'get': 'list'}).uses_replica(factory.get('/')))
+        self.assertFalse(AppointmentViewSet(action_map={'get': 'retrieve'}).uses_replica(factory.get('/')))
+
+
+class ReadYourWritesTests(TransactionTestCase):
+    client_class = APIClient
+
+    @classmethod
+    def setUpClass(cls):
+        # The test runner doesn't know the replica alias, so it is added (and
+        # allowed) here rather than in ``databases``.
+        cls.enterClassContext(sqlite_replica())
+        cls.databases = {'default', REPLICA_DB_ALIAS}
+        super().setUpClass()
+
+    def setUp(self):
+        cache.clear()
+        self.doctor = make_doctor('doc0', make_specialist())
+        self.patient = make_patient('pat0')
+
+    def test_patient_sees_own_booking_until_the_pin_expires(self):
+        # Catalog reads come from the replica, which hasn't caught up.
+        self.assertEqual(self.client.get('/api/specialists/').json(), [])
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.patient.user))
+        self.assertEqual(self.client.get('/api/appointments/my/').json(), [])
+
+        response = self.client.post('/api/appointments/', {'doctor': self.doctor.id, 'date': '2030-01-07', 'time': '09:00'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Appointment.objects.using(REPLICA_DB_ALIAS).count(), 0)
+
+        # Pinned to the primary: the booking is visible straight away.
+        mine = self.client.get('/api/appointments/my/').json()
+        self.assertEqual([a['id'] for a in mine], [response.json()['id']])
+
+        # Another user is not pinned, and neither is this one once the window passes.
+        other = make_patient('pat1')
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(other.user))
+        self.assertEqual(self.client.get('/api/appointments/').json()['results'], [])
+        cache.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.patient.user))
+        self.assertEqual(self.client.get('/api/appointments/my/').json(), [])
+
+    def test_failed_writes_and_opted_out_views_do_not_pin(self):
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.patient.user))
+        response = self.client.post('/api/appointments/', {'doctor': self.doctor.id, 'date': 'soon', 'time': '09:00'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/appointments/my/').json(), [])
+
+        make_appointment(self.doctor, self.patient)
+        with mock.patch('core.routers.pinned_to_primary', return_value=True), \
+                mock.patch('core.views.MyAppointmentsView.read_your_writes', False):
+            self.assertEqual(self.client.get('/api/appointments/my/').json(), [])
+
+
+class RowScopingTests(APITestCase):
+    def setUp(self):
+        self.doctors = [make_doctor('doc0'), make_doctor('doc1')]
+        self.patients = [make_patient('pat0'), make_patient('pat1')]
+        pairs = [(0, 0), (1, 1), (1, 0)]
+        self.appointments = [
+            make_appointment(self.doctors[d], self.patients[p], days=n) for n, (d, p) in enumerate(pairs)
+        ]
+        for n, appointment in enumerate(self.appointments):
+            make_payment(appointment, f'TX{n}')
+
+    def ids(self, url, user):
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(user))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        return {row['id'] for row in (body['results'] if isinstance(body, dict) else body)}
+
+    def test_each_role_sees_only_its_rows(self):
+        a0, a1, a2 = (a.id for a in self.appointments)
+        p0, p1 = (p.id for p in self.patients)
+        patient, doctor = self.patients[0].user, self.doctors[1].user
+        self.assertEqual(self.ids('/api/appointments/', patient), {a0, a2})
+        self.assertEqual(self.ids('/api/payments/', patient), {a.payment.id for a in self.appointments if a.id != a1})
+        self.assertEqual(self.ids('/api/patients/', patient), {p0})
+        self.assertEqual(self.ids('/api/appointments/', doctor), {a1, a2})
+        self.assertEqual(self.ids('/api/patients/', doctor), {p0, p1})
+        self.assertEqual(self.ids('/api/patients/', self.doctors[0].user), {p0})
+
+        admin = CustomUser.objects.create_user(username='admin', is_staff=True, role='admin')
+        self.assertEqual(self.ids('/api/appointments/', admin), {a0, a1, a2})
+        # No profile, no rows.
+        self.assertEqual(self.ids('/api/appointments/', CustomUser.objects.create_user(username='nobody')), set())
+
+        # Other patients' rows can't be fetched or changed by id either.
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(patient))
+        self.assertEqual(self.client.get(f'/api/appointments/{a1}/').status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/patients/{p1}/').status_code, 404)
+
+    def test_payments_only_for_own_appointments_and_never_settled(self):
+        own = make_appointment(self.doctors[0], self.patients[0], days=5)
+        other = make_appointment(self.doctors[0], self.patients[1], days=6)
+        payment = {'amount': '1500.00', 'method': 'mpesa', 'status': 'paid'}
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.patients[0].user))
+        response = self.client.post('/api/payments/', {**payment, 'appointment': other.id, 'transaction_id': 'TX8'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('appointment', response.json())
+        response = self.client.post('/api/payments/', {**payment, 'appointment': own.id, 'transaction_id': 'TX9'})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['status'], 'pending')
+
+    def test_scoped_list_is_one_query(self):
+        # Profile ids come from the token: no lookup before the filtered, joined query.
+        for user in (self.patients[0].user, self.doctors[1].user):
+            self.client.credentials(HTTP_AUTHORIZATION=bearer(user))
+            for url in ('/api/appointments/', '/api/payments/', '/api/patients/'):
+                with CaptureQueriesContext(connection) as ctx:
+                    self.assertEqual(self.client.get(url).status_code, 200)
+                self.assertEqual(len(ctx.captured_queries), 1, [q['sql'] for q in ctx.captured_queries])
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        self.doctor = make_doctor('doc0', make_specialist())
+        self.patient = make_patient('pat0')
+        self.appointment = make_appointment(self.doctor, self.patient)
+        make_payment(self.appointment, 'TX0')
+        self.client.force_authenticate(CustomUser.objects.create_user(username='admin', is_staff=True))
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), ' '.join(q['sql'] for q in ctx.captured_queries)
+
+    def test_fields_select_output_and_columns(self):
+        body, sql = self.get('/api/appointments/?fields=id,time,doctor_detail.user.full_name')
+        self.assertEqual(body['results'], [
+            {'id': self.appointment.id, 'time': '09:00:00', 'doctor_detail': {'user': {'full_name': 'Doc doc0'}}},
+        ])
+        for column in ('bio', 'available_times', 'core_patient', 'core_specialist', 'email'):
+            self.assertNotIn(column, sql)
+
+        # The detail view (regular serializers, eager loading) renders the same.
+        detail, sql = self.get(f'/api/appointments/{self.appointment.id}/?fields=id,time,doctor_detail.user.full_name')
+        self.assertEqual(detail, body['results'][0])
+        self.assertNotIn('available_times', sql)
+
+    def test_expand_embeds_only_listed_objects(self):
+        body, sql = self.get('/api/appointments/?expand=')
+        row = body['results'][0]
+        self.assertEqual((row['doctor_detail'], row['patient_detail']), (self.doctor.id, self.patient.id))
+        self.assertNotIn('JOIN', sql)
+
+        body, _ = self.get('/api/appointments/?expand=doctor_detail&fields=id,doctor_detail,patient_detail')
+        self.assertEqual(body['results'][0], {
+            'id': self.appointment.id,
+            'doctor_detail': {
+                'id': self.doctor.id, 'user': self.doctor.user_id, 'specialty': self.doctor.specialty_id,
+                'bio': 'Bio of doc0', 'is_available': True, 'available_times': self.doctor.available_times,
+            },
+            'patient_detail': self.patient.id,
+        })
+
+        payments, _ = self.get('/api/payments/?fields=amount,appointment_detail.date&expand=')
+        self.assertEqual(payments['results'], [{'amount': '1500.00', 'appointment_detail': {'date': '2025-01-01'}}])
+
+    def test_defaults_and_writes_are_unchanged(self):
+        full, _ = self.get('/api/appointments/')
+        self.assertEqual(full['results'][0], AppointmentSerializer(self.appointment).data)
+
+        self.client.force_authenticate(self.patient.user)
+        response = self.client.post('/api/appointments/?fields=id', {'doctor': self.doctor.id, 'date': '2030-01-07', 'time': '09:00'})
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(set(response.json()), {'id'})
+
+
+class ResponseDeliveryTests(APITestCase):
+    def setUp(self):
+        self.doctor = make_doctor('doc')
+        self.patient = make_patient('pat')
+        self.appointments = [make_appointment(self.doctor, self.patient, days=n) for n in range(10)]
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.patient.user))
+
+    def test_gzip_is_negotiated_above_the_threshold(self):
+        plain = self.client.get('/api/appointments/')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get('/api/appointments/', HTTP_ACCEPT_ENCODING='br;q=0.5, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(json.loads(gzip.decompress(response.content)), plain.json())
+        self.assertLess(len(response.content), len(plain.content))
+
+        refused = self.client.get('/api/appointments/', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', refused)
+        small = self.client.get(f'/api/appointments/{self.appointments[0].id}/?fields=id', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', small)
+
+    @skipUnless(compression.brotli, 'brotli is not installed')
+    def test_brotli_when_preferred(self):
+        response = self.client.get('/api/appointments/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(compression.brotli.decompress(response.content)), self.client.get('/api/appointments/').json())
+
+    def test_choose_encoding(self):
+        self.assertEqual(compression.choose_encoding('gzip, deflate'), 'gzip')
+        self.assertEqual(compression.choose_encoding('*'), compression.ENCODINGS[0])
+        self.assertIsNone(compression.choose_encoding('identity, gzip;q=0'))
+        self.assertIsNone(compression.choose_encoding(''))
+
+    def test_messagepack(self):
+        data = {'a': 1, 'b': [True, None], 'c': -1, 'd': 300, 'e': 1.5, 'f': 'x' * 40}
+        packed = MessagePackRenderer().render(data)
+        self.assertEqual(
+            packed,
+            b'\x86\xa1a\x01\xa1b\x92\xc3\xc0\xa1c\xff\xa1d\xcd\x01\x2c\xa1e\xcb?\xf8\x00\x00\x00\x00\x00\x00'
+            b'\xa1f\xd9\x28' + b'x' * 40,
+        )
+        self.assertEqual(packb({'a': 1}, None), b'\x81\xa1a\x01')
+
+        url = f'/api/appointments/{self.appointments[0].id}/'
+        response = self.client.get(url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(response.content, MessagePackRenderer().render(self.client.get(url).json()))
+
+    def test_detail_answers_304_from_row_timestamps(self):
+        url = f'/api/appointments/{self.appointments[0].id}/'
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertTrue(etag.startswith('W/'))
+
+        # Validators only: no object load, no serialization.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        # Other representations have their own tags.
+        self.assertEqual(self.client.get(url + '?fields=id', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertNotEqual(self.client.get(url, HTTP_ACCEPT='application/msgpack')['ETag'], etag)
+
+        # Renaming the doctor changes the embedded doctor_detail.user.
+        self.doctor.user.first_name = 'Renamed'
+        self.doctor.user.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['doctor_detail']['user']['first_name'], 'Renamed')
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_malformed_detail_ids_are_404(self):
+        self.assertEqual(self.client.get('/api/appointments/abc/').status_code, 404)
+        self.assertEqual(self.client.get('/api/payments/abc/').status_code, 404)
+
+    def test_bulk_status_changes_invalidate_detail_tags(self):
+        url = f'/api/appointments/{self.appointments[0].id}/'
+        etag = self.client.get(url)['ETag']
+        ingest_events([{
+            'transaction_id': 'tx0', 'appointment': self.appointments[0].id,
+            'amount': '1500.00', 'method': 'mpesa', 'status': 'paid',
+        }])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'confirmed')
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class DeltaSyncTests(APITestCase):
+    url = '/api/sync/'
+
+    def setUp(self):
+        self.specialist = make_specialist()
+        self.doctor = make_doctor('doc', self.specialist)
+        self.patient, self.other = make_patient('pat'), make_patient('other')
+        self.mine = [make_appointment(self.doctor, self.patient, days=n) for n in range(3)]
+        self.theirs = make_appointment(self.doctor, self.other, days=5)
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.patient.user))
+
+    def sync(self, token=None):
+        response = self.client.get(self.url, {'since': token} if token else {})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def ids(self, body, kind):
+        return {row['id'] for row in body['changes'][kind]}
+
+    def test_full_then_delta(self):
+        body = self.sync()
+        self.assertEqual(self.ids(body, 'appointments'), {a.id for a in self.mine})
+        self.assertEqual(self.ids(body, 'patients'), {self.patient.id})
+        self.assertEqual(self.ids(body, 'doctors'), {self.doctor.id})
+        # Related rows are referenced by id; each type syncs on its own.
+        self.assertEqual(body['changes']['appointments'][0]['doctor_detail'], self.doctor.id)
+        self.assertEqual(body['changes']['doctors'][0]['user']['last_name'], 'doc')
+        self.assertFalse(body['more'] or body['reset'])
+
+        # Nothing changed: one range scan per type plus tombstones, all empty.
+        with self.assertNumQueries(6):
+            quiet = self.sync(body['token'])
+        self.assertFalse(any(quiet['changes'].values()) or any(quiet['deleted'].values()))
+
+        self.mine[0].status = 'confirmed'
+        self.mine[0].save()
+        removed = self.mine[1].id
+        self.mine[1].delete()
+        self.theirs.delete()
+        added = make_appointment(self.doctor, self.patient, days=9)
+        self.doctor.user.last_name = 'Renamed'
+        self.doctor.user.save()
+
+        delta = self.sync(quiet['token'])
+        self.assertEqual(self.ids(delta, 'appointments'), {self.mine[0].id, added.id})
+        self.assertEqual(delta['deleted']['appointments'], [removed])
+        self.assertEqual(self.ids(delta, 'doctors'), {self.doctor.id})
+        self.assertEqual(self.ids(delta, 'specialists'), set())
+        self.assertEqual(self.sync(delta['token'])['deleted']['appointments'], [])
+
+    def test_doctors_get_patients_who_book_after_their_last_sync(self):
+        late = make_patient('late')
+        Patient.objects.filter(pk=late.pk).update(updated_at=timezone.now() - datetime.timedelta(days=1))
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.doctor.user))
+        body = self.sync()
+        self.assertEqual(self.ids(body, 'patients'), {self.patient.id, self.other.id})
+        make_appointment(self.doctor, late, days=7)
+        body = self.sync(body['token'])
+        self.assertEqual(self.ids(body, 'patients'), {late.id})
+        # Only the first appointment of a pair touches the patient.
+        make_appointment(self.doctor, late, days=8)
+        self.assertEqual(self.ids(self.sync(body['token']), 'patients'), set())
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_pages_until_caught_up(self):
+        body, seen, calls = self.sync(), set(), 1
+        seen |= self.ids(body, 'appointments')
+        while body['more']:
+            body = self.sync(body['token'])
+            seen |= self.ids(body, 'appointments')
+            calls += 1
+        self.assertEqual((seen, calls), ({a.id for a in self.mine}, 2))
+
+    def test_settle_window_and_bad_tokens(self):
+        with override_settings(SYNC_SETTLE_SECONDS=60):
+            self.assertEqual(self.sync()['changes']['appointments'], [])
+        self.assertEqual(self.client.get(self.url, {'since': 'nope'}).status_code, 400)
+
+        token = self.sync()['token']
+        with mock.patch('core.sync.timezone.now', return_value=timezone.now() + datetime.timedelta(days=31)):
+            body = self.sync(token)
+        self.assertTrue(body['reset'])
+        self.assertEqual(self.ids(body, 'appointments'), {a.id for a in self.mine})
+
+    def test_prune_tombstones(self):
+        self.mine[0].delete()
+        Tombstone.objects.update(deleted_at=timezone.now() - datetime.timedelta(days=40))
+        kept = self.mine[1].id
+        self.mine[1].delete()
+        self.assertEqual(prune_tombstones(), 1)
+        self.assertEqual(list(Tombstone.objects.values_list('object_id', flat=True)), [kept])
+
+
+class EventStreamTests(TransactionTestCase):
+    # TransactionTestCase: events go out on commit.
+    url = '/api/async/events/'
+
+    def setUp(self):
+        self.doctor = make_doctor('doc')
+        self.patient, self.other = make_patient('pat'), make_patient('other')
+        self.auth = {user.username: bearer(user) for user in (self.doctor.user, self.patient.user, self.other.user)}
+
+    async def connect(self, username, query=''):
+        response = await self.async_client.get(self.url + query, headers={'Authorization': self.auth[username]})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertIn(b': connected', await anext(stream))  # subscribed from here on
+        return stream
+
+    async def disconnect(self, stream):
+        # As the ASGI handler does when the client goes away: cancel the pending read.
+        read = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        read.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await read
+
+    async def next_event(self, stream):
+        chunk = (await asyncio.wait_for(anext(stream), 5)).decode()
+        kind, data = chunk.strip().split('\n')
+        return kind.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+    async def test_many_clients(self):
+        broker = get_broker()
+        slots = f'?slots={self.doctor.id}'
+        watchers = await asyncio.gather(*(self.connect('other', slots) for _ in range(200)))
+        owner, doctor = await self.connect('pat'), await self.connect('doc')
+        self.assertEqual(broker.subscriber_count(slots_topic(self.doctor.id)), 200)
+
+        appointment = await sync_to_async(make_appointment)(self.doctor, self.patient, days=1)
+        kind, data = await self.next_event(owner)
+        self.assertEqual((kind, data['id'], data['status']), ('appointment.created', appointment.id, 'pending'))
+        self.assertEqual((await self.next_event(doctor))[0], 'appointment.created')
+        # Watchers only learn the slot was taken, not by whom.
+        for kind, data in await asyncio.gather(*(self.next_event(stream) for stream in watchers)):
+            self.assertEqual(kind, 'slot')
+            self.assertEqual(data, {'doctor': self.doctor.id, 'date': '2025-01-02', 'time': '09:00:00', 'available': False})
+
+        appointment.status = 'cancelled'
+        await sync_to_async(appointment.save)()
+        self.assertEqual((await self.next_event(owner))[0], 'appointment.cancelled')
+        self.assertEqual((await self.next_event(doctor))[0], 'appointment.cancelled')
+        freed = await asyncio.gather(*(self.next_event(stream) for stream in watchers))
+        self.assertTrue(all(data['available'] for _, data in freed))
+
+        await asyncio.gather(*(self.disconnect(stream) for stream in [*watchers, owner, doctor]))
+        self.assertFalse(broker.has_subscribers())
+
+    @override_settings(EVENTS_QUEUE_SIZE=3)
+    async def test_slow_consumers_are_cut_off(self):
+        broker = get_broker()
+        slow, fast = await self.connect('pat'), await self.connect('pat')
+        topic = patient_topic(self.patient.id)
+        for n in range(3):
+            broker.publish([topic], {'type': 'ping', 'data': n})
+            self.assertEqual(await self.next_event(fast), ('ping', n))
+        # Publishing never waits for the slow reader; it is dropped instead.
+        broker.publish([topic], {'type': 'ping', 'data': 3})
+        await asyncio.sleep(0)
+        self.assertEqual(broker.subscriber_count(topic), 1)
+        self.assertEqual((await self.next_event(slow))[0], 'overflow')
+        with self.assertRaises(StopAsyncIteration):
+            await anext(slow)
+        self.assertEqual(await self.next_event(fast), ('ping', 3))
+        await self.disconnect(fast)
+        self.assertFalse(broker.has_subscribers())
+
+    async def test_requires_a_token_and_topics(self):
+        self.assertEqual((await self.async_client.get(self.url)).status_code, 401)
+        staff = await sync_to_async(CustomUser.objects.create_user)(username='staff', is_staff=True, role='admin')
+        response = await self.async_client.get(self.url, headers={'Authorization': await sync_to_async(bearer)(staff)})
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get(self.url + '?slots=x', headers={'Authorization': self.auth['pat']})
+        self.assertEqual(response.status_code, 400)
+
+
+class ArchiveTests(APITestCase):
+    before = datetime.date(2025, 6, 1)
+
+    def setUp(self):
+        self.doctor = make_doctor('doc')
+        self.patient, self.other = make_patient('pat'), make_patient('other')
+        statuses = ['completed', 'cancelled', 'confirmed']
+        self.appointments = [make_appointment(self.doctor, self.patient, days=n, status=s) for n, s in enumerate(statuses)]
+        self.appointments.append(make_appointment(self.doctor, self.patient, days=400))
+        self.theirs = make_appointment(self.doctor, self.other, days=3, status='completed')
+        make_payment(self.appointments[0], 'TX0', status='paid')
+        make_payment(self.appointments[2], 'TX2', status='paid')
+        self.client.credentials(HTTP_AUTHORIZATION=bearer(self.patient.user))
+
+    def walk(self, url):
+        rows, url = [], url + '&page_size=1'
+        while url:
+            body = self.client.get(url).json()
+            rows += body['results']
+            url = body['next']
+        return rows
+
+    def test_archived_rows_read_as_before(self):
+        urls = ['/api/appointments/?include_archived=true', '/api/payments/?include_archived=true']
+        before = [self.client.get(url).json()['results'] for url in urls]
+        self.assertEqual(before[0], self.client.get('/api/appointments/').json()['results'])
+        mine = self.client.get('/api/appointments/my/').json()
+        old = self.appointments[0].id
+        detail = self.client.get(f'/api/appointments/{old}/').json()
+
+        self.assertEqual(archive_appointments(self.before, batch_size=1), (3, 1))
+        self.assertEqual(
+            set(ArchivedAppointment.objects.values_list('id', flat=True)),
+            {self.appointments[0].id, self.appointments[1].id, self.theirs.id},
+        )
+        self.assertEqual(list(ArchivedPayment.objects.values_list('transaction_id', flat=True)), ['TX0'])
+        # A move, not a deletion.
+        self.assertFalse(Tombstone.objects.exists())
+
+        self.assertEqual(len(self.client.get('/api/appointments/').json()['results']), 2)
+        self.assertEqual(self.client.get(f'/api/appointments/{old}/').status_code, 404)
+        # Keyset pages run across both tables, in the same order.
+        self.assertEqual([self.walk(url) for url in urls], before)
+        self.assertEqual(self.client.get('/api/appointments/my/?include_archived=1').json(), mine)
+        self.assertEqual(self.client.get(f'/api/appointments/{old}/?include_archived=true').json(), detail)
+
+        # Still scoped.
+        self.assertEqual(self.client.get(f'/api/appointments/{self.theirs.id}/?include_archived=true').status_code, 404)
+
+    @override_settings(DOCTOR_STATS_ROLLUP=True)
+    def test_archiving_keeps_daily_stats(self):
+        start, end = datetime.date(2024, 1, 1), datetime.date(2027, 12, 31)
+
+        def stats():
+            rebuild_daily_stats(start, end)
+            return list(DoctorDailyStats.objects.order_by('date').values_list(
+                'date', 'appointments', 'status_counts', 'revenue', 'paid_payments',
+            ))
+
+        before = stats()
+        with self.captureOnCommitCallbacks(execute=True):
+            archive_appointments(self.before)
+        self.assertEqual(stats(), before)
+        self.assertEqual(self.client.get('/api/appointments/abc/?include_archived=true').status_code, 404)
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('archive_appointments', '--days', '0', '--dry-run', stdout=out)
+        self.assertIn('3 appointments would be archived', out.getvalue())
+        call_command('archive_appointments', '--days', '0', stdout=out)
+        self.assertIn('Archived 3 appointments and 1 payments', out.getvalue())
+        self.assertEqual(Appointment.objects.count(), 2)
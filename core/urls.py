@@ -1,6 +1,5 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     DoctorViewSet,
     PatientViewSet,
@@ -14,6 +13,15 @@ from .views import (
     RegisterView,
     UserRoleView,
     CustomTokenObtainPairView,  # 👈 Custom Login View
+    CustomTokenRefreshView,
+    DoctorScheduleViewSet,
+    ScheduleExceptionViewSet,
+    BulkImportView,
+    CacheMetricsView,
+    DoctorDashboardView,
+    PaymentEventView,
+    SyncView,
+    prometheus_metrics,
 )
 
 router = DefaultRouter()
@@ -22,19 +30,27 @@ router.register(r'patients', PatientViewSet)
 router.register(r'appointments', AppointmentViewSet)
 router.register(r'specialists', SpecialistViewSet)
 router.register(r'payments', PaymentViewSet)
+router.register(r'schedules', DoctorScheduleViewSet)
+router.register(r'schedule-exceptions', ScheduleExceptionViewSet)
 
 urlpatterns = [
     # 🛡️ Authentication Endpoints
     path('auth/register/', RegisterView.as_view(), name='auth_register'),
     path('auth/login/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),  # 👈 Use custom login
-    path('auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('auth/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
     path('auth/role/', UserRoleView.as_view(), name='user_role'),
 
     # 🩺 Custom API Endpoints
     path('doctors/by-specialty/', DoctorBySpecialtyView.as_view(), name='doctors_by_specialty'), 
+    path('doctors/dashboard/', DoctorDashboardView.as_view(), name='doctor_dashboard'),
     path('appointments/book/', AppointmentCreateView.as_view(), name='appointment_create'),
     path('appointments/my/', MyAppointmentsView.as_view(), name='my_appointments'),
     path('symptom-match/', SymptomMatchView.as_view(), name='symptom_match'),
+    path('payments/events/', PaymentEventView.as_view(), name='payment_events'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('bulk/<str:kind>/', BulkImportView.as_view(), name='bulk_import'),
+    path('metrics/cache/', CacheMetricsView.as_view(), name='cache_metrics'),
+    path('metrics/', prometheus_metrics, name='prometheus_metrics'),
 
     # 🔁 ViewSet Routes
     path('', include(router.urls)),
@@ -1,14 +1,26 @@
+import datetime
+
 from django.shortcuts import render
 from rest_framework import viewsets, permissions, generics, status
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.dateparse import parse_date
 from rest_framework.views import APIView
 
-from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
 
-from .models import Doctor, Patient, Appointment, Specialist, Payment, SymptomSpecialtyMap
+from .models import (
+    Doctor, Patient, Appointment, Specialist, Payment, SymptomSpecialtyMap,
+    DoctorSchedule, ScheduleException, ArchivedAppointment,
+)
 from .serializers import (
     DoctorSerializer,
     PatientSerializer,
@@ -17,51 +29,112 @@ from .serializers import (
     PaymentSerializer,
     SymptomSpecialtyMapSerializer,
     RegisterSerializer,
-    UserSerializer
+    UserSerializer,
+    DoctorScheduleSerializer,
+    ScheduleExceptionSerializer,
+    ArchivedAppointmentSerializer,
+    ArchivedPaymentSerializer,
 )
+from .querysets import EagerLoadingMixin, ScopedQuerysetMixin
+from .matching import get_matcher
+from .cache import CachedResponseMixin, ConditionalRetrieveMixin, metrics as cache_metrics
+from .permissions import HasWebhookSignature, IsDoctorOwnerOrAdmin
+from .authentication import (
+    ClaimsUser, request_doctor_id, request_patient_id, user_claims, user_role,
+)
+from . import availability
+from .bulk import IMPORTERS
+from .parsers import CSVParser
+from rest_framework.parsers import JSONParser
+from .pagination import AppointmentPagination, PaymentPagination, DoctorPagination
+from .filters import DoctorFilterBackend
+from .streaming import StreamingListMixin
+from .flat import FlatListMixin
+from .routers import ReplicaReadMixin
+from .dashboard import doctor_dashboard
+from .payments import ingest_events
+from .sync import SINCE_PARAM, SyncType, sync_changes
+from .archive import ArchiveReadMixin
+from .jobs import enqueue
+from .instrumentation import registry as perf_registry
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
 
 User = get_user_model()
 
+
+def get_date_range(request):
+    """?start=YYYY-MM-DD&end=YYYY-MM-DD, defaulting to the coming week."""
+    try:
+        start = parse_date(request.query_params.get('start', '')) or timezone.localdate()
+        end = parse_date(request.query_params.get('end', '')) or start + datetime.timedelta(days=6)
+    except ValueError:
+        raise ValidationError({"detail": "Dates must be valid YYYY-MM-DD values."})
+    if end < start:
+        raise ValidationError({"end": "End date must not be before start date."})
+    if (end - start).days >= availability.MAX_RANGE_DAYS:
+        raise ValidationError({"end": f"Date range is limited to {availability.MAX_RANGE_DAYS} days."})
+    return start, end
+
+
+def get_request_patient(request):
+    patient_id = request_patient_id(request)
+    patient = Patient.objects.select_related('user').filter(pk=patient_id).first() if patient_id else None
+    if patient is None:
+        raise PermissionDenied("You must have a patient profile to book an appointment.")
+    return patient
+
+
+def format_slots(slots):
+    return {
+        str(doctor_id): {day.isoformat(): [t.strftime('%H:%M') for t in times] for day, times in days.items()}
+        for doctor_id, days in slots.items()
+    }
+
 #  Custom JWT Login with Role
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        for claim, value in user_claims(user).items():
+            token[claim] = value
+        return token
+
     def validate(self, attrs):
         data = super().validate(attrs)
-        user = self.user
-        print(data)
-
-    
-
-        if user.is_staff:
-            role = "admin"
-        elif hasattr(user, "doctor"):
-            role = "doctor"
-        elif hasattr(user, "patient"):
-            role = "patient"
-        else:
-            role = "user"
-
-        data["role"] = role
-        data["username"] = user.username
+        data["role"] = user_role(self.user)
+        data["username"] = self.user.get_username()
         return data
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
 
 
+#  JWT Refresh with Current Claims
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        # Access tokens copy the refresh token's claims; re-read them from
+        # the user so role and staff changes apply at the next refresh.
+        refresh = self.token_class(attrs['refresh'])
+        user = User.objects.filter(
+            **{jwt_settings.USER_ID_FIELD: refresh.payload.get(jwt_settings.USER_ID_CLAIM)}
+        ).first()
+        if user is None:
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        for claim, value in user_claims(user).items():
+            refresh[claim] = value
+        return super().validate({**attrs, 'refresh': str(refresh)})
+
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
+
+
 #  User Registration View
 class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
     permission_classes = [permissions.AllowAny]
 
-    def perform_create(self, serializer):
-        user = serializer.save()
-
-        # Create related profile based on role
-        if self.request.data.get("is_patient"):
-            Patient.objects.get_or_create(user=user)
-        elif self.request.data.get("is_doctor"):
-            Doctor.objects.get_or_create(user=user)
-
 
 #  Check Logged-in User Role
 class UserRoleView(APIView):
@@ -69,54 +142,63 @@ class UserRoleView(APIView):
 
     def get(self, request):
         user = request.user
-        role = (
-            "admin" if user.is_staff else
-            "doctor" if hasattr(user, "doctor") else
-            "patient" if hasattr(user, "patient") else
-            "user"
-        )
+        role = user.role if isinstance(user, ClaimsUser) else user_role(user)
         return Response({"username": user.username, "role": role})
 
 
 #  Doctor ViewSet (CRUD - Admin only)
-class DoctorViewSet(viewsets.ModelViewSet):
+class DoctorViewSet(ReplicaReadMixin, CachedResponseMixin, FlatListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Doctor.objects.all()
     serializer_class = DoctorSerializer
     # permission_classes = [permissions.IsAdminUser]
     permission_classes = [permissions.AllowAny]
+    cache_groups = ('doctor', 'specialist', 'user')
+    filter_backends = [DoctorFilterBackend]
+
+    @action(detail=True, methods=['get'])
+    def slots(self, request, pk=None):
+        start, end = get_date_range(request)
+        doctor = self.get_object()
+        return Response(format_slots(availability.free_slots([doctor.pk], start, end))[str(doctor.pk)])
 
 
 #  Doctor Listings by Specialty (Public)
-class DoctorBySpecialtyView(generics.ListAPIView):
+class DoctorBySpecialtyView(ReplicaReadMixin, CachedResponseMixin, FlatListMixin, EagerLoadingMixin, generics.ListAPIView):
     serializer_class = DoctorSerializer
     permission_classes = [permissions.AllowAny]
-
-    def get_queryset(self):
-        specialty = self.request.query_params.get('specialty')
-        if specialty:
-            return Doctor.objects.filter(specialty__iexact=specialty)
-        return Doctor.objects.all()
+    cache_groups = ('doctor', 'specialist', 'user')
+    # ?specialty=<id or name>&available=&search=&ordering= -- see DoctorFilterBackend.
+    queryset = Doctor.objects.all()
+    filter_backends = [DoctorFilterBackend]
+    pagination_class = DoctorPagination
 
 
 #  Patient ViewSet
-class PatientViewSet(viewsets.ModelViewSet):
+class PatientViewSet(ReplicaReadMixin, ScopedQuerysetMixin, ConditionalRetrieveMixin, FlatListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Patient.objects.all()
     serializer_class = PatientSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # Doctors see the patients they have appointments with.
+    scopes = {
+        'patient': 'id',
+        'doctor': lambda doctor_id: Exists(Appointment.objects.filter(patient=OuterRef('pk'), doctor_id=doctor_id)),
+    }
+    replica_actions = ('list',)
 
 
 #  Appointment ViewSet
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(ReplicaReadMixin, ScopedQuerysetMixin, ConditionalRetrieveMixin, ArchiveReadMixin, StreamingListMixin, FlatListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Appointment.objects.all()
     serializer_class = AppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = AppointmentPagination
+    scopes = {'patient': 'patient_id', 'doctor': 'doctor_id'}
+    replica_actions = ('list',)
+    archive_serializer_class = ArchivedAppointmentSerializer
 
     def perform_create(self, serializer):
-        try:
-            patient = Patient.objects.get(user=self.request.user)
-            serializer.save(patient=patient)
-        except Patient.DoesNotExist:
-            raise PermissionDenied("You must have a patient profile to book an appointment.")
+        appointment = serializer.save(patient=get_request_patient(self.request))
+        enqueue('booking_confirmation', appointment_id=appointment.id)
 
 
 #  Book Appointment (Quick Create)
@@ -125,50 +207,205 @@ class AppointmentCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        appointment = serializer.save(patient=get_request_patient(self.request))
+        enqueue('booking_confirmation', appointment_id=appointment.id)
 
 
 #  View My Bookings
-class MyAppointmentsView(generics.ListAPIView):
+class MyAppointmentsView(ReplicaReadMixin, ArchiveReadMixin, FlatListMixin, EagerLoadingMixin, generics.ListAPIView):
     serializer_class = AppointmentSerializer
+    archive_serializer_class = ArchivedAppointmentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        try:
-            patient = Patient.objects.get(user=self.request.user)
-            return Appointment.objects.filter(patient=patient).order_by('-date')
-        except Patient.DoesNotExist:
+        patient_id = request_patient_id(self.request)
+        if patient_id is None:
             return Appointment.objects.none()
+        return Appointment.objects.filter(patient_id=patient_id).order_by('-date')
+
+    def get_archive_queryset(self):
+        patient_id = request_patient_id(self.request)
+        if patient_id is None:
+            return ArchivedAppointment.objects.none()
+        return ArchivedAppointment.objects.filter(patient_id=patient_id)
 
 
 #  Specialist ViewSet
-class SpecialistViewSet(viewsets.ModelViewSet):
+class SpecialistViewSet(ReplicaReadMixin, CachedResponseMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Specialist.objects.all()
     serializer_class = SpecialistSerializer
     permission_classes = [permissions.AllowAny]
+    cache_groups = ('specialist',)
+
+    @action(detail=True, methods=['get'])
+    def slots(self, request, pk=None):
+        start, end = get_date_range(request)
+        specialist = self.get_object()
+        return Response(format_slots(availability.specialty_free_slots(specialist.pk, start, end)))
+
+
+#  Doctor Weekly Schedules
+class DoctorScheduleViewSet(viewsets.ModelViewSet):
+    queryset = DoctorSchedule.objects.all()
+    serializer_class = DoctorScheduleSerializer
+    permission_classes = [IsDoctorOwnerOrAdmin]
+
+    def perform_create(self, serializer):
+        doctor = serializer.validated_data['doctor']
+        if not self.request.user.is_staff and doctor.user_id != self.request.user.id:
+            raise PermissionDenied("You can only manage your own schedule.")
+        serializer.save()
+
+
+#  One-off Schedule Changes (leave, extra clinics)
+class ScheduleExceptionViewSet(DoctorScheduleViewSet):
+    queryset = ScheduleException.objects.all()
+    serializer_class = ScheduleExceptionSerializer
+
+
+#  Response Cache Metrics (Admin only)
+class CacheMetricsView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_metrics.snapshot())
+
+
+#  Prometheus Metrics (bearer METRICS_TOKEN, or DEBUG only)
+def prometheus_metrics(request):
+    token = settings.METRICS_TOKEN
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        return HttpResponse(status=404)
+
+    lines = [perf_registry.render()]
+    for name, value in cache_metrics.snapshot().items():
+        if name in ('hits', 'misses', 'not_modified'):
+            lines.append(f'# TYPE tibanow_response_cache_{name}_total counter\n'
+                         f'tibanow_response_cache_{name}_total {value}\n')
+    return HttpResponse(''.join(lines), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+#  Bulk Import (JSON list or CSV - Admin only)
+class BulkImportView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [JSONParser, CSVParser]
+
+    def post(self, request, kind):
+        importer_class = IMPORTERS.get(kind)
+        if importer_class is None:
+            return Response({"detail": f"Unknown import type '{kind}'."}, status=status.HTTP_404_NOT_FOUND)
+        rows = request.data
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            return Response({"detail": "Expected a list of objects."}, status=status.HTTP_400_BAD_REQUEST)
+
+        partial = request.query_params.get('partial', '').lower() in ('1', 'true', 'yes')
+        result = importer_class(rows, partial=partial).run()
+        written = result['created'] + result['updated']
+        if result['errors'] and not written:
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED if written else status.HTTP_200_OK)
+
+
+#  Doctor Dashboard (the doctor's own; staff pass ?doctor=<id>)
+class DoctorDashboardView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if request.user.is_staff and 'doctor' in request.query_params:
+            try:
+                doctor_id = int(request.query_params['doctor'])
+            except ValueError:
+                raise ValidationError({"doctor": "Must be a doctor id."})
+        else:
+            doctor_id = request_doctor_id(request)
+            if doctor_id is None:
+                raise PermissionDenied("You must have a doctor profile to view the dashboard.")
+        try:
+            day = parse_date(request.query_params.get('date', '')) or timezone.localdate()
+        except ValueError:
+            raise ValidationError({"date": "Must be a valid YYYY-MM-DD value."})
+        return Response(doctor_dashboard(doctor_id, day))
+
+
+#  Payment Events (signed provider callbacks, or admin)
+class PaymentEventView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [HasWebhookSignature | permissions.IsAdminUser]
+    parser_classes = [JSONParser]
+
+    def post(self, request):
+        events = request.data
+        if isinstance(events, dict):
+            events = [events]
+        if not isinstance(events, list) or not all(isinstance(event, dict) for event in events):
+            return Response({"detail": "Expected an event or a list of events."}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = ingest_events(events)
+        if result['errors'] and not any(result.get(key) for key in ('created', 'updated', 'unchanged')):
+            return Response(result, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
 
 
 # Symptom Matching Assistant
-class SymptomMatchView(generics.ListAPIView):
-    serializer_class = SymptomSpecialtyMapSerializer
+class SymptomMatchView(ReplicaReadMixin, APIView):
     permission_classes = [permissions.AllowAny]
+    max_symptoms = 10
 
-    def get_queryset(self):
-        symptom = self.request.query_params.get('symptom')
-        if symptom:
-            return SymptomSpecialtyMap.objects.filter(symptom__icontains=symptom)
-        return SymptomSpecialtyMap.objects.none()
-
-    def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        if not queryset.exists():
+    def get_symptoms(self, request):
+        # ?symptom=fever&symptom=cough or ?symptoms=fever,cough
+        symptoms = request.query_params.getlist('symptom')
+        for value in request.query_params.getlist('symptoms'):
+            symptoms.extend(value.split(','))
+        return [s.strip() for s in symptoms if s.strip()][:self.max_symptoms]
+
+    def get(self, request):
+        symptoms = self.get_symptoms(request)
+        results = get_matcher().match(symptoms) if symptoms else []
+        if not results:
             return Response({"message": "No specialists found for the given symptom."}, status=status.HTTP_404_NOT_FOUND)
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return Response(results)
 
 
 #  Payment ViewSet
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(ReplicaReadMixin, ScopedQuerysetMixin, ConditionalRetrieveMixin, ArchiveReadMixin, StreamingListMixin, FlatListMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = PaymentPagination
+    scopes = {'patient': 'appointment__patient_id', 'doctor': 'appointment__doctor_id'}
+    replica_actions = ('list',)
+    archive_serializer_class = ArchivedPaymentSerializer
+
+    # Only staff move appointments by payment status here; providers go
+    # through the signed /api/payments/events/ callbacks.
+    def perform_create(self, serializer):
+        payment = serializer.save()
+        if self.request.user.is_staff:
+            enqueue('payment_status_changed', transaction_id=payment.transaction_id)
+
+    def perform_update(self, serializer):
+        previous = serializer.instance.status
+        payment = serializer.save()
+        if payment.status != previous and self.request.user.is_staff:
+            enqueue('payment_status_changed', transaction_id=payment.transaction_id)
+
+
+#  Delta Sync (offline-first clients; see core.sync)
+class SyncView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    # Not served from a replica: its lag could outlast the settle window.
+    sync_types = {
+        'specialists': SyncType(SpecialistSerializer),
+        'doctors': SyncType(DoctorSerializer, expand='user'),
+        'patients': SyncType(PatientSerializer, PatientViewSet.scopes, expand='user'),
+        'appointments': SyncType(AppointmentSerializer, AppointmentViewSet.scopes),
+        'payments': SyncType(PaymentSerializer, PaymentViewSet.scopes),
+    }
+
+    def get(self, request):
+        return Response(sync_changes(request, self.sync_types, token=request.query_params.get(SINCE_PARAM)))
@@ -94,12 +94,18 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'core.renderers.MessagePackRenderer',
+    ],
 }
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -134,11 +140,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # CORS Middleware at the top
+    'core.instrumentation.PerformanceMiddleware',  # Server-Timing, N+1 warnings, /api/metrics/
+    'core.compression.CompressionMiddleware',  # gzip/brotli by Accept-Encoding
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.routers.PrimaryPinningMiddleware',  # read-your-writes with a read replica
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -163,16 +172,87 @@ TEMPLATES = [
 WSGI_APPLICATION = 'tibanow.wsgi.application'
 
 # Database
-DATABASES = {
-    'default': {
+# Every setting can come from the environment (DB_NAME, DB_USER, DB_PASSWORD,
+# DB_HOST, DB_PORT); the defaults are the local development database.
+#   DB_CONN_MAX_AGE     seconds to keep a connection between requests
+#                       (0 = reconnect every request, "none" = forever)
+#   DB_HEALTH_CHECKS    ping a persistent connection before reusing it
+#   DB_POOL=1           psycopg connection pool instead (needs psycopg[pool];
+#                       replaces persistent connections), sized by
+#                       DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT
+#                       (seconds to wait for a free connection), and
+#                       DB_POOL_MAX_LIFETIME / DB_POOL_MAX_IDLE
+#   DB_REPLICA_HOST     adds a "replica" alias (DB_REPLICA_NAME/USER/PASSWORD/
+#                       PORT default to the primary's) that catalog and list
+#                       reads are routed to, see core.routers (with
+#                       DB_ENGINE=sqlite: SQLITE_REPLICA_PATH)
+def _env_seconds(name, default):
+    value = os.environ.get(name, default)
+    return None if str(value).lower() == 'none' else int(value)
+
+
+def _database(prefix='DB_', **defaults):
+    env = lambda name, default: os.environ.get(f'{prefix}{name}', defaults.get(name, default))  # noqa: E731
+    config = {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'tiba_now',
-        'USER': 'postgres',
-        'PASSWORD': 'gitonga8082',
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': env('NAME', 'tiba_now'),
+        'USER': env('USER', 'postgres'),
+        'PASSWORD': env('PASSWORD', 'gitonga8082'),
+        'HOST': env('HOST', 'localhost'),
+        'PORT': env('PORT', '5432'),
+        'CONN_MAX_AGE': _env_seconds('DB_CONN_MAX_AGE', 60),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_HEALTH_CHECKS', '1') == '1',
+        'OPTIONS': {
+            'connect_timeout': int(os.environ.get('DB_CONNECT_TIMEOUT', 5)),
+        },
     }
-}
+    if os.environ.get('DB_POOL') == '1':
+        from psycopg_pool import ConnectionPool
+
+        config['CONN_MAX_AGE'] = 0  # the pool owns connection lifetime
+        config['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+            # Health check on checkout: a dead connection is replaced, not handed out.
+            'check': ConnectionPool.check_connection,
+        }
+    return config
+
+
+DATABASES = {'default': _database()}
+if os.environ.get('DB_REPLICA_HOST'):
+    primary = DATABASES['default']
+    DATABASES['replica'] = {
+        **_database('DB_REPLICA_', NAME=primary['NAME'], USER=primary['USER'],
+                    PASSWORD=primary['PASSWORD'], PORT=primary['PORT']),
+        # Tests run against the primary only.
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# DB_ENGINE=sqlite runs locally (and the benchmark suite) without PostgreSQL.
+if os.environ.get('DB_ENGINE') == 'sqlite':
+    DATABASES = {'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': _env_seconds('DB_CONN_MAX_AGE', 0),
+        # Take the write lock up front so concurrent writers wait instead of failing.
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'},
+    }}
+    DATABASE_ROUTERS = []
+    # A second SQLite file stands in for the replica locally: start it as a
+    # copy of the primary's file. Nothing keeps it in sync, which makes
+    # routed reads (and read-your-writes pinning) easy to see.
+    if os.environ.get('SQLITE_REPLICA_PATH'):
+        DATABASES['replica'] = {**DATABASES['default'], 'NAME': os.environ['SQLITE_REPLICA_PATH']}
+        DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+# After a write, the user's reads stay on the primary for this many seconds
+# (core.routers.PrimaryPinningMiddleware); cover the replica's usual lag.
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
 
 # Custom user model
 AUTH_USER_MODEL = 'core.CustomUser'
@@ -200,11 +280,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.ClaimsJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+        'core.renderers.MessagePackRenderer',
+    ],
 }
 
 # CORS settings
@@ -213,3 +298,86 @@ CORS_ALLOW_ALL_ORIGINS = True
 
 # CORS settings (allow all during development)
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Caching: local memory by default; CACHE_BACKEND=file or redis for production
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[os.environ.get('CACHE_BACKEND', 'locmem')],
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'tibanow'),
+    }
+}
+
+# Public catalog response cache (core.cache)
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+
+# Password hashing. Signups hash with REGISTRATION_PASSWORD_HASHER ('default'
+# = first entry below). Load tests and bulk onboarding can set it to 'md5';
+# such hashes are upgraded to PBKDF2 on the user's first login. MD5 stays
+# listed (last, so never the default) even when signups stop using it, or
+# accounts that haven't logged in since could no longer log in at all.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.MD5PasswordHasher',
+]
+REGISTRATION_PASSWORD_HASHER = os.environ.get('REGISTRATION_PASSWORD_HASHER', 'default')
+
+# Request instrumentation (core.instrumentation.PerformanceMiddleware); costs
+# roughly a quarter of a millisecond per request, PERF_INSTRUMENTATION=0 turns it off.
+PERF_INSTRUMENTATION = os.environ.get('PERF_INSTRUMENTATION', '1') != '0'
+PERF_NPLUS1_THRESHOLD = int(os.environ.get('PERF_NPLUS1_THRESHOLD', 5))
+PERF_PROFILE_SAMPLE_RATE = float(os.environ.get('PERF_PROFILE_SAMPLE_RATE', 0))
+PERF_PROFILE_DIR = os.environ.get('PERF_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+# Server-Timing headers go to staff (and everyone under DEBUG); set to send them to all clients.
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', '0') == '1'
+# Keep core.DoctorDailyStats up to date on every appointment/payment write (via
+# doctor_stats_refresh jobs, so `manage.py run_worker` must be running) and
+# serve the doctor dashboard's counts and revenue from it. After turning it on
+# (or after bulk loads) backfill with `manage.py refresh_doctor_stats`.
+DOCTOR_STATS_ROLLUP = os.environ.get('DOCTOR_STATS_ROLLUP', '0') == '1'
+
+# Response compression (core.compression.CompressionMiddleware): bodies smaller
+# than this many bytes go out uncompressed. Brotli needs the brotli package.
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 5))
+
+# Delta sync (/api/sync/, core.sync): rows per type per call, how long a
+# commit may lag its updated_at, and how long deletions are remembered
+# (`manage.py prune_tombstones`; older sync tokens get a full resync).
+SYNC_PAGE_SIZE = int(os.environ.get('SYNC_PAGE_SIZE', 500))
+SYNC_SETTLE_SECONDS = int(os.environ.get('SYNC_SETTLE_SECONDS', 2))
+SYNC_TOMBSTONE_DAYS = int(os.environ.get('SYNC_TOMBSTONE_DAYS', 30))
+
+# Real-time events (/api/async/events/, core.events; ASGI only). The default
+# broker only reaches clients of the same process; multi-process deployments
+# set EVENTS_BROKER to one that relays between them. A client more than
+# EVENTS_QUEUE_SIZE events behind is disconnected.
+EVENTS_BROKER = os.environ.get('EVENTS_BROKER', 'core.events.InProcessBroker')
+EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE', 100))
+EVENTS_HEARTBEAT_SECONDS = int(os.environ.get('EVENTS_HEARTBEAT_SECONDS', 15))
+
+# Completed/cancelled appointments older than this many days (and their
+# payments) are moved to the archive tables by `manage.py archive_appointments`.
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 365))
+
+# HMAC-SHA256 key providers sign /api/payments/events/ callbacks with (X-Signature).
+PAYMENT_WEBHOOK_SECRET = os.environ.get('PAYMENT_WEBHOOK_SECRET', '')
+
+# Background jobs (core.jobs, `manage.py run_worker`): notification emails and
+# the appointment reminder sweep.
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'TibaNow <no-reply@tibanow.local>')
+REMINDER_WINDOW_HOURS = int(os.environ.get('REMINDER_WINDOW_HOURS', 24))
+REMINDER_SWEEP_SECONDS = int(os.environ.get('REMINDER_SWEEP_SECONDS', 300))
+
+# Bearer token Prometheus must send to /api/metrics/; without one the endpoint is DEBUG-only.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
@@ -19,5 +19,6 @@ from django.urls import path,include
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/async/', include('core.async_urls')),  # Async read endpoints (ASGI)
     path('api/', include('core.urls')),  # Include the core app's URLs
 ]